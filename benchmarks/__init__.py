@@ -0,0 +1,5 @@
+"""Performance benchmarks for Jarvis.
+
+Run one module with `python -m benchmarks.<name>`, or all of them as JSON
+with `python -m benchmarks`.
+"""
@@ -0,0 +1,81 @@
+"""Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks [--output results.json] [--only bench_agent bench_db]
+
+Each benchmark module exposes run() -> dict; the output records them with
+enough context (version, commit, Python, platform) to compare releases.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+BENCHMARKS = ("bench_agent", "bench_blobs", "bench_db", "bench_fork", "bench_maintenance", "bench_models", "bench_render", "bench_serve", "bench_shaping", "bench_shell", "bench_startup")
+
+
+def _git_commit() -> str | None:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def _version() -> str | None:
+    try:
+        return metadata.version("jarvis")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def run(names: tuple[str, ...] = BENCHMARKS) -> dict[str, Any]:
+    report: dict[str, Any] = {
+        "version": _version(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "results": {},
+    }
+    for name in names:
+        module = importlib.import_module(f"benchmarks.{name}")
+        print(f"running {name} ...", file=sys.stderr)
+        start = time.perf_counter()
+        report["results"][name] = module.run()
+        report["results"][name]["elapsed_sec"] = time.perf_counter() - start
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", "-o", type=Path, help="write JSON here instead of stdout")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, metavar="NAME", help="benchmarks to run")
+    args = parser.parse_args()
+
+    report = run(tuple(args.only) if args.only else BENCHMARKS)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+        print(f"wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
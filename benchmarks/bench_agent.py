@@ -0,0 +1,116 @@
+"""Benchmark: Agent.chat against the local fake Messages API.
+
+Measures end-to-end chat latency (batch and streaming), the overhead each
+tool round adds on top of the model's own latency, the first chat after a
+conversation switch with a new vs the shared client, and the cost of
+dispatching one tool call.
+
+    python -m benchmarks.bench_agent [--samples 20] [--latency-ms 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from jarvis.agent import Agent
+from jarvis.database import Database
+from jarvis.models import ToolCall
+
+from .fake_server import FakeAnthropicServer, Scenario
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    """(p50, p95) in milliseconds."""
+    ms = sorted(s * 1000 for s in samples)
+    return statistics.median(ms), ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))]
+
+
+def _chats(
+    db: Database,
+    server: FakeAnthropicServer,
+    samples: int,
+    *,
+    stream: bool,
+    shared_client: bool = True,
+) -> list[float]:
+    """Time one chat() per fresh conversation, as after /new."""
+    client = server.client()
+    times = []
+    for _ in range(samples):
+        agent = Agent(db, db.create_conversation(title="bench"))
+        agent.client = client if shared_client else server.client()
+        start = time.perf_counter()
+        agent.chat("Summarise the README.", stream_fn=(lambda _: None) if stream else None)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(samples: int = 20, latency_ms: float = 20.0, tool_rounds: int = 3) -> dict[str, Any]:
+    """Latencies in ms (p50/p95 where noted) and tool dispatch cost in µs."""
+    results: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / "notes.txt"
+        target.write_text("hello\n" * 100)
+        tool_input = {"path": str(target), "force": True}
+        db = Database(Path(tmp) / "bench.db")
+        try:
+            with FakeAnthropicServer() as server:
+                for rounds in (0, tool_rounds):
+                    server.scenario = Scenario(tool_rounds=rounds, tool_input=tool_input)
+                    for stream in (False, True):
+                        label = f"chat_{'stream' if stream else 'batch'}_{rounds}_rounds"
+                        _chats(db, server, 2, stream=stream)  # warm up connections and caches
+                        results[f"{label}_p50_ms"], results[f"{label}_p95_ms"] = _percentiles(
+                            _chats(db, server, samples, stream=stream)
+                        )
+                # Client-side cost of one tool round: the difference, spread over the rounds
+                results["round_overhead_ms"] = (
+                    results[f"chat_batch_{tool_rounds}_rounds_p50_ms"] - results["chat_batch_0_rounds_p50_ms"]
+                ) / tool_rounds
+
+                # With model latency, whatever exceeds (rounds + 1) x latency is ours
+                latency = latency_ms / 1000
+                server.scenario = Scenario(tool_rounds=tool_rounds, tool_input=tool_input, latency=latency)
+                times = _chats(db, server, max(3, samples // 4), stream=False)
+                results["latency_ms"] = latency_ms
+                results["latency_overhead_ms"] = (statistics.median(times) - (tool_rounds + 1) * latency) * 1000
+
+                # First chat after switching conversations: new connection pool vs the shared one
+                server.scenario = Scenario(tool_input=tool_input)
+                for shared in (False, True):
+                    times = _chats(db, server, samples, stream=False, shared_client=shared)
+                    results[f"switch_{'shared' if shared else 'new'}_client_p50_ms"] = _percentiles(times)[0]
+
+            agent = Agent(db, db.create_conversation(title="bench"))
+            calls = [ToolCall(tool_name="read_file", tool_input=tool_input, call_id=f"call_{i}") for i in range(4)]
+            agent._execute_tools(calls)
+            dispatches = max(50, samples * 10)
+            start = time.perf_counter()
+            for _ in range(dispatches):
+                agent._execute_tools(calls)
+            results["tool_dispatch_us"] = (time.perf_counter() - start) / (dispatches * len(calls)) * 1e6
+        finally:
+            db.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated model latency per response")
+    parser.add_argument("--tool-rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.samples, args.latency_ms, args.tool_rounds)
+    for key, value in results.items():
+        unit = "µs" if key.endswith("_us") else "ms"
+        print(f"{key:36} {value:9.2f} {unit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: tool outputs inline vs in the compressed, deduplicated blob store.
+
+Writes a conversation of file reads (the same files read again and again,
+as in a real session) and compares database size, write throughput, and
+the time to rebuild the API transcript and to scan history.
+
+    python -m benchmarks.bench_blobs [turns]
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from jarvis import config
+from jarvis.agent import _API_COLUMNS, _to_api
+from jarvis.database import Database
+from jarvis.models import Message, ToolCall, ToolResult
+
+# Threshold, codec per configuration; a threshold of 0 keeps outputs inline
+CONFIGS = {"inline": (0, "zlib"), "zlib": (4096, "zlib"), "lzma": (4096, "lzma")}
+
+
+def _files() -> list[str]:
+    """Source files of this repo, as read_file would return them."""
+    root = Path(__file__).resolve().parent.parent
+    texts = [p.read_text() for p in sorted((root / "jarvis").rglob("*.py"))]
+    return [t for t in texts if len(t) > 4096] or ["".join(texts)]
+
+
+def _write(db: Database, turns: int, files: list[str]) -> tuple[str, float]:
+    cid = db.create_conversation(title="bench")
+    start = time.perf_counter()
+    for i in range(turns):
+        call = ToolCall(tool_name="read_file", tool_input={"path": f"file_{i % len(files)}.py"}, call_id=f"call_{i}")
+        with db.transaction():
+            db.add_messages(cid, [
+                Message(role="assistant", content=f"Reading file {i % len(files)}.", tool_calls=[call]),
+                Message(role="user", content="", tool_results=[ToolResult(call.call_id, files[i % len(files)])]),
+            ])
+    return cid, time.perf_counter() - start
+
+
+def _size(db: Database, path: Path) -> int:
+    db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return path.stat().st_size
+
+
+def run(turns: int = 300) -> dict[str, Any]:
+    """Per configuration: database MB, messages written per second, transcript and scan ms."""
+    files = _files()
+    results: dict[str, Any] = {"distinct_files": len(files)}
+    saved = config.BLOB_THRESHOLD, config.BLOB_CODEC
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for label, (threshold, codec) in CONFIGS.items():
+                config.BLOB_THRESHOLD, config.BLOB_CODEC = threshold, codec
+                path = Path(tmp) / f"{label}.db"
+                db = Database(path)
+                try:
+                    cid, elapsed = _write(db, turns, files)
+                    results[f"{label}_db_mb"] = _size(db, path) / 1e6
+                    results[f"{label}_msgs_per_sec"] = 2 * turns / elapsed
+                finally:
+                    db.close()
+
+                # A fresh connection, as when resuming the conversation later
+                db = Database(path)
+                try:
+                    start = time.perf_counter()
+                    transcript = [_to_api(m) for m in db.get_messages(cid, columns=_API_COLUMNS)]
+                    results[f"{label}_transcript_ms"] = (time.perf_counter() - start) * 1000
+                    assert len(transcript) == 2 * turns
+                    start = time.perf_counter()
+                    db.get_messages(cid)
+                    results[f"{label}_load_all_ms"] = (time.perf_counter() - start) * 1000
+                    if threshold:
+                        results[f"{label}_saved_bytes"] = db.blob_stats()["saved_bytes"]
+                finally:
+                    db.close()
+        finally:
+            config.BLOB_THRESHOLD, config.BLOB_CODEC = saved
+    return results
+
+
+def main() -> None:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    results = run(turns)
+    print(f"{turns} file reads of {results['distinct_files']} distinct files")
+    print(f"{'':8}{'DB size':>10}{'writes':>14}{'transcript':>12}{'load all':>10}")
+    for label in CONFIGS:
+        print(
+            f"{label:8}{results[f'{label}_db_mb']:8.2f} MB{results[f'{label}_msgs_per_sec']:8,.0f} msg/s"
+            f"{results[f'{label}_transcript_ms']:9.1f} ms{results[f'{label}_load_all_ms']:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: message write throughput of the SQLite persistence layer.
+
+Compares the original write path (rollback journal, one commit per message)
+with WAL + synchronous=NORMAL and one transaction per agent turn.
+
+    python -m benchmarks.bench_db [turns]
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from jarvis.database import Database
+from jarvis.models import Message, ToolCall, ToolResult, Usage
+
+
+def _turn(i: int) -> tuple[Message, Message]:
+    call = ToolCall(tool_name="run_shell", tool_input={"command": f"echo {i}"}, call_id=f"call_{i}")
+    return (
+        Message(role="assistant", content=f"Running step {i}.", tool_calls=[call]),
+        Message(role="user", content="", tool_results=[ToolResult(call_id=call.call_id, output="x" * 512)]),
+    )
+
+
+def _write(db: Database, turns: int, *, per_turn_tx: bool) -> float:
+    cid = db.create_conversation(title="bench")
+    usage = Usage(input_tokens=100, output_tokens=20)
+    start = time.perf_counter()
+    for i in range(turns):
+        assistant, results = _turn(i)
+        if per_turn_tx:
+            with db.transaction():
+                db.add_messages(cid, [assistant, results])
+                db.add_usage(cid, usage)
+        else:
+            db.add_message(cid, assistant)
+            db.add_message(cid, results)
+            db.add_usage(cid, usage)
+    return time.perf_counter() - start
+
+
+def run(turns: int = 500) -> dict[str, float]:
+    """Return messages/second for the old and new write paths."""
+    results: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, durability, per_turn_tx in (
+            ("before_msgs_per_sec", "rollback", False),
+            ("after_msgs_per_sec", "wal", True),
+        ):
+            db = Database(Path(tmp) / f"{label}.db", durability=durability)
+            try:
+                elapsed = _write(db, turns, per_turn_tx=per_turn_tx)
+            finally:
+                db.close()
+            results[label] = 2 * turns / elapsed
+    results["speedup"] = results["after_msgs_per_sec"] / results["before_msgs_per_sec"]
+    return results
+
+
+def main() -> None:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    results = run(turns)
+    print(f"before (rollback journal, commit per message): {results['before_msgs_per_sec']:10,.0f} msgs/s")
+    print(f"after  (WAL, one transaction per turn):        {results['after_msgs_per_sec']:10,.0f} msgs/s")
+    print(f"speedup: {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: forking a long conversation by reference vs copying its rows.
+
+"copy" is what continuing from a point used to take: a new conversation
+with every message written again (the blob store still dedupes large
+tool outputs). "fork" shares the parent's messages up to the fork point.
+Also times loading the transcript of each, since a fork reads its shared
+prefix from the parent.
+
+    python -m benchmarks.bench_fork [messages]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from jarvis.database import Database
+from jarvis.models import Message, ToolCall, ToolResult
+
+API_COLUMNS = ("role", "content", "tool_calls", "tool_results")
+
+
+def _populate(db: Database, messages: int) -> str:
+    cid = db.create_conversation(title="bench")
+    with db.transaction():
+        for i in range(messages // 4):
+            call = ToolCall("run_shell", {"command": f"make step{i}"}, f"call_{i}")
+            db.add_messages(cid, [
+                Message("user", f"Run step {i} and tell me how it went."),
+                Message("assistant", "", tool_calls=[call]),
+                Message("user", "", tool_results=[ToolResult(call.call_id, f"step {i}: ok\n" * 40)]),
+                Message("assistant", f"Step {i} finished without errors."),
+            ])
+    return cid
+
+
+def _copy(db: Database, conversation_id: str) -> str:
+    msgs = [
+        Message(m.role, m.content, tool_calls=m.tool_calls, tool_results=m.tool_results, created_at=m.created_at)
+        for m in db.get_messages(conversation_id)
+    ]
+    cid = db.create_conversation(title="copy")
+    with db.transaction():
+        db.add_messages(cid, msgs)
+    return cid
+
+
+def _file_bytes(path: Path) -> int:
+    return sum(os.path.getsize(p) for p in (path, Path(f"{path}-wal")) if p.exists())
+
+
+def _timed(fn: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(messages: int = 10_000) -> dict[str, Any]:
+    """ms and bytes added per fork or copy, and ms to load the transcript of each."""
+    results: dict[str, Any] = {"messages": messages}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        db = Database(path)
+        parent = _populate(db, messages)
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        _, results["parent_load_ms"] = _timed(lambda: db.get_messages(parent, columns=API_COLUMNS))
+        for label, fn in (("fork", db.fork_conversation), ("copy", lambda cid: _copy(db, cid))):
+            before = _file_bytes(path)
+            cid, results[f"{label}_ms"] = _timed(lambda: fn(parent))
+            db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            results[f"{label}_bytes"] = _file_bytes(path) - before
+            _, results[f"{label}_load_ms"] = _timed(lambda: db.get_messages(cid, columns=API_COLUMNS))
+            assert len(db.get_messages(cid, columns=("role",))) == messages
+        db.close()
+    return results
+
+
+def main() -> None:
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    results = run(messages)
+    print(f"{messages:,}-message conversation (loads in {results['parent_load_ms']:.1f} ms)")
+    for label in ("copy", "fork"):
+        print(
+            f"  {label:5} {results[f'{label}_ms']:8.1f} ms  {results[f'{label}_bytes']:>11,} bytes added  "
+            f"transcript loads in {results[f'{label}_load_ms']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
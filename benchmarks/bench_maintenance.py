@@ -0,0 +1,119 @@
+"""Benchmark: a database with years of history, before and after `jarvis maintenance`.
+
+Fills a database with conversations, most of them idle for longer than
+the archive age and many never given a message (as every CLI session
+used to create one), then times what runs on every start and lookup:
+opening the database, listing the latest conversations and a search.
+Runs maintenance and times them again.
+
+    python -m benchmarks.bench_maintenance [conversations]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from jarvis import maintenance
+from jarvis.database import Database
+from jarvis.models import Message, ToolCall, ToolResult
+
+RECENT_SHARE = 0.1  # conversations newer than the archive age
+EMPTY_PER_CONVERSATION = 1  # sessions that never got a message
+TURNS = 5
+
+
+def _populate(db: Database, conversations: int) -> None:
+    now = datetime.now(timezone.utc)
+    with db.transaction():
+        for i in range(conversations):
+            cid = db.create_conversation(title=f"bench {i}")
+            for turn in range(TURNS):
+                call = ToolCall("run_shell", {"command": f"make target{turn}"}, f"call_{i}_{turn}")
+                db.add_messages(cid, [
+                    Message("user", f"Build target {turn} of project {i} and report the result."),
+                    Message("assistant", "", tool_calls=[call]),
+                    Message("user", "", tool_results=[ToolResult(call.call_id, f"[{i}] building {turn}\n" * 300)]),
+                    Message("assistant", f"Target {turn} of project {i} built without warnings."),
+                ])
+            for _ in range(EMPTY_PER_CONVERSATION):
+                db.create_conversation(title="CLI session")
+    # Spread activity over three years, the newest RECENT_SHARE within the archive age
+    rows = db.conn.execute("SELECT id FROM conversations ORDER BY rowid").fetchall()
+    recent = int(len(rows) * RECENT_SHARE)
+    stamps = []
+    for n, (cid,) in enumerate(rows):
+        age = timedelta(days=n % 30) if n >= len(rows) - recent else timedelta(days=100 + n % 1000)
+        stamp = (now - age).isoformat()
+        stamps.append((stamp, stamp, cid))
+    db.conn.executemany("UPDATE conversations SET created_at = ?, updated_at = ? WHERE id = ?", stamps)
+    db.conn.commit()
+
+
+def _ms(fn: Callable[[], Any], n: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def _measure(path: Path) -> dict[str, float]:
+    def open_db() -> None:
+        Database(path).close()
+
+    db = Database(path)
+    try:
+        return {
+            "bytes": os.path.getsize(path),
+            "open_ms": _ms(open_db),
+            "list_ms": _ms(lambda: db.list_conversations(limit=20)),
+            "search_ms": _ms(lambda: db.search("warnings project", limit=10)),
+        }
+    finally:
+        db.close()
+
+
+def run(conversations: int = 2000) -> dict[str, Any]:
+    """File size and open/list/search ms before and after a maintenance run, and what it did."""
+    results: dict[str, Any] = {"conversations": conversations}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        db = Database(path)
+        _populate(db, conversations)
+        db.close()
+        results.update({f"before_{k}": v for k, v in _measure(path).items()})
+        db = Database(path)
+        done = maintenance.run(db, archive_days=90, archive_dir=Path(tmp) / "archive", full=True)
+        db.close()
+        results.update({f"after_{k}": v for k, v in _measure(path).items()})
+        results.update({f"maintenance_{k}": v for k, v in done.items()})
+        results["archive_bytes"] = sum(p.stat().st_size for p in (Path(tmp) / "archive").rglob("*.jsonl.gz"))
+    return results
+
+
+def main() -> None:
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = run(conversations)
+    print(
+        f"{conversations:,} conversations of {TURNS} turns, {1 - RECENT_SHARE:.0%} idle for 90+ days, "
+        f"and {conversations * EMPTY_PER_CONVERSATION:,} empty ones"
+    )
+    print(
+        f"maintenance: archived {results['maintenance_archived']:,}, purged {results['maintenance_purged']:,} "
+        f"in {results['maintenance_duration_ms'] / 1000:.1f} s; archive files {results['archive_bytes']:,} bytes"
+    )
+    print(f"  {'':8}{'db bytes':>14}{'open':>10}{'list':>10}{'search':>10}")
+    for label in ("before", "after"):
+        print(
+            f"  {label:8}{results[f'{label}_bytes']:>14,}{results[f'{label}_open_ms']:>8.2f} ms"
+            f"{results[f'{label}_list_ms']:>7.2f} ms{results[f'{label}_search_ms']:>7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark: loading a long conversation from the database.
+
+Compares the original eager loader (plain dataclasses, every JSON column
+and timestamp decoded per row) with lazy StoredMessage rows, loaded in
+full and projected to role/content as _print_history does.
+
+    python -m benchmarks.bench_models [messages]
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from jarvis.agent import _to_api
+from jarvis.database import Database
+from jarvis.models import Message, ToolCall, ToolResult
+
+
+# The models and loader as they were before slots and lazy rows
+@dataclass
+class _EagerMessage:
+    role: str
+    content: str
+    tool_calls: list[_EagerToolCall] = field(default_factory=list)
+    tool_results: list[_EagerToolResult] = field(default_factory=list)
+    created_at: datetime | None = None
+
+
+@dataclass
+class _EagerToolCall:
+    tool_name: str
+    tool_input: dict[str, Any]
+    call_id: str = ""
+
+
+@dataclass
+class _EagerToolResult:
+    call_id: str
+    output: str
+    is_error: bool = False
+
+
+def _eager_get_messages(db: Database, conversation_id: str) -> list[_EagerMessage]:
+    rows = db.conn.execute(
+        "SELECT role, content, tool_calls, tool_results, created_at FROM messages WHERE conversation_id = ? ORDER BY id",
+        (conversation_id,),
+    ).fetchall()
+    return [
+        _EagerMessage(
+            role=r["role"],
+            content=r["content"],
+            tool_calls=[_EagerToolCall(**tc) for tc in json.loads(r["tool_calls"])],
+            tool_results=[_EagerToolResult(**tr) for tr in json.loads(r["tool_results"])],
+            created_at=datetime.fromisoformat(r["created_at"]),
+        )
+        for r in rows
+    ]
+
+
+def _populate(db: Database, messages: int) -> str:
+    """A conversation of 4-message turns: question, tool call, tool result, answer."""
+    cid = db.create_conversation(title="bench")
+    with db.transaction():
+        for i in range(messages // 4):
+            call = ToolCall(tool_name="run_shell", tool_input={"command": f"ls -la /tmp/{i}"}, call_id=f"call_{i}")
+            db.add_messages(cid, [
+                Message(role="user", content=f"What is in /tmp/{i}?"),
+                Message(role="assistant", content="Let me look.", tool_calls=[call]),
+                Message(role="user", content="", tool_results=[ToolResult(call_id=call.call_id, output="x" * 400)]),
+                Message(role="assistant", content=f"/tmp/{i} contains {i} files."),
+            ])
+    return cid
+
+
+def _measure(fn: Callable[[], Any]) -> tuple[float, float]:
+    """(best seconds of 3 runs, peak MiB allocated while holding the result)."""
+    best = float("inf")
+    for _ in range(3):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak / (1024 * 1024)
+
+
+def run(messages: int = 50_000) -> dict[str, float]:
+    """Return load time (seconds) and peak memory (MiB) for each loader."""
+    results: dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(Path(tmp) / "bench.db")
+        try:
+            cid = _populate(db, messages)
+            cases: dict[str, Callable[[], Any]] = {
+                "eager": lambda: _eager_get_messages(db, cid),
+                "lazy": lambda: db.get_messages(cid),
+                "projected": lambda: db.get_messages(cid, columns=("role", "content")),
+                "eager_api": lambda: [_to_api(m) for m in _eager_get_messages(db, cid)],
+                "lazy_api": lambda: [
+                    _to_api(m)
+                    for m in db.get_messages(cid, columns=("role", "content", "tool_calls", "tool_results"))
+                ],
+            }
+            for label, fn in cases.items():
+                results[f"{label}_sec"], results[f"{label}_mib"] = _measure(fn)
+        finally:
+            db.close()
+    results["projected_speedup"] = results["eager_sec"] / results["projected_sec"]
+    results["projected_memory_ratio"] = results["eager_mib"] / results["projected_mib"]
+    return results
+
+
+def main() -> None:
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    results = run(messages)
+    print(f"{messages:,} messages")
+    for label, description in (
+        ("eager", "eager dataclasses (before)"),
+        ("lazy", "lazy rows, all columns"),
+        ("projected", "lazy rows, role + content"),
+        ("eager_api", "API transcript, eager"),
+        ("lazy_api", "API transcript, lazy"),
+    ):
+        print(f"{description:28} {results[f'{label}_sec'] * 1000:8.1f} ms  {results[f'{label}_mib']:7.1f} MiB peak")
+    print(
+        f"history scan: {results['projected_speedup']:.1f}x faster, "
+        f"{results['projected_memory_ratio']:.1f}x less memory"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark: CPU spent rendering a streamed reply, per 10k tokens.
+
+Streams a Markdown reply into a terminal console (writing to memory) at a
+fixed token rate and compares:
+
+- per_token: console.print() of every delta, as raw text (the old CLI)
+- live_whole: a Live Markdown view of the whole reply, refreshed at the frame cap
+- renderer: StreamRenderer, finished blocks printed once and only the
+  unfinished one refreshed at the frame cap
+
+    python -m benchmarks.bench_render [--tokens 10000] [--rate 4000] [--fps 12]
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import Any, Callable
+
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+
+from jarvis.render import StreamRenderer
+
+CHARS_PER_TOKEN = 4
+BURST_SECONDS = 0.005  # deltas arrive in small bursts, as from the API
+
+_SECTION = """\
+## Step {i}
+
+The function reads the **configuration**, validates each entry and returns a
+list of `Setting` objects. Entries that fail validation are logged and skipped.
+
+1. Load the file with `load_config(path)`
+2. Call `validate()` on every entry
+3. Collect the results
+
+```python
+def load_settings(path):
+    settings = []
+    for entry in load_config(path):
+        if entry.validate():
+            settings.append(Setting(entry))
+    return settings
+```
+
+"""
+
+
+def _deltas(tokens: int) -> list[str]:
+    text = ""
+    i = 0
+    while len(text) < tokens * CHARS_PER_TOKEN:
+        i += 1
+        text += _SECTION.format(i=i)
+    text = text[:tokens * CHARS_PER_TOKEN]
+    return [text[j:j + CHARS_PER_TOKEN] for j in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def _console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, color_system="truecolor", width=100, height=40)
+
+
+class _WholeReply:
+    """Markdown of everything streamed so far, parsed when Live refreshes."""
+
+    def __init__(self) -> None:
+        self.text = ""
+
+    def __rich__(self) -> Markdown:
+        return Markdown(self.text)
+
+
+def _stream(deltas: list[str], rate: float, write: Callable[[str], None]) -> float:
+    """Feed deltas at `rate` tokens/s; return the CPU seconds used by the process meanwhile."""
+    per_burst = max(1, round(rate * BURST_SECONDS))
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(0, len(deltas), per_burst):
+        for delta in deltas[i:i + per_burst]:
+            write(delta)
+        delay = start + (i + per_burst) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return time.process_time() - cpu
+
+
+def run(tokens: int = 10_000, rate: float = 4000.0, fps: float = 12.0) -> dict[str, Any]:
+    """CPU ms and terminal KiB per 10k tokens for each approach."""
+    deltas = _deltas(tokens)
+    scale = 10_000 / tokens
+    results: dict[str, Any] = {}
+
+    console = _console()
+    cpu = _stream(deltas, rate, lambda d: console.print(d, end="", highlight=False))
+    results["per_token"] = (cpu, console.file.getvalue())
+
+    console = _console()
+    reply = _WholeReply()
+    with Live(reply, console=console, refresh_per_second=fps, transient=True):
+        def write(delta: str) -> None:
+            reply.text += delta
+
+        cpu = _stream(deltas, rate, write)
+    console.print(Markdown(reply.text))
+    results["live_whole"] = (cpu + 0.0, console.file.getvalue())
+
+    console = _console()
+    renderer = StreamRenderer(console, fps=fps, markdown=True)
+    with renderer:
+        cpu = _stream(deltas, rate, renderer.write)
+    results["renderer"] = (cpu, console.file.getvalue())
+
+    return {
+        "tokens": tokens,
+        "rate": rate,
+        "fps": fps,
+        **{f"{label}_cpu_ms": cpu * 1000 * scale for label, (cpu, _) in results.items()},
+        **{f"{label}_terminal_kib": len(out.encode()) / 1024 * scale for label, (_, out) in results.items()},
+        "renderer_refreshes": renderer.refreshes,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=10_000)
+    parser.add_argument("--rate", type=float, default=4000.0, help="tokens per second")
+    parser.add_argument("--fps", type=float, default=12.0)
+    args = parser.parse_args()
+
+    results = run(args.tokens, args.rate, args.fps)
+    print(f"{args.tokens:,} tokens at {args.rate:,.0f} tokens/s, {args.fps:g} fps; per 10k tokens:")
+    for label in ("per_token", "live_whole", "renderer"):
+        print(
+            f"  {label:12}{results[f'{label}_cpu_ms']:9.0f} ms CPU"
+            f"{results[f'{label}_terminal_kib']:9.0f} KiB written"
+        )
+    print(f"  renderer refreshes: {results['renderer_refreshes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Benchmark: short sessions as separate processes vs attached to `jarvis serve`.
+
+Each session is a new Python process that starts a conversation and sends
+one message, as an editor integration or script would, against the fake
+API server. "local" sets up the database, tools and API client itself;
+"attached" connects to a daemon that already has them. Also times many
+sessions at once through the daemon.
+
+    python -m benchmarks.bench_serve [sessions]
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from benchmarks.fake_server import FakeAnthropicServer, Scenario
+from jarvis.remote import DaemonClient
+
+ROOT = Path(__file__).resolve().parent.parent
+CONCURRENT = 16
+LATENCY = 0.2  # seconds per fake API response, for the concurrent run
+
+_SESSIONS = {
+    "local": (
+        "from jarvis import config\n"
+        "from jarvis.agent import Agent\n"
+        "from jarvis.database import Database\n"
+        "db = Database(config.DB_PATH)\n"
+        "Agent(db, db.create_conversation(title='bench')).chat('hello')\n"
+        "db.close()\n"
+    ),
+    "attached": (
+        "from jarvis.remote import DaemonClient\n"
+        "with DaemonClient.connect() as daemon:\n"
+        "    daemon.chat(daemon.create_conversation(title='bench'), 'hello')\n"
+    ),
+}
+
+
+def _session_ms(label: str, env: dict[str, str], n: int) -> list[float]:
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", _SESSIONS[label]], env=env, cwd=ROOT, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def _start_daemon(env: dict[str, str], socket_path: str) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-m", "jarvis", "serve"], env=env, cwd=ROOT, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        # Not connect(): it checks the daemon's database against this process's JARVIS_DB_PATH
+        try:
+            with DaemonClient.connect(Path(socket_path)) as client:
+                client.ping()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("jarvis serve did not start")
+
+
+def _concurrent(socket_path: str) -> float:
+    """Seconds for CONCURRENT clients to each run a session at the same time."""
+    def session() -> None:
+        with DaemonClient.connect(Path(socket_path)) as daemon:
+            daemon.chat(daemon.create_conversation(title="bench"), "hello")
+
+    threads = [threading.Thread(target=session) for _ in range(CONCURRENT)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def run(sessions: int = 20) -> dict[str, Any]:
+    """p50/p95 ms per short session for each mode, and wall time of concurrent sessions."""
+    results: dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp, FakeAnthropicServer(Scenario()) as server:
+        socket_path = os.path.join(tmp, "jarvis.sock")
+        env = dict(
+            os.environ,
+            ANTHROPIC_API_KEY="bench",
+            ANTHROPIC_BASE_URL=server.url,
+            JARVIS_DB_PATH=os.path.join(tmp, "bench.db"),
+            JARVIS_SOCKET=socket_path,
+        )
+        results["local"] = _session_ms("local", env, sessions)
+        daemon = _start_daemon(env, socket_path)
+        try:
+            results["attached"] = _session_ms("attached", env, sessions)
+            server.scenario.latency = LATENCY
+            concurrent = _concurrent(socket_path)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    summary: dict[str, Any] = {"sessions": sessions}
+    for label in _SESSIONS:
+        ms = sorted(results[label])
+        summary[f"{label}_p50_ms"] = statistics.median(ms)
+        summary[f"{label}_p95_ms"] = ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))]
+    summary["speedup"] = summary["local_p50_ms"] / summary["attached_p50_ms"]
+    summary["concurrent_sessions"] = CONCURRENT
+    summary["concurrent_wall_ms"] = concurrent * 1000
+    summary["concurrent_serial_ms"] = CONCURRENT * LATENCY * 1000
+    return summary
+
+
+def main() -> None:
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    results = run(sessions)
+    print(f"{sessions} short sessions, one process each")
+    for label in _SESSIONS:
+        print(f"  {label:9} p50 {results[f'{label}_p50_ms']:7.0f} ms   p95 {results[f'{label}_p95_ms']:7.0f} ms")
+    print(f"  speedup (p50): {results['speedup']:.1f}x")
+    print(
+        f"{CONCURRENT} sessions at once through the daemon ({LATENCY * 1000:.0f} ms API latency): "
+        f"{results['concurrent_wall_ms']:.0f} ms (serially {results['concurrent_serial_ms']:.0f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
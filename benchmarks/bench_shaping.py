@@ -0,0 +1,95 @@
+"""Benchmark: the token estimator, and shaping long tool outputs to a budget.
+
+Estimator throughput is compared with the plain len // 4 heuristic. For
+shaping, a failing build log (errors in the middle and at the end) and
+this repo's source are shaped to the default budget: tokens kept, whether
+the error lines survived, time per call, and the tokens saved over the
+later API calls that resend the transcript.
+
+    python -m benchmarks.bench_shaping [later_calls]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from jarvis import config
+from jarvis.shaping import shape
+from jarvis.tokens import estimate
+
+ROOT = Path(__file__).resolve().parent.parent
+ERRORS = ("src/parser.c:812:14: error: 'node' undeclared", "ValueError: unexpected token", "FAILED tests/test_parse.py")
+
+
+def _build_log() -> str:
+    lines = [f"[{i:5d}/9000] CC src/module_{i}.c" for i in range(9000)]
+    lines[4200:4200] = [
+        "src/parser.c:812:14: error: 'node' undeclared (first use in this function)",
+        "  812 |     return node->next;",
+        "      |            ^~~~",
+    ]
+    lines += [
+        "Traceback (most recent call last):",
+        '  File "tools/gen.py", line 40, in <module>',
+        "    main()",
+        "ValueError: unexpected token",
+        "FAILED tests/test_parse.py::test_nested - AssertionError",
+        "make: *** [Makefile:12: all] Error 2",
+    ]
+    return "\n".join(lines)
+
+
+def _source() -> str:
+    return "".join(p.read_text() for p in sorted((ROOT / "jarvis").rglob("*.py")))
+
+
+def _per_call_ms(fn: Callable[[], Any], n: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def run(later_calls: int = 10) -> dict[str, Any]:
+    """Estimator MB/s; per sample: tokens before/after, errors kept, shaping ms, tokens saved."""
+    budget = config.TOOL_OUTPUT_TOKENS or 8000
+    source = _source()
+    results: dict[str, Any] = {"budget": budget, "later_calls": later_calls}
+
+    mb = len(source.encode()) / 1e6
+    results["estimate_mb_per_sec"] = mb / (_per_call_ms(lambda: estimate(source)) / 1000)
+    results["len4_mb_per_sec"] = mb / (_per_call_ms(lambda: len(source) // 4) / 1000)
+
+    for label, text in (("build_log", _build_log()), ("source", source)):
+        shaped = shape(text, budget, ref="toolu_bench")
+        before, after = estimate(text), estimate(shaped)
+        results[f"{label}_tokens"] = before
+        results[f"{label}_shaped_tokens"] = after
+        results[f"{label}_shape_ms"] = _per_call_ms(lambda: shape(text, budget, ref="toolu_bench"))
+        results[f"{label}_tokens_saved"] = (before - after) * (1 + later_calls)
+        if label == "build_log":
+            results["build_log_errors_kept"] = sum(error in shaped for error in ERRORS)
+    return results
+
+
+def main() -> None:
+    later_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = run(later_calls)
+    print(
+        f"estimate(): {results['estimate_mb_per_sec']:.0f} MB/s "
+        f"(len // 4: {results['len4_mb_per_sec']:,.0f} MB/s)"
+    )
+    print(f"shaped to {results['budget']:,} tokens, resent on {later_calls} later calls:")
+    for label in ("build_log", "source"):
+        print(
+            f"  {label:10}{results[f'{label}_tokens']:>9,} -> {results[f'{label}_shaped_tokens']:>6,} tokens"
+            f"{results[f'{label}_shape_ms']:8.1f} ms   {results[f'{label}_tokens_saved']:>10,} tokens saved"
+        )
+    print(f"  build_log error lines kept: {results['build_log_errors_kept']}/{len(ERRORS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark: run_shell latency per command, new process per call vs a shell session.
+
+Runs the same short commands through RunShellTool.execute with each
+JARVIS_SHELL_BACKEND, as the agent would within one conversation.
+
+    python -m benchmarks.bench_shell [commands]
+"""
+
+from __future__ import annotations
+
+import statistics
+import sys
+import time
+from typing import Any
+
+from jarvis import config, shell_session
+from jarvis.tools.base import ToolContext, tool_context
+from jarvis.tools.run_shell import RunShellTool
+
+COMMANDS = ("true", "echo hello", "pwd", "ls /", "cd /tmp && ls | head -5")
+
+
+def _latencies(tool: RunShellTool, backend: str, n: int) -> list[float]:
+    saved = config.SHELL_BACKEND
+    config.SHELL_BACKEND = backend
+    try:
+        with tool_context(ToolContext(conversation_id=f"bench-{backend}", call_id="bench")):
+            tool.execute(command="true")  # start the session outside the timings
+            times = []
+            for i in range(n):
+                start = time.perf_counter()
+                tool.execute(command=COMMANDS[i % len(COMMANDS)])
+                times.append(time.perf_counter() - start)
+        return times
+    finally:
+        config.SHELL_BACKEND = saved
+        shell_session.close_all()
+
+
+def run(n: int = 200) -> dict[str, Any]:
+    """p50/p95 per command in ms for each backend, and the p50 speedup."""
+    tool = RunShellTool()
+    results: dict[str, Any] = {}
+    for backend in ("spawn", "session"):
+        ms = sorted(t * 1000 for t in _latencies(tool, backend, n))
+        results[f"{backend}_p50_ms"] = statistics.median(ms)
+        results[f"{backend}_p95_ms"] = ms[min(len(ms) - 1, round(0.95 * (len(ms) - 1)))]
+    results["speedup"] = results["spawn_p50_ms"] / results["session_p50_ms"]
+    return results
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    results = run(n)
+    print(f"{n} commands: {', '.join(COMMANDS)}")
+    for backend in ("spawn", "session"):
+        print(f"  {backend:8} p50 {results[f'{backend}_p50_ms']:7.2f} ms   p95 {results[f'{backend}_p95_ms']:7.2f} ms")
+    print(f"  speedup (p50): {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
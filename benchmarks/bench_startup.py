@@ -0,0 +1,69 @@
+"""Benchmark: CLI cold-start import cost, from `python -X importtime`.
+
+Fails (exit 1) when the median cumulative import time of jarvis.__main__
+exceeds --max-ms, so it can guard against regressions in CI.
+
+    python -m benchmarks.bench_startup [--runs 5] [--max-ms 250] [--top 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+TARGET = "jarvis.__main__"
+
+
+def _importtime() -> dict[str, tuple[int, int]]:
+    """Run one fresh interpreter; return {module: (self_us, cumulative_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def run(runs: int = 5) -> dict[str, float]:
+    """Median cumulative import time of the CLI entry point and its largest imports, in ms."""
+    samples = [_importtime() for _ in range(runs)]
+    results = {"total_ms": statistics.median(s[TARGET][1] for s in samples) / 1000}
+    for name in samples[0]:
+        if all(name in s for s in samples):
+            results[name] = statistics.median(s[name][1] for s in samples) / 1000
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if total exceeds this")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    total = results.pop("total_ms")
+    top = sorted(
+        (item for item in results.items() if item[0] != TARGET),
+        key=lambda item: item[1],
+        reverse=True,
+    )[: args.top]
+    print(f"{TARGET}: {total:.1f} ms (median of {args.runs})")
+    for name, ms in top:
+        print(f"  {ms:8.1f} ms  {name}")
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"FAIL: {total:.1f} ms exceeds --max-ms {args.max_ms:.1f}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
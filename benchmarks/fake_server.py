@@ -0,0 +1,216 @@
+"""A local stand-in for the Anthropic Messages endpoint, for offline benchmarks.
+
+Serves POST /v1/messages with either a JSON body or an SSE stream (when the
+request has "stream": true), playing back a Scenario: a number of tool_use
+rounds followed by a final text answer, each after a configurable delay.
+
+The reply depends only on the request, so many clients can share a server:
+the number of assistant messages since the last real user turn says which
+round comes next.
+
+    with FakeAnthropicServer(Scenario(tool_rounds=2)) as server:
+        agent.client = server.client()
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any
+
+from jarvis.context import _is_turn_start
+
+if TYPE_CHECKING:
+    import anthropic
+
+    from jarvis.client import RetryPolicy
+
+
+@dataclass
+class Scenario:
+    """What the fake model says, and how slowly."""
+
+    tool_rounds: int = 0  # tool_use responses before the final answer
+    tool_calls_per_round: int = 1
+    tool_name: str = "read_file"
+    tool_input: dict[str, Any] = field(default_factory=lambda: {"path": "README.md"})
+    text: str = "Here is the answer you asked for, with a few sentences of detail."
+    latency: float = 0.0  # seconds before the response starts
+    chunk_latency: float = 0.0  # seconds between streamed deltas
+    input_tokens: int = 1000
+    output_tokens: int = 50
+    errors: int = 0  # requests answered with error_status before any normal response
+    error_status: int = 429
+    retry_after: float | None = None  # sent as retry-after with each error
+
+
+def _round(messages: list[dict[str, Any]]) -> int:
+    """Assistant responses already given in the current turn."""
+    count = 0
+    for msg in reversed(messages):
+        if _is_turn_start(msg):
+            break
+        count += msg["role"] == "assistant"
+    return count
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # avoid 40 ms delayed-ACK stalls on small writes
+    server: FakeAnthropicServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.split("?")[0] != "/v1/messages":
+            self._json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+        scenario = self.server.scenario
+        if self.server.record_request() <= scenario.errors:
+            self._error(scenario)
+            return
+        blocks, stop_reason = self.server.response_blocks(body["messages"])
+        time.sleep(scenario.latency)
+        message = {
+            "id": f"msg_{next(self.server.ids):06d}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": blocks,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": scenario.input_tokens, "output_tokens": scenario.output_tokens},
+        }
+        if body.get("stream"):
+            self._stream(message, scenario.chunk_latency)
+        else:
+            self._json(200, message)
+
+    def _error(self, scenario: Scenario) -> None:
+        time.sleep(scenario.latency)
+        kind = "rate_limit_error" if scenario.error_status == 429 else "overloaded_error"
+        headers = {} if scenario.retry_after is None else {"retry-after": str(scenario.retry_after)}
+        self._json(
+            scenario.error_status,
+            {"type": "error", "error": {"type": kind, "message": "injected by the fake server"}},
+            headers,
+        )
+
+    def _json(self, status: int, payload: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, message: dict[str, Any], chunk_latency: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(name: str, data: dict[str, Any], delay: float = 0.0) -> None:
+            if delay:
+                time.sleep(delay)
+            payload = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+            self.wfile.flush()
+
+        usage = message["usage"]
+        event("message_start", {
+            "type": "message_start",
+            "message": {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}},
+        })
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                event("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {"type": "text", "text": ""}})
+                for word in _chunks(block["text"]):
+                    event("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                  "delta": {"type": "text_delta", "text": word}}, chunk_latency)
+            else:
+                event("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {**block, "input": {}}})
+                event("content_block_delta", {"type": "content_block_delta", "index": index,
+                                              "delta": {"type": "input_json_delta",
+                                                        "partial_json": json.dumps(block["input"])}}, chunk_latency)
+            event("content_block_stop", {"type": "content_block_stop", "index": index})
+        event("message_delta", {"type": "message_delta",
+                                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _chunks(text: str) -> list[str]:
+    """Split text into word-sized deltas that join back to the original."""
+    words = text.split(" ")
+    return [w if i == len(words) - 1 else w + " " for i, w in enumerate(words)]
+
+
+class FakeAnthropicServer(ThreadingHTTPServer):
+    """Fake Messages API on 127.0.0.1, served from a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, scenario: Scenario | None = None, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.scenario = scenario or Scenario()
+        self.ids = itertools.count(1)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client(self, policy: RetryPolicy | None = None) -> anthropic.Anthropic:
+        """A client configured like the shared one (pool, retries), pointed at this server."""
+        from jarvis.client import create_client
+
+        return create_client(api_key="fake", base_url=self.url, policy=policy)
+
+    def async_client(self, policy: RetryPolicy | None = None) -> anthropic.AsyncAnthropic:
+        from jarvis.client import create_async_client
+
+        return create_async_client(api_key="fake", base_url=self.url, policy=policy)
+
+    def record_request(self) -> int:
+        """Count a request; returns how many there have been."""
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def response_blocks(self, messages: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], str]:
+        """Content blocks and stop_reason for the next response in the scenario."""
+        scenario = self.scenario
+        done = _round(messages)
+        if done < scenario.tool_rounds:
+            calls = [
+                {"type": "tool_use", "id": f"toolu_{done}_{i}", "name": scenario.tool_name, "input": scenario.tool_input}
+                for i in range(scenario.tool_calls_per_round)
+            ]
+            return calls, "tool_use"
+        return [{"type": "text", "text": scenario.text}], "end_turn"
+
+    def __enter__(self) -> FakeAnthropicServer:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
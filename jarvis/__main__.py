@@ -3,32 +3,41 @@
 from __future__ import annotations
 
 import json
+import logging
 import sys
+from typing import TYPE_CHECKING
 
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.text import Text
 
 from . import config
-from .agent import Agent
 from .database import Database
-from .models import ToolCall
+from .models import ToolCall, Usage
+from .remote import DaemonClient, DaemonError, RemoteAgent, connect
+from .render import StreamRenderer
+
+if TYPE_CHECKING:
+    from .agent import Agent
 
 console = Console()
 
 
-def confirm_action(tc: ToolCall) -> bool:
-    """Print a proposed action and ask the user for y/n confirmation."""
-    console.print()
+def _print_action(tc: ToolCall, title: str = "Action Proposed") -> None:
     console.print(Panel(
         Text.from_markup(
             f"[bold]Tool:[/bold] {tc.tool_name}\n"
             f"[bold]Input:[/bold] {json.dumps(tc.tool_input, indent=2)}"
         ),
-        title="[yellow]Action Proposed[/yellow]",
+        title=f"[yellow]{title}[/yellow]",
         border_style="yellow",
     ))
+
+
+def confirm_action(tc: ToolCall) -> bool:
+    """Print a proposed action and ask the user for y/n confirmation."""
+    console.print()
+    _print_action(tc)
     while True:
         answer = console.input("[yellow]Allow this action? (y/n): [/yellow]").strip().lower()
         if answer in ("y", "yes"):
@@ -38,18 +47,100 @@ def confirm_action(tc: ToolCall) -> bool:
         console.print("[dim]Please enter y or n.[/dim]")
 
 
+def confirm_actions(tool_calls: list[ToolCall]) -> list[bool]:
+    """Print several proposed actions and ask once to approve all, none, or pick."""
+    console.print()
+    for i, tc in enumerate(tool_calls, 1):
+        _print_action(tc, title=f"Action {i}/{len(tool_calls)} Proposed")
+    while True:
+        answer = console.input(
+            f"[yellow]Allow all {len(tool_calls)} actions? (y/n/p to pick): [/yellow]"
+        ).strip().lower()
+        if answer in ("y", "yes"):
+            return [True] * len(tool_calls)
+        if answer in ("n", "no"):
+            return [False] * len(tool_calls)
+        if answer in ("p", "pick"):
+            return [confirm_action(tc) for tc in tool_calls]
+        console.print("[dim]Please enter y, n or p.[/dim]")
+
+
 def _print_history(db: Database, conversation_id: str) -> None:
     """Print prior messages from a resumed conversation."""
-    msgs = db.get_messages(conversation_id)
+    from rich.markdown import Markdown  # pulls in markdown-it; only needed here
+
+    msgs = db.get_messages(conversation_id, columns=("role", "content"))
     for msg in msgs:
         if msg.role == "user" and msg.content:
             console.print(f"[bold cyan]You:[/bold cyan] {msg.content}")
         elif msg.role == "assistant" and msg.content:
-            console.print(Panel(Markdown(msg.content), title="Jarvis", border_style="dim blue"))
+            # The id is what /fork takes to continue from this reply
+            console.print(Panel(
+                Markdown(msg.content), title="Jarvis", subtitle=f"#{msg.id}", border_style="dim blue"
+            ))
     if msgs:
         console.print("[dim]--- end of history ---[/dim]\n")
 
 
+SEARCH_PAGE_SIZE = 10
+
+
+def _search(db: Database, query: str) -> None:
+    """Show ranked search results a page at a time."""
+    from rich.markup import escape
+
+    offset = 0
+    while True:
+        hits = db.search(query, limit=SEARCH_PAGE_SIZE, offset=offset, highlight=("\x02", "\x03"))
+        if not hits and not offset:
+            console.print("[dim]No matches.[/dim]")
+            return
+        for i, hit in enumerate(hits, offset + 1):
+            snippet = (
+                escape(" ".join(hit["snippet"].split()))
+                .replace("\x02", "[bold yellow]")
+                .replace("\x03", "[/bold yellow]")
+            )
+            console.print(
+                f"  [bold]{i}.[/bold] {hit['conversation_id']}  "
+                f"[dim]{hit['created_at'][:16]}  {hit['role']}  #{hit['id']}[/dim]\n     {snippet}"
+            )
+        if len(hits) < SEARCH_PAGE_SIZE:
+            return
+        offset += SEARCH_PAGE_SIZE
+        answer = console.input("[dim]Enter for more results, q to stop: [/dim]").strip().lower()
+        if answer:
+            return
+
+
+HISTORY_PAGE_SIZE = 20
+
+
+def _conversation_line(c: dict) -> str:
+    """One-line listing of a conversation from list_conversations()."""
+    from rich.markup import escape
+
+    preview = escape(c["last_message_preview"][:60]) if c["last_message_preview"] else ""
+    return (
+        f"{c['id']}  [dim]{c['updated_at'][:16]}[/dim]  "
+        f"{escape(c['title'] or '')}  [dim]({c['message_count']} msgs)[/dim]  {preview}"
+    )
+
+
+def _print_conversations(db: Database) -> None:
+    """List conversations a page at a time, newest first."""
+    before = None
+    while True:
+        convos = db.list_conversations(limit=HISTORY_PAGE_SIZE, before=before)
+        for c in convos:
+            console.print(f"  {_conversation_line(c)}")
+        if len(convos) < HISTORY_PAGE_SIZE:
+            return
+        before = (convos[-1]["updated_at"], convos[-1]["id"])
+        if console.input("[dim]Enter for more, q to stop: [/dim]").strip():
+            return
+
+
 def _resume_conversation(db: Database) -> str | None:
     """Show recent conversations and let the user pick one. Returns conversation id or None."""
     convos = db.list_conversations(limit=10)
@@ -59,12 +150,7 @@ def _resume_conversation(db: Database) -> str | None:
 
     console.print("\n[bold]Recent conversations:[/bold]")
     for i, c in enumerate(convos, 1):
-        msg_count = db.message_count(c["id"])
-        console.print(
-            f"  [bold]{i}.[/bold] {c['id']}  "
-            f"[dim]{c['updated_at'][:16]}[/dim]  "
-            f"{c['title']}  [dim]({msg_count} msgs)[/dim]"
-        )
+        console.print(f"  [bold]{i}.[/bold] {_conversation_line(c)}")
 
     while True:
         choice = console.input("\n[yellow]Enter number or conversation ID (or 'c' to cancel): [/yellow]").strip()
@@ -78,23 +164,160 @@ def _resume_conversation(db: Database) -> str | None:
         except ValueError:
             pass
         # Try as a conversation ID
-        if db.get_conversation(choice):
+        if _find_conversation(db, choice):
             return choice
         console.print("[dim]Invalid choice. Try again.[/dim]")
 
 
+def _ms(value: float | None) -> str:
+    if value is None:
+        return "-"
+    if value >= 1000:
+        return f"{value / 1000:.2f} s"
+    return f"{value:.0f} ms" if value >= 10 else f"{value:.1f} ms"
+
+
+def _print_stats(db: Database, conversation_id: str | None) -> None:
+    """p50/p95 turn timings, token spend and per-tool figures."""
+    from .telemetry import TIMINGS, stats
+
+    report = stats(db, conversation_id)
+    scope = "this conversation" if conversation_id else "all conversations"
+    if not report["turns"]:
+        console.print(f"[dim]No turns recorded for {scope} yet.[/dim]")
+        return
+    tokens = report["tokens"]
+    console.print(
+        f"\n[bold]{report['turns']} turns[/bold] in {scope} "
+        f"[dim]({report['rounds']} API rounds, {report['errors']} failed)[/dim]\n"
+        f"  tokens: input [bold]{tokens.input_tokens:,}[/bold]  output [bold]{tokens.output_tokens:,}[/bold]  "
+        f"cache read [bold]{tokens.cache_read_tokens:,}[/bold]  cache write [bold]{tokens.cache_write_tokens:,}[/bold]"
+    )
+    console.print(f"  [dim]{'':14}{'p50':>10}{'p95':>10}[/dim]")
+    for column, label in TIMINGS.items():
+        p50, p95 = report["timings"][column]
+        console.print(f"  {label:14}{_ms(p50):>10}{_ms(p95):>10}")
+    if report["tools"]:
+        console.print(f"\n  [dim]{'tool':14}{'calls':>7}{'errors':>8}{'p50':>10}{'p95':>10}{'result tokens':>15}[/dim]")
+        for name, tool in report["tools"].items():
+            console.print(
+                f"  {name:14}{tool['calls']:>7}{tool['errors']:>8}"
+                f"{_ms(tool['p50_ms']):>10}{_ms(tool['p95_ms']):>10}{tool['result_tokens']:>15,}"
+            )
+    console.print()
+
+
+def _print_storage(db: Database) -> None:
+    """Space used by large tool outputs in the blob store, and saved by it."""
+    blobs = db.blob_stats()
+    if not blobs["blobs"]:
+        console.print("[dim]No tool outputs in the blob store yet.[/dim]")
+        return
+    saved = blobs["saved_bytes"] / blobs["referenced_bytes"] if blobs["referenced_bytes"] else 0.0
+    console.print(
+        f"  {blobs['references']:,} large tool outputs ({blobs['referenced_bytes']:,} bytes) "
+        f"stored as {blobs['blobs']:,} blobs ({blobs['unique_bytes']:,} bytes, "
+        f"[bold]{blobs['stored_bytes']:,}[/bold] compressed)\n"
+        f"  [dim]saved {blobs['saved_bytes']:,} bytes ({saved:.0%})[/dim]"
+    )
+
+
+def _find_conversation(db: Database, conversation_id: str) -> bool:
+    """Whether the conversation exists, restoring it first if it was archived."""
+    if db.get_conversation(conversation_id):
+        return True
+    if db.get_archived(conversation_id) is None:
+        return False
+    from .maintenance import restore
+
+    try:
+        restore(db, conversation_id)
+    except (OSError, ValueError) as exc:
+        console.print(f"[red]Could not restore {conversation_id} from the archive: {exc}[/red]")
+        return False
+    console.print(f"[dim]Restored {conversation_id} from the archive.[/dim]")
+    return True
+
+
+def _new_conversation(db: Database, daemon: DaemonClient | None) -> str:
+    if daemon is not None:
+        return daemon.create_conversation(title="CLI session")  # the daemon does the writing
+    return db.create_conversation(title="CLI session")
+
+
+def _fork_conversation(
+    db: Database, daemon: DaemonClient | None, conversation_id: str, message_id: int | None
+) -> str:
+    if daemon is not None:
+        return daemon.fork_conversation(conversation_id, message_id)
+    return db.fork_conversation(conversation_id, message_id)
+
+
+def _agent(db: Database, daemon: DaemonClient | None, conversation_id: str) -> Agent | RemoteAgent:
+    """An Agent, or a RemoteAgent when attached to `jarvis serve`."""
+    if daemon is not None:
+        return RemoteAgent(daemon, conversation_id)
+    from .agent import Agent
+
+    return Agent(db, conversation_id)
+
+
 def main() -> None:
-    config.validate()
+    if sys.argv[1:2] == ["batch"]:
+        from .batch import main as batch_main
+
+        sys.exit(batch_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        from .server import main as serve_main
+
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["maintenance"]:
+        from .maintenance import main as maintenance_main
+
+        sys.exit(maintenance_main(sys.argv[2:]))
+
+    from rich.logging import RichHandler
+
+    # Through the console, so log lines from background threads don't break a live reply
+    logging.basicConfig(
+        level=config.LOG_LEVEL,
+        format="%(message)s",
+        handlers=[RichHandler(console=console, show_path=False, show_time=False)],
+    )
+
+    daemon = None
+    if config.DAEMON != "off":
+        daemon = connect()
+    if daemon is None:
+        config.validate()  # the daemon has the API key otherwise
 
     db = Database(config.DB_PATH)
+    if config.OTEL_EXPORT:
+        from . import telemetry
+
+        try:
+            telemetry.add_exporter(telemetry.OTelExporter())
+        except ImportError:
+            console.print("[yellow]JARVIS_OTEL_EXPORT is set but opentelemetry-api is not installed.[/yellow]")
+
+    # A new conversation each session, created with its first message
+    conversation_id: str | None = None
+    agent: Agent | RemoteAgent | None = None
 
-    # Start a new conversation each session
-    conversation_id = db.create_conversation(title="CLI session")
-    agent = Agent(db, conversation_id)
+    maintenance = None
+    if daemon is None and config.MAINTENANCE_HOURS > 0:  # otherwise the daemon runs it
+        from .maintenance import BackgroundMaintenance
 
+        # Reads `conversation_id` as it is when a run checks
+        maintenance = BackgroundMaintenance(
+            config.MAINTENANCE_HOURS, in_use=lambda: [conversation_id] if conversation_id else []
+        )
+        maintenance.start()
+
+    attached = f" [dim](attached to jarvis serve at {config.SOCKET_PATH})[/dim]" if daemon else ""
     console.print(Panel(
-        "[bold green]Jarvis[/bold green] is ready. Type your message below.\n"
-        "Commands: [dim]/quit[/dim]  [dim]/history[/dim]  [dim]/resume[/dim]  [dim]/new[/dim]",
+        f"[bold green]Jarvis[/bold green] is ready. Type your message below.{attached}\n"
+        "Commands: [dim]/quit[/dim]  [dim]/history[/dim]  [dim]/resume[/dim]  [dim]/new[/dim]  [dim]/fork[/dim]  [dim]/search[/dim]  [dim]/usage[/dim]  [dim]/stats[/dim]  [dim]/storage[/dim]",
         border_style="green",
     ))
 
@@ -112,50 +335,130 @@ def main() -> None:
                 break
 
             if user_input.lower() == "/history":
-                for c in db.list_conversations():
-                    msg_count = db.message_count(c["id"])
+                _print_conversations(db)
+                continue
+
+            if user_input.lower() == "/usage":
+                usage = db.get_usage(conversation_id) if conversation_id else Usage()
+                console.print(
+                    f"  input [bold]{usage.input_tokens:,}[/bold]  "
+                    f"output [bold]{usage.output_tokens:,}[/bold]  "
+                    f"cache read [bold]{usage.cache_read_tokens:,}[/bold]  "
+                    f"cache write [bold]{usage.cache_write_tokens:,}[/bold]  "
+                    f"[dim](hit rate {usage.cache_hit_rate:.0%})[/dim]"
+                )
+                if daemon is None:  # otherwise the cache is in the daemon
+                    from .tools.read_file import cache_stats
+
+                    stats = cache_stats()
                     console.print(
-                        f"  {c['id']}  [dim]{c['updated_at'][:16]}[/dim]  "
-                        f"{c['title']}  [dim]({msg_count} msgs)[/dim]"
+                        f"  [dim]read_file cache: {stats['hits']} hits, {stats['misses']} misses, "
+                        f"{stats['unchanged']} unchanged, {stats['bytes']:,} bytes cached[/dim]"
                     )
                 continue
 
+            if user_input.lower().startswith("/stats"):
+                everywhere = user_input.lower().split()[1:] == ["all"]
+                if everywhere or conversation_id:
+                    _print_stats(db, None if everywhere else conversation_id)
+                else:
+                    console.print("[dim]No turns recorded for this conversation yet.[/dim]")
+                continue
+
+            if user_input.lower() == "/storage":
+                _print_storage(db)
+                continue
+
+            if user_input.lower().startswith("/search"):
+                parts = user_input.split(maxsplit=1)
+                if len(parts) < 2:
+                    console.print("[dim]Usage: /search <words>  (word* matches a prefix)[/dim]")
+                else:
+                    _search(db, parts[1])
+                continue
+
             if user_input.lower().startswith("/resume"):
                 parts = user_input.split(maxsplit=1)
-                if len(parts) == 2 and db.get_conversation(parts[1].strip()):
+                if len(parts) == 2 and _find_conversation(db, parts[1].strip()):
                     cid = parts[1].strip()
                 else:
                     cid = _resume_conversation(db)
                 if cid:
                     conversation_id = cid
-                    agent = Agent(db, conversation_id)
+                    agent = _agent(db, daemon, conversation_id)
                     convo = db.get_conversation(conversation_id)
                     console.print(f"\n[green]Resumed conversation [bold]{conversation_id}[/bold][/green]")
                     _print_history(db, conversation_id)
                 continue
 
+            if user_input.lower().startswith("/fork"):
+                parts = user_input.split()
+                if len(parts) > 2 or (len(parts) == 2 and not parts[1].lstrip("#").isdigit()):
+                    console.print("[dim]Usage: /fork [message id]  (default: the latest reply)[/dim]")
+                    continue
+                message_id = int(parts[1].lstrip("#")) if len(parts) == 2 else None
+                if conversation_id is None:
+                    console.print("[dim]Nothing to fork yet.[/dim]")
+                    continue
+                try:
+                    fork = _fork_conversation(db, daemon, conversation_id, message_id)
+                except (ValueError, DaemonError) as exc:
+                    console.print(f"[red]{exc}[/red]")
+                    continue
+                console.print(f"[green]Forked [bold]{conversation_id}[/bold] into [bold]{fork}[/bold][/green]")
+                conversation_id = fork
+                agent = _agent(db, daemon, conversation_id)
+                continue
+
             if user_input.lower() == "/new":
-                conversation_id = db.create_conversation(title="CLI session")
-                agent = Agent(db, conversation_id)
-                console.print(f"[green]Started new conversation [bold]{conversation_id}[/bold][/green]")
+                conversation_id, agent = None, None
+                console.print("[green]Started a new conversation[/green]")
                 continue
 
+            if conversation_id is None:
+                conversation_id = _new_conversation(db, daemon)
+                agent = _agent(db, daemon, conversation_id)
+
             console.print()
-            console.print("[bold blue]Jarvis:[/bold blue] ", end="")
+            console.print("[bold blue]Jarvis:[/bold blue]")
+            renderer = StreamRenderer(console)
+
+            def confirm(tc: ToolCall) -> bool:
+                renderer.finish()  # stop the live view before prompting
+                return confirm_action(tc)
+
+            def confirm_all(tool_calls: list[ToolCall]) -> list[bool]:
+                renderer.finish()
+                return confirm_actions(tool_calls)
+
             try:
-                reply = agent.chat(
-                    user_input,
-                    confirm_fn=confirm_action,
-                    stream_fn=lambda chunk: console.print(chunk, end="", highlight=False),
-                )
+                with renderer:
+                    agent.chat(
+                        user_input,
+                        confirm_fn=confirm,
+                        confirm_batch_fn=confirm_all,
+                        stream_fn=renderer.write,
+                        output_fn=renderer.write_raw,
+                    )
             except KeyboardInterrupt:
                 console.print("\n[dim]Interrupted.[/dim]")
                 continue
-            console.print("\n")
+            except DaemonError as exc:
+                console.print(f"\n[red]{exc.kind}: {exc}[/red]")
+                continue
+            except ConnectionError:
+                console.print("\n[red]Lost the connection to jarvis serve.[/red]")
+                break
+            console.print()
 
     except KeyboardInterrupt:
         pass
     finally:
+        if maintenance is not None:
+            maintenance.stop()
+            maintenance.join()  # let an archive write finish rather than cut it off
+        if daemon is not None:
+            daemon.close()
         db.close()
         console.print("\n[dim]Goodbye.[/dim]")
 
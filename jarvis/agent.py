@@ -2,24 +2,324 @@
 
 from __future__ import annotations
 
-from typing import Any, Callable
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Iterator
 
-import anthropic
-
-from . import config
+from . import config, telemetry
+from .context import ContextManager, result_sent
 from .database import Database
-from .models import Message, ToolCall, ToolResult
+from .models import Message, StoredMessage, ToolCall, ToolResult, Usage
+from .shaping import shape
+from .telemetry import TurnTrace
 from .tools import get_tool, tool_definitions
+from .tokens import estimate
+from .tools.base import Tool, ToolContext, tool_context
+
+if TYPE_CHECKING:
+    import anthropic
 
 ConfirmFn = Callable[[ToolCall], bool]
+ConfirmBatchFn = Callable[[list[ToolCall]], list[bool]]
 StreamFn = Callable[[str], None]
 
+logger = logging.getLogger(__name__)
+
+_EPHEMERAL = {"type": "ephemeral"}
+# Stored columns the API transcript is built from (created_at is not sent)
+_API_COLUMNS = ("role", "content", "tool_calls", "tool_results")
+
+
+def _to_api(msg: Message | StoredMessage) -> dict[str, Any]:
+    """Convert a stored message to Anthropic API format."""
+    if msg.role == "user" and msg.tool_results:
+        content: list[dict[str, Any]] = []
+        for tr in msg.tool_results:
+            content.append({
+                "type": "tool_result",
+                "tool_use_id": tr.call_id,
+                "content": tr.output,
+                **({"is_error": True} if tr.is_error else {}),
+            })
+        return {"role": "user", "content": content}
+    if msg.role == "assistant" and msg.tool_calls:
+        content = []
+        if msg.content:
+            content.append({"type": "text", "text": msg.content})
+        for tc in msg.tool_calls:
+            content.append({
+                "type": "tool_use",
+                "id": tc.call_id,
+                "name": tc.tool_name,
+                "input": tc.tool_input,
+            })
+        return {"role": "assistant", "content": content}
+    return {"role": msg.role, "content": msg.content}
+
+
+def _mark_last_block(msg: dict[str, Any]) -> dict[str, Any]:
+    """Return a copy of an API message with a cache breakpoint on its last block."""
+    content = msg["content"]
+    if isinstance(content, str):
+        if not content:
+            return msg
+        blocks = [{"type": "text", "text": content}]
+    else:
+        if not content:
+            return msg
+        blocks = list(content)
+    blocks[-1] = {**blocks[-1], "cache_control": _EPHEMERAL}
+    return {**msg, "content": blocks}
+
+
+def _with_cache_breakpoints(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Mark the end of the conversation and the end of the previous request.
+
+    Each round appends an assistant reply and a user message, so the
+    breakpoint written last round sits three from the end and is read back,
+    while the one on the final message is written for the next round.
+    The stored transcript is left untouched.
+    """
+    marked = list(messages)
+    for idx in (len(marked) - 1, len(marked) - 3):
+        if idx >= 0:
+            marked[idx] = _mark_last_block(marked[idx])
+    return marked
+
+
+def _parse_usage(usage: Any) -> Usage:
+    return Usage(
+        input_tokens=getattr(usage, "input_tokens", 0) or 0,
+        output_tokens=getattr(usage, "output_tokens", 0) or 0,
+        cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+        cache_write_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+    )
+
+
+# (index in the model's tool_calls, tool, call)
+_PlannedCall = tuple[int, Tool, ToolCall]
+
+
+class _AgentBase:
+    """Transcript, request building and tool planning shared by Agent and AsyncAgent."""
 
-class Agent:
     def __init__(self, db: Database, conversation_id: str) -> None:
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
         self.db = db
         self.conversation_id = conversation_id
+        # API-formatted transcript, loaded once and extended as messages are saved
+        self._messages: list[dict[str, Any]] = []
+        self._trace: TurnTrace | None = None  # set while chat() runs
+        self._sent: list[dict[str, Any]] = []  # messages of the latest request, as fitted
+        self._pending_saves: list[Callable[[], None]] = []  # see ToolContext.on_saved
+
+    def _build_messages(self) -> list[dict[str, Any]]:
+        """Load stored messages and convert them to Anthropic API format."""
+        return [_to_api(msg) for msg in self.db.get_messages(self.conversation_id, columns=_API_COLUMNS)]
+
+    def _write(self, msgs: list[Message], usage: Usage | None) -> None:
+        """Persist messages (and usage) in one transaction."""
+        with self._span(telemetry.DB, messages=len(msgs)), self.db.transaction():
+            self.db.add_messages(self.conversation_id, msgs)
+            if usage is not None:
+                self.db.add_usage(self.conversation_id, usage)
+
+    # -- tool context --
+
+    def _when_saved(self, fn: Callable[[], None]) -> None:
+        """Run fn once the current round is stored (ToolContext.on_saved)."""
+        self._pending_saves.append(fn)
+
+    def _saved(self) -> None:
+        pending, self._pending_saves = self._pending_saves, []
+        for fn in pending:
+            fn()
+
+    def _in_context(self, call_id: str) -> bool:
+        """Whether the latest request carried call_id's result in full (ToolContext.in_context)."""
+        return result_sent(self._sent, self._messages, call_id)
+
+    # -- telemetry --
+
+    def _span(self, name: str, **attributes: Any) -> AbstractContextManager[dict[str, Any]]:
+        """Time a block as part of the current turn (a no-op outside chat())."""
+        if self._trace is None:
+            return nullcontext(attributes)
+        return self._trace.span(name, **attributes)
+
+    def _first_token(self) -> None:
+        if self._trace is not None:
+            self._trace.first_token()
+
+    def _count_round(self, usage: Usage) -> None:
+        if self._trace is not None:
+            self._trace.add_round(usage)
+
+    def _count_usage(self, usage: Usage) -> None:
+        if self._trace is not None:
+            self._trace.add_usage(usage)
+
+    @staticmethod
+    def _tool_finished(span: dict[str, Any], tool: Tool, result: ToolResult) -> ToolResult:
+        """Shape the output to the tool's token budget and record the call's figures."""
+        output = shape(result.output, tool.output_budget, ref=result.call_id)
+        if output is not result.output:
+            result = ToolResult(result.call_id, output, result.is_error, full_output=result.output)
+            span["full_tokens"] = estimate(result.full_output)
+        span["result_tokens"] = estimate(output)
+        if result.is_error:
+            span["error"] = True
+        return result
+
+    def _tool_output(self, call_id: str) -> str | None:
+        """Full output of an earlier call, for read_output (see ToolContext.tool_output)."""
+        return self.db.tool_output(self.conversation_id, call_id)
+
+    def _finish_turn(self, trace: TurnTrace, error: str | None) -> None:
+        """Export the turn's spans and store its timings and usage.
+
+        Failing to store them is logged, not raised: it must not replace the
+        turn's own error or lose its reply.
+        """
+        turn = trace.finish(error)
+        if config.TELEMETRY:
+            try:
+                self.db.add_turn(self.conversation_id, turn)
+            except Exception as exc:
+                logger.warning("could not store telemetry for a turn in %s: %s", self.conversation_id, exc)
+
+    def _request(self, messages: list[dict[str, Any]]) -> dict[str, Any]:
+        """Request parameters shared by batch and streaming calls.
+
+        With prompt caching on, breakpoints go on the system prompt, the last
+        tool definition and the tail of the conversation, so everything but
+        the newest messages is served from cache on the next round.
+        """
+        system: Any = config.SYSTEM_PROMPT
+        tools = list(tool_definitions())
+        if config.PROMPT_CACHING:
+            system = [{"type": "text", "text": system, "cache_control": _EPHEMERAL}]
+            if tools:
+                tools[-1] = {**tools[-1], "cache_control": _EPHEMERAL}
+            messages = _with_cache_breakpoints(messages)
+        return {
+            "model": config.MODEL,
+            "max_tokens": 4096,
+            "system": system,
+            "tools": tools,
+            "messages": messages,
+        }
+
+    @staticmethod
+    def _summary_request(transcript: str) -> dict[str, Any]:
+        return {
+            "model": config.MODEL,
+            "max_tokens": 2048,
+            "system": config.SUMMARY_PROMPT,
+            "messages": [{"role": "user", "content": transcript}],
+        }
+
+    @staticmethod
+    def _parse_response(response: Any) -> tuple[str, list[ToolCall], str, Usage]:
+        """Extract text, tool calls, stop reason and token usage from a response."""
+        text_parts: list[str] = []
+        tool_calls: list[ToolCall] = []
+
+        for block in response.content:
+            if block.type == "text":
+                text_parts.append(block.text)
+            elif block.type == "tool_use":
+                tool_calls.append(ToolCall(
+                    tool_name=block.name,
+                    tool_input=block.input,
+                    call_id=block.id,
+                ))
+
+        return (
+            "\n".join(text_parts),
+            tool_calls,
+            response.stop_reason,
+            _parse_usage(getattr(response, "usage", None)),
+        )
+
+    @staticmethod
+    def _plan_tools(
+        tool_calls: list[ToolCall],
+    ) -> tuple[list[ToolResult | None], list[_PlannedCall]]:
+        """Resolve tools; unknown ones get an error result straight away."""
+        results: list[ToolResult | None] = [None] * len(tool_calls)
+        runnable: list[_PlannedCall] = []
+        for i, tc in enumerate(tool_calls):
+            tool = get_tool(tc.tool_name)
+            if tool is None:
+                results[i] = ToolResult(
+                    call_id=tc.call_id,
+                    output=f"Error: unknown tool '{tc.tool_name}'",
+                    is_error=True,
+                )
+                continue
+            runnable.append((i, tool, tc))
+        return results, runnable
+
+    @staticmethod
+    def _approved(
+        runnable: list[_PlannedCall],
+        approvals: list[bool],
+        results: list[ToolResult | None],
+    ) -> list[_PlannedCall]:
+        """Apply approvals (one per confirmable call, in order); denied calls get an error result."""
+        answers = iter(approvals)
+        approved: list[_PlannedCall] = []
+        for i, tool, tc in runnable:
+            if not tool.requires_confirmation or next(answers, False):
+                approved.append((i, tool, tc))
+            else:
+                results[i] = ToolResult(
+                    call_id=tc.call_id,
+                    output="Action was denied by user.",
+                    is_error=True,
+                )
+        return approved
+
+    @staticmethod
+    def _batches(approved: list[_PlannedCall]) -> Iterator[list[_PlannedCall]]:
+        """Group consecutive concurrency-safe calls; unsafe calls run alone."""
+        batch: list[_PlannedCall] = []
+        for item in approved:
+            if item[1].concurrency_safe:
+                batch.append(item)
+                continue
+            if batch:
+                yield batch
+                batch = []
+            yield [item]
+        if batch:
+            yield batch
+
+
+class Agent(_AgentBase):
+    def __init__(self, db: Database, conversation_id: str) -> None:
+        super().__init__(db, conversation_id)
+        self._client: anthropic.Anthropic | None = None
+        self._messages = self._build_messages()
+        self.context = ContextManager(
+            db,
+            conversation_id,
+            summarize_fn=self._summarize if config.CONTEXT_SUMMARIES else None,
+        )
+
+    @property
+    def client(self) -> anthropic.Anthropic:
+        """The shared Anthropic client, fetched on the first API call (importing the SDK is slow)."""
+        if self._client is None:
+            from .client import get_client
+
+            self._client = get_client()
+        return self._client
+
+    @client.setter
+    def client(self, client: anthropic.Anthropic) -> None:
+        self._client = client
 
     # -- public API --
 
@@ -28,97 +328,99 @@ class Agent:
         user_text: str,
         *,
         confirm_fn: ConfirmFn | None = None,
+        confirm_batch_fn: ConfirmBatchFn | None = None,
         stream_fn: StreamFn | None = None,
+        output_fn: StreamFn | None = None,
     ) -> str:
-        """Send user text, handle tool calls, return final assistant text."""
-        self.db.add_message(
-            self.conversation_id,
-            Message(role="user", content=user_text),
-        )
+        """Send user text, handle tool calls, return final assistant text.
 
-        messages = self._build_messages()
-        return self._run_loop(messages, confirm_fn=confirm_fn, stream_fn=stream_fn)
+        When the model requests several confirmable tools at once and
+        confirm_batch_fn is given, it is asked once for all of them instead
+        of calling confirm_fn per tool; without confirm_fn it is asked for
+        single calls too. With JARVIS_SHELL_LIVE_OUTPUT, tool
+        output goes to output_fn while tools run (default: stream_fn).
+        """
+        self._trace = trace = TurnTrace()
+        error = None
+        try:
+            self._append(Message(role="user", content=user_text))
+            return self._run_loop(
+                confirm_fn=confirm_fn,
+                confirm_batch_fn=confirm_batch_fn,
+                stream_fn=stream_fn,
+                output_fn=output_fn or stream_fn,
+            )
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            self._trace = None
+            self._pending_saves = []  # results of an interrupted round were never stored
+            self._finish_turn(trace, error)
 
     # -- internals --
 
-    def _build_messages(self) -> list[dict[str, Any]]:
-        """Convert stored messages to Anthropic API format."""
-        api_msgs: list[dict[str, Any]] = []
-        for msg in self.db.get_messages(self.conversation_id):
-            if msg.role == "user" and msg.tool_results:
-                content: list[dict[str, Any]] = []
-                for tr in msg.tool_results:
-                    content.append({
-                        "type": "tool_result",
-                        "tool_use_id": tr.call_id,
-                        "content": tr.output,
-                        **({"is_error": True} if tr.is_error else {}),
-                    })
-                api_msgs.append({"role": "user", "content": content})
-            elif msg.role == "assistant" and msg.tool_calls:
-                content = []
-                if msg.content:
-                    content.append({"type": "text", "text": msg.content})
-                for tc in msg.tool_calls:
-                    content.append({
-                        "type": "tool_use",
-                        "id": tc.call_id,
-                        "name": tc.tool_name,
-                        "input": tc.tool_input,
-                    })
-                api_msgs.append({"role": "assistant", "content": content})
-            else:
-                api_msgs.append({"role": msg.role, "content": msg.content})
-        return api_msgs
+    def _append(self, *msgs: Message, usage: Usage | None = None) -> None:
+        """Persist messages (and usage) in one transaction, then extend the transcript."""
+        self._write(list(msgs), usage)
+        self._messages.extend(_to_api(msg) for msg in msgs)
+        self._saved()
 
     def _run_loop(
         self,
-        messages: list[dict[str, Any]],
         *,
         confirm_fn: ConfirmFn | None = None,
+        confirm_batch_fn: ConfirmBatchFn | None = None,
         stream_fn: StreamFn | None = None,
+        output_fn: StreamFn | None = None,
     ) -> str:
         """Call the API in a loop until the model stops using tools."""
         while True:
+            with self._span(telemetry.CONTEXT):
+                messages = self._sent = self.context.fit(self._messages)
             if stream_fn:
-                assistant_text, tool_calls, stop_reason = self._call_streaming(
+                assistant_text, tool_calls, stop_reason, usage = self._call_streaming(
                     messages, stream_fn=stream_fn
                 )
             else:
-                assistant_text, tool_calls, stop_reason = self._call_batch(messages)
-
-            # Save assistant message
-            self.db.add_message(
-                self.conversation_id,
-                Message(role="assistant", content=assistant_text, tool_calls=tool_calls),
-            )
+                assistant_text, tool_calls, stop_reason, usage = self._call_batch(messages)
+            self._count_round(usage)
+            assistant = Message(role="assistant", content=assistant_text, tool_calls=tool_calls)
 
             if stop_reason != "tool_use" or not tool_calls:
+                self._append(assistant, usage=usage)
                 return assistant_text
 
             # Execute tools
-            tool_results = self._execute_tools(tool_calls, confirm_fn=confirm_fn)
+            tool_results = self._execute_tools(
+                tool_calls,
+                confirm_fn=confirm_fn,
+                confirm_batch_fn=confirm_batch_fn,
+                output_fn=output_fn if config.SHELL_LIVE_OUTPUT else None,
+            )
 
-            # Save tool results as a user message
-            self.db.add_message(
-                self.conversation_id,
+            # Save the assistant message and its tool results together, so a
+            # tool_use is never stored without its tool_result
+            self._append(
+                assistant,
                 Message(role="user", content="", tool_results=tool_results),
+                usage=usage,
             )
 
-            # Rebuild messages for next iteration
-            messages = self._build_messages()
+    def _summarize(self, transcript: str) -> str:
+        """Ask the model for a summary of older conversation history."""
+        response = self.client.messages.create(**self._summary_request(transcript))
+        usage = _parse_usage(getattr(response, "usage", None))
+        self.db.add_usage(self.conversation_id, usage)
+        self._count_usage(usage)
+        return "\n".join(b.text for b in response.content if b.type == "text")
 
     def _call_batch(
         self, messages: list[dict[str, Any]]
-    ) -> tuple[str, list[ToolCall], str]:
+    ) -> tuple[str, list[ToolCall], str, Usage]:
         """Non-streaming API call."""
-        response = self.client.messages.create(
-            model=config.MODEL,
-            max_tokens=4096,
-            system=config.SYSTEM_PROMPT,
-            tools=tool_definitions(),
-            messages=messages,
-        )
+        with self._span(telemetry.API, streaming=False):
+            response = self.client.messages.create(**self._request(messages))
         return self._parse_response(response)
 
     def _call_streaming(
@@ -126,72 +428,89 @@ class Agent:
         messages: list[dict[str, Any]],
         *,
         stream_fn: StreamFn,
-    ) -> tuple[str, list[ToolCall], str]:
+    ) -> tuple[str, list[ToolCall], str, Usage]:
         """Streaming API call — emits text chunks via stream_fn."""
-        with self.client.messages.stream(
-            model=config.MODEL,
-            max_tokens=4096,
-            system=config.SYSTEM_PROMPT,
-            tools=tool_definitions(),
-            messages=messages,
-        ) as stream:
-            for text in stream.text_stream:
-                stream_fn(text)
-            response = stream.get_final_message()
+        with self._span(telemetry.API, streaming=True):
+            with self.client.messages.stream(**self._request(messages)) as stream:
+                waiting = True
+                for event in stream:
+                    if waiting and event.type == "content_block_delta":
+                        waiting = False
+                        self._first_token()
+                    if event.type == "text":
+                        stream_fn(event.text)
+                response = stream.get_final_message()
         return self._parse_response(response)
 
-    @staticmethod
-    def _parse_response(response: Any) -> tuple[str, list[ToolCall], str]:
-        """Extract text, tool calls, and stop reason from a response."""
-        text_parts: list[str] = []
-        tool_calls: list[ToolCall] = []
-
-        for block in response.content:
-            if block.type == "text":
-                text_parts.append(block.text)
-            elif block.type == "tool_use":
-                tool_calls.append(ToolCall(
-                    tool_name=block.name,
-                    tool_input=block.input,
-                    call_id=block.id,
-                ))
-
-        return "\n".join(text_parts), tool_calls, response.stop_reason
-
     def _execute_tools(
         self,
         tool_calls: list[ToolCall],
         *,
         confirm_fn: ConfirmFn | None = None,
+        confirm_batch_fn: ConfirmBatchFn | None = None,
+        output_fn: StreamFn | None = None,
     ) -> list[ToolResult]:
-        results: list[ToolResult] = []
-        for tc in tool_calls:
-            tool = get_tool(tc.tool_name)
-            if tool is None:
-                results.append(ToolResult(
-                    call_id=tc.call_id,
-                    output=f"Error: unknown tool '{tc.tool_name}'",
-                    is_error=True,
-                ))
-                continue
+        """Confirm all calls up front, then run the approved ones.
 
-            if tool.requires_confirmation and confirm_fn:
-                approved = confirm_fn(tc)
-                if not approved:
-                    results.append(ToolResult(
-                        call_id=tc.call_id,
-                        output="Action was denied by user.",
-                        is_error=True,
-                    ))
-                    continue
+        Consecutive concurrency-safe tools run in a bounded thread pool;
+        results are returned in the original call order. output_fn, if
+        given, receives live output from tools that produce it.
+        """
+        results, runnable = self._plan_tools(tool_calls)
+        pending = [tc for _, tool, tc in runnable if tool.requires_confirmation]
+        with self._span(telemetry.CONFIRM, calls=len(pending)) if pending else nullcontext():
+            approvals = self._confirm(pending, confirm_fn=confirm_fn, confirm_batch_fn=confirm_batch_fn)
+        for batch in self._batches(self._approved(runnable, approvals, results)):
+            self._run_batch(batch, results, output_fn)
+        return [r for r in results if r is not None]
 
+    @staticmethod
+    def _confirm(
+        tool_calls: list[ToolCall],
+        *,
+        confirm_fn: ConfirmFn | None = None,
+        confirm_batch_fn: ConfirmBatchFn | None = None,
+    ) -> list[bool]:
+        """Ask for approval of every call before any of them runs."""
+        if not tool_calls:
+            return []
+        if confirm_batch_fn and (len(tool_calls) > 1 or not confirm_fn):
+            return list(confirm_batch_fn(tool_calls))
+        if confirm_fn:
+            return [confirm_fn(tc) for tc in tool_calls]
+        return [True] * len(tool_calls)
+
+    def _run_batch(
+        self,
+        batch: list[_PlannedCall],
+        results: list[ToolResult | None],
+        output_fn: StreamFn | None = None,
+    ) -> None:
+        """Run a group of approved calls, concurrently when there are several."""
+        workers = min(config.TOOL_WORKERS, len(batch))
+        if workers <= 1:
+            for i, tool, tc in batch:
+                results[i] = self._run_tool(tool, tc, output_fn)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [(i, pool.submit(self._run_tool, tool, tc, output_fn)) for i, tool, tc in batch]
+            for i, future in futures:
+                results[i] = future.result()
+
+    def _run_tool(self, tool: Tool, tc: ToolCall, output_fn: StreamFn | None = None) -> ToolResult:
+        with self._span(telemetry.TOOL, tool=tc.tool_name, call_id=tc.call_id) as span:
             try:
-                output = tool.execute(**tc.tool_input)
+                ctx = ToolContext(
+                    self.conversation_id,
+                    tc.call_id,
+                    output_fn,
+                    tool_output=self._tool_output,
+                    on_saved=self._when_saved,
+                    in_context=self._in_context,
+                )
+                with tool_context(ctx):
+                    output = tool.execute(**tc.tool_input)
             except Exception as exc:
                 output = f"Error executing {tc.tool_name}: {exc}"
-                results.append(ToolResult(call_id=tc.call_id, output=output, is_error=True))
-                continue
-
-            results.append(ToolResult(call_id=tc.call_id, output=output))
-
-        return results
+                return self._tool_finished(span, tool, ToolResult(call_id=tc.call_id, output=output, is_error=True))
+            return self._tool_finished(span, tool, ToolResult(call_id=tc.call_id, output=output))
@@ -0,0 +1,303 @@
+"""Async agent: the Agent loop on AsyncAnthropic, for many conversations per event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TypeVar, Union
+
+from . import config, telemetry
+from .agent import StreamFn, _AgentBase, _parse_usage, _to_api
+from .context import ContextManager
+from .database import Database
+from .models import Message, ToolCall, ToolResult, Usage
+from .telemetry import TurnTrace
+from .tools.base import Tool, ToolContext, tool_context
+
+if TYPE_CHECKING:
+    import anthropic
+
+T = TypeVar("T")
+
+# Callbacks may be plain functions or coroutines
+AsyncConfirmFn = Callable[[ToolCall], Union[bool, Awaitable[bool]]]
+AsyncConfirmBatchFn = Callable[[list[ToolCall]], Union[list[bool], Awaitable[list[bool]]]]
+AsyncStreamFn = Callable[[str], Union[None, Awaitable[None]]]
+
+
+async def _maybe_await(value: Any) -> Any:
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+class AsyncAgent(_AgentBase):
+    """Same chat() semantics as Agent, without blocking the event loop.
+
+    API calls go through AsyncAnthropic, tools run via Tool.aexecute (sync
+    tools fall back to a worker thread) and database work is serialised on
+    the Database's executor thread.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        conversation_id: str,
+        *,
+        client: anthropic.AsyncAnthropic | None = None,
+        cwd: str | None = None,
+    ) -> None:
+        super().__init__(db, conversation_id)
+        self._client = client
+        self.cwd = cwd  # tools resolve relative paths against this (see ToolContext)
+        self.context = ContextManager(
+            db,
+            conversation_id,
+            summarize_fn=self._summarize if config.CONTEXT_SUMMARIES else None,
+        )
+        self._loaded = False
+
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """The shared async client for this event loop, fetched on the first API call."""
+        if self._client is None:
+            from .client import get_async_client
+
+            self._client = get_async_client()
+        return self._client
+
+    # -- public API --
+
+    async def chat(
+        self,
+        user_text: str,
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+        stream_fn: AsyncStreamFn | None = None,
+        output_fn: StreamFn | None = None,
+    ) -> str:
+        """Send user text, handle tool calls, return final assistant text.
+
+        With JARVIS_SHELL_LIVE_OUTPUT, tool output goes to output_fn while
+        tools run; unlike the other callbacks it must be a plain function.
+        """
+        await self._load()
+        return await self._turn(
+            Message(role="user", content=user_text),
+            confirm_fn=confirm_fn,
+            confirm_batch_fn=confirm_batch_fn,
+            stream_fn=stream_fn,
+            output_fn=output_fn,
+        )
+
+    async def resume(
+        self,
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+        stream_fn: AsyncStreamFn | None = None,
+        output_fn: StreamFn | None = None,
+    ) -> str:
+        """Finish a turn that was interrupted (e.g. by a crash) before its final answer.
+
+        Messages are stored a whole round at a time, so the transcript ends
+        either with the final answer, which is returned as is, or with a
+        user message the model has not answered yet.
+        """
+        await self._load()
+        if not self._messages:
+            raise ValueError(f"conversation {self.conversation_id} has no messages to resume")
+        last = self._messages[-1]
+        if last["role"] == "assistant":
+            content = last["content"]
+            if isinstance(content, str):
+                return content
+            return "\n".join(b["text"] for b in content if b["type"] == "text")
+        return await self._turn(
+            None,
+            confirm_fn=confirm_fn,
+            confirm_batch_fn=confirm_batch_fn,
+            stream_fn=stream_fn,
+            output_fn=output_fn,
+        )
+
+    # -- internals --
+
+    async def _load(self) -> None:
+        if not self._loaded:
+            self._messages = await self._in_db(self._build_messages)
+            self._loaded = True
+
+    async def _turn(
+        self,
+        user: Message | None,
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+        stream_fn: AsyncStreamFn | None = None,
+        output_fn: StreamFn | None = None,
+    ) -> str:
+        """One traced turn: store the user message (if any), then run the loop."""
+        self._trace = trace = TurnTrace()
+        error = None
+        try:
+            if user is not None:
+                await self._append(user)
+            return await self._run_loop(
+                confirm_fn=confirm_fn,
+                confirm_batch_fn=confirm_batch_fn,
+                stream_fn=stream_fn,
+                output_fn=output_fn,
+            )
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            self._trace = None
+            self._pending_saves = []  # results of an interrupted round were never stored
+            await self._in_db(self._finish_turn, trace, error)
+
+    async def _run_loop(
+        self,
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+        stream_fn: AsyncStreamFn | None = None,
+        output_fn: StreamFn | None = None,
+    ) -> str:
+        """Call the API in a loop until the model stops using tools."""
+        while True:
+            with self._span(telemetry.CONTEXT):
+                messages = self._sent = await self.context.afit(self._messages, self._in_db)
+            if stream_fn:
+                assistant_text, tool_calls, stop_reason, usage = await self._call_streaming(
+                    messages, stream_fn=stream_fn
+                )
+            else:
+                assistant_text, tool_calls, stop_reason, usage = await self._call_batch(messages)
+            self._count_round(usage)
+            assistant = Message(role="assistant", content=assistant_text, tool_calls=tool_calls)
+
+            if stop_reason != "tool_use" or not tool_calls:
+                await self._append(assistant, usage=usage)
+                return assistant_text
+
+            tool_results = await self._execute_tools(
+                tool_calls,
+                confirm_fn=confirm_fn,
+                confirm_batch_fn=confirm_batch_fn,
+                output_fn=output_fn if config.SHELL_LIVE_OUTPUT else None,
+            )
+            await self._append(
+                assistant,
+                Message(role="user", content="", tool_results=tool_results),
+                usage=usage,
+            )
+
+    async def _in_db(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a blocking database call on the database's executor thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.db.executor, fn, *args)
+
+    def _tool_output(self, call_id: str) -> str | None:
+        """Called from a tool's worker thread; the lookup runs on the database thread."""
+        return self.db.executor.submit(super()._tool_output, call_id).result()
+
+    async def _append(self, *msgs: Message, usage: Usage | None = None) -> None:
+        """Persist messages (and usage) in one transaction, then extend the transcript."""
+        await self._in_db(self._write, list(msgs), usage)
+        self._messages.extend(_to_api(msg) for msg in msgs)
+        self._saved()
+
+    async def _summarize(self, transcript: str) -> str:
+        """Summary call for the context manager (see ContextManager.afit)."""
+        response = await self.client.messages.create(**self._summary_request(transcript))
+        usage = _parse_usage(getattr(response, "usage", None))
+        await self._in_db(self.db.add_usage, self.conversation_id, usage)
+        self._count_usage(usage)
+        return "\n".join(b.text for b in response.content if b.type == "text")
+
+    async def _call_batch(
+        self, messages: list[dict[str, Any]]
+    ) -> tuple[str, list[ToolCall], str, Usage]:
+        """Non-streaming API call."""
+        with self._span(telemetry.API, streaming=False):
+            response = await self.client.messages.create(**self._request(messages))
+        return self._parse_response(response)
+
+    async def _call_streaming(
+        self,
+        messages: list[dict[str, Any]],
+        *,
+        stream_fn: AsyncStreamFn,
+    ) -> tuple[str, list[ToolCall], str, Usage]:
+        """Streaming API call — emits text chunks via stream_fn."""
+        with self._span(telemetry.API, streaming=True):
+            async with self.client.messages.stream(**self._request(messages)) as stream:
+                waiting = True
+                async for event in stream:
+                    if waiting and event.type == "content_block_delta":
+                        waiting = False
+                        self._first_token()
+                    if event.type == "text":
+                        await _maybe_await(stream_fn(event.text))
+                response = await stream.get_final_message()
+        return self._parse_response(response)
+
+    async def _execute_tools(
+        self,
+        tool_calls: list[ToolCall],
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+        output_fn: StreamFn | None = None,
+    ) -> list[ToolResult]:
+        """Confirm all calls up front, then run the approved ones concurrently."""
+        results, runnable = self._plan_tools(tool_calls)
+        pending = [tc for _, tool, tc in runnable if tool.requires_confirmation]
+        with self._span(telemetry.CONFIRM, calls=len(pending)) if pending else nullcontext():
+            approvals = await self._confirm(pending, confirm_fn=confirm_fn, confirm_batch_fn=confirm_batch_fn)
+        limit = asyncio.Semaphore(max(1, config.TOOL_WORKERS))
+        for batch in self._batches(self._approved(runnable, approvals, results)):
+            outputs = await asyncio.gather(*(self._run_tool(tool, tc, limit, output_fn) for _, tool, tc in batch))
+            for (i, _, _), result in zip(batch, outputs):
+                results[i] = result
+        return [r for r in results if r is not None]
+
+    @staticmethod
+    async def _confirm(
+        tool_calls: list[ToolCall],
+        *,
+        confirm_fn: AsyncConfirmFn | None = None,
+        confirm_batch_fn: AsyncConfirmBatchFn | None = None,
+    ) -> list[bool]:
+        if not tool_calls:
+            return []
+        if confirm_batch_fn and (len(tool_calls) > 1 or not confirm_fn):
+            return list(await _maybe_await(confirm_batch_fn(tool_calls)))
+        if confirm_fn:
+            return [await _maybe_await(confirm_fn(tc)) for tc in tool_calls]
+        return [True] * len(tool_calls)
+
+    async def _run_tool(
+        self, tool: Tool, tc: ToolCall, limit: asyncio.Semaphore, output_fn: StreamFn | None = None
+    ) -> ToolResult:
+        async with limit:
+            with self._span(telemetry.TOOL, tool=tc.tool_name, call_id=tc.call_id) as span:
+                try:
+                    ctx = ToolContext(
+                        self.conversation_id,
+                        tc.call_id,
+                        output_fn,
+                        cwd=self.cwd,
+                        tool_output=self._tool_output,
+                        on_saved=self._when_saved,
+                        in_context=self._in_context,
+                    )
+                    with tool_context(ctx):
+                        output = await tool.aexecute(**tc.tool_input)
+                except Exception as exc:
+                    output = f"Error executing {tc.tool_name}: {exc}"
+                    return self._tool_finished(span, tool, ToolResult(call_id=tc.call_id, output=output, is_error=True))
+                return self._tool_finished(span, tool, ToolResult(call_id=tc.call_id, output=output))
@@ -0,0 +1,258 @@
+"""Headless batch mode: run prompts from JSONL concurrently, one conversation each.
+
+    jarvis batch prompts.jsonl [--concurrency 4] [--timeout 300] [--approve read_file]
+
+Each input line is {"prompt": "...", "id": "...", "timeout": 60} (only
+prompt is required) or a bare JSON string. Results are written as JSONL
+in completion order. Progress is stored per batch in the database, so
+rerunning the same input after a crash skips finished items and resumes
+interrupted ones in their existing conversations.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Iterable
+
+from . import config
+from .async_agent import AsyncAgent
+from .database import Database
+from .models import ToolCall
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 300.0
+FINISHED = ("ok",)
+FAILED = ("error", "timeout")
+
+
+@dataclass
+class BatchItem:
+    id: str
+    prompt: str
+    timeout: float | None = None
+
+
+class ApprovalPolicy:
+    """Approves tool calls without asking: the listed tools, and run_shell
+    commands matching one of the glob patterns. Everything else is denied."""
+
+    def __init__(
+        self,
+        tools: Iterable[str] = (),
+        *,
+        shell_patterns: Iterable[str] = (),
+        approve_all: bool = False,
+    ) -> None:
+        self.tools = set(tools)
+        self.shell_patterns = list(shell_patterns)
+        self.approve_all = approve_all
+
+    def __call__(self, tc: ToolCall) -> bool:
+        if self.approve_all or tc.tool_name in self.tools:
+            return True
+        if tc.tool_name == "run_shell":
+            command = str(tc.tool_input.get("command", ""))
+            return any(fnmatch.fnmatchcase(command, pattern) for pattern in self.shell_patterns)
+        return False
+
+    @classmethod
+    def parse(cls, approve: str, shell_patterns: Iterable[str] = ()) -> ApprovalPolicy:
+        """From --approve: "all", "none", or comma-separated tool names."""
+        if approve == "all":
+            return cls(approve_all=True)
+        tools = [] if approve == "none" else [t.strip() for t in approve.split(",") if t.strip()]
+        return cls(tools, shell_patterns=shell_patterns)
+
+
+def parse_items(lines: Iterable[str]) -> list[BatchItem]:
+    """Parse JSONL input; items without an id are numbered by line."""
+    items: list[BatchItem] = []
+    seen: set[str] = set()
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f"line {lineno}: invalid JSON ({exc})") from None
+        if isinstance(data, str):
+            data = {"prompt": data}
+        if not isinstance(data, dict) or not isinstance(data.get("prompt"), str):
+            raise ValueError(f'line {lineno}: expected a string or an object with a "prompt" string')
+        timeout = data.get("timeout")
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise ValueError(f'line {lineno}: "timeout" must be a positive number of seconds')
+        item = BatchItem(
+            id=str(data.get("id", lineno)),
+            prompt=data["prompt"],
+            timeout=float(timeout) if timeout is not None else None,
+        )
+        if item.id in seen:
+            raise ValueError(f"line {lineno}: duplicate id {item.id!r}")
+        seen.add(item.id)
+        items.append(item)
+    return items
+
+
+def batch_id_for(text: str) -> str:
+    """Default batch id: the same input resumes the same batch."""
+    return "batch-" + hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        db: Database,
+        batch_id: str,
+        *,
+        policy: ApprovalPolicy,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        retry_failed: bool = False,
+        out: IO[str] = sys.stdout,
+        client: Any = None,
+    ) -> None:
+        self.db = db
+        self.batch_id = batch_id
+        self.policy = policy
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retry_failed = retry_failed
+        self.out = out
+        self.client = client
+        self.counts = {"ok": 0, "error": 0, "timeout": 0, "skipped": 0}
+
+    async def run(self, items: list[BatchItem]) -> dict[str, int]:
+        """Run every unfinished item; return counts by outcome."""
+        done = await self._in_db(self.db.get_batch_items, self.batch_id)
+        queue: asyncio.Queue[tuple[BatchItem, dict | None]] = asyncio.Queue()
+        for item in items:
+            previous = done.get(item.id)
+            status = previous["status"] if previous else None
+            if status in FINISHED or (status in FAILED and not self.retry_failed):
+                self.counts["skipped"] += 1
+                continue
+            queue.put_nowait((item, previous))
+
+        async def worker() -> None:
+            while not queue.empty():
+                item, previous = queue.get_nowait()
+                await self._run_item(item, previous)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()))))
+        return self.counts
+
+    async def _in_db(self, fn: Any, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db.executor, lambda: fn(*args, **kwargs))
+
+    def _start(self, item: BatchItem) -> str:
+        with self.db.transaction():
+            cid = self.db.create_conversation(title=f"{self.batch_id} #{item.id}")
+            self.db.save_batch_item(self.batch_id, item.id, cid, "running")
+        return cid
+
+    async def _run_item(self, item: BatchItem, previous: dict | None) -> None:
+        if previous is not None:
+            cid = previous["conversation_id"]
+            resuming = await self._in_db(self.db.message_count, cid) > 0
+        else:
+            cid = await self._in_db(self._start, item)
+            resuming = False
+        agent = AsyncAgent(self.db, cid, client=self.client)
+        start = time.perf_counter()
+        result = error = None
+        try:
+            if resuming:
+                turn = agent.resume(confirm_fn=self.policy)
+            else:
+                turn = agent.chat(item.prompt, confirm_fn=self.policy)
+            result = await asyncio.wait_for(turn, item.timeout or self.timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"timed out after {item.timeout or self.timeout:g}s"
+        except Exception as exc:
+            status, error = "error", f"{type(exc).__name__}: {exc}"
+        await self._in_db(
+            self.db.save_batch_item, self.batch_id, item.id, cid, status, result=result, error=error
+        )
+        usage = await self._in_db(self.db.get_usage, cid)
+        self.counts[status] += 1
+        self.out.write(json.dumps({
+            "id": item.id,
+            "conversation_id": cid,
+            "status": status,
+            "result": result,
+            "error": error,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "usage": {
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "cache_read_tokens": usage.cache_read_tokens,
+                "cache_write_tokens": usage.cache_write_tokens,
+            },
+        }) + "\n")
+        self.out.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="jarvis batch", description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of prompts, or - for stdin")
+    parser.add_argument("--output", "-o", type=Path, help="append results here instead of stdout")
+    parser.add_argument("--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per item")
+    parser.add_argument(
+        "--approve",
+        default="none",
+        help='tools to run without confirmation: "all", "none" (default) or a comma-separated list',
+    )
+    parser.add_argument(
+        "--allow-shell",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="approve run_shell commands matching this glob (repeatable)",
+    )
+    parser.add_argument("--batch-id", help="name of the run to resume (default: derived from the input)")
+    parser.add_argument("--retry-failed", action="store_true", help="rerun items that failed or timed out")
+    args = parser.parse_args(argv)
+
+    config.validate()
+    text = sys.stdin.read() if args.input == "-" else Path(args.input).read_text()
+    try:
+        items = parse_items(text.splitlines())
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    batch_id = args.batch_id or batch_id_for(text)
+    db = Database(config.DB_PATH)
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        runner = BatchRunner(
+            db,
+            batch_id,
+            policy=ApprovalPolicy.parse(args.approve, args.allow_shell),
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+            retry_failed=args.retry_failed,
+            out=out,
+        )
+        counts = asyncio.run(runner.run(items))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        db.close()
+    print(
+        f"{batch_id}: {counts['ok']} ok, {counts['error']} errors, {counts['timeout']} timeouts, "
+        f"{counts['skipped']} skipped (finished in an earlier run)",
+        file=sys.stderr,
+    )
+    return 0 if counts["error"] == counts["timeout"] == 0 else 1
@@ -0,0 +1,297 @@
+"""Process-wide Anthropic clients on one pooled HTTP client, with adaptive retry.
+
+Agents share a client, so switching conversations reuses warm keep-alive
+connections instead of paying a new TCP+TLS handshake. Retries happen in
+the HTTP transport: 429/529/5xx responses and connection errors are
+retried after the server's retry-after / rate-limit reset hint, or a
+jittered exponential backoff. A circuit breaker fails requests fast
+after repeated failures, until a cooldown has passed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import random
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Mapping
+
+import anthropic
+
+from . import config
+
+# The HTTP library the installed SDK is built on (httpx, or its httpx2 fork)
+httpx = importlib.import_module(type(anthropic.DEFAULT_CONNECTION_LIMITS).__module__.partition(".")[0])
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+# Per-limit reset times sent with 429s, as RFC 3339 timestamps
+_RATELIMIT_LIMITS = ("requests", "tokens", "input-tokens", "output-tokens")
+
+
+def _seconds_until(timestamp: str, now: datetime) -> float | None:
+    try:
+        when = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (when - now).total_seconds())
+
+
+def retry_after(headers: Mapping[str, str], now: datetime | None = None) -> float | None:
+    """Seconds the server asked us to wait, if it said."""
+    now = now or datetime.now(timezone.utc)
+    if "retry-after-ms" in headers:
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(value) - now).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    # Otherwise, when the exhausted rate limits reset
+    waits = []
+    for limit in _RATELIMIT_LIMITS:
+        reset = headers.get(f"anthropic-ratelimit-{limit}-reset")
+        if reset and headers.get(f"anthropic-ratelimit-{limit}-remaining") == "0":
+            wait = _seconds_until(reset, now)
+            if wait is not None:
+                waits.append(wait)
+    return max(waits) if waits else None
+
+
+class RetryPolicy:
+    """When to retry, how long to wait, and a circuit breaker. Thread-safe."""
+
+    def __init__(
+        self,
+        *,
+        max_retries: int | None = None,
+        base_delay: float = 0.5,
+        max_delay: float | None = None,
+        breaker_threshold: int | None = None,
+        breaker_cooldown: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_retries = max_retries if max_retries is not None else config.API_MAX_RETRIES
+        self.base_delay = base_delay
+        self.max_delay = max_delay if max_delay is not None else config.API_RETRY_MAX_WAIT
+        self.breaker_threshold = (
+            breaker_threshold if breaker_threshold is not None else config.API_BREAKER_THRESHOLD
+        )
+        self.breaker_cooldown = (
+            breaker_cooldown if breaker_cooldown is not None else config.API_BREAKER_COOLDOWN
+        )
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0  # consecutive
+        self._open_until = 0.0
+
+    def should_retry(self, response: Any) -> bool:
+        hint = response.headers.get("x-should-retry")
+        if hint in ("true", "false"):
+            return hint == "true"
+        return response.status_code in RETRY_STATUSES
+
+    def delay(self, attempt: int, headers: Mapping[str, str] | None = None) -> float:
+        """Wait before retry number attempt + 1: the server's hint, else jittered backoff."""
+        hinted = retry_after(headers) if headers is not None else None
+        if hinted is not None:
+            # A little jitter so clients told the same time don't all return at once
+            return min(self.max_delay, hinted) + random.uniform(0, min(1.0, 0.1 * hinted + 0.05))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def open_for(self) -> float:
+        """Seconds the breaker stays open; 0 when requests may go through."""
+        with self._lock:
+            return max(0.0, self._open_until - self.clock())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
+    def record_response(self, response: Any) -> None:
+        """Count a retryable response; 429s are throttling with a wait hint, not an outage."""
+        if response.status_code != 429:
+            self.record_failure()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.breaker_threshold and self._failures >= self.breaker_threshold:
+                self._open_until = self.clock() + self.breaker_cooldown
+
+    def breaker_response(self, request: Any, wait: float) -> Any:
+        """What a request gets while the breaker is open (the SDK raises it as an overload)."""
+        return httpx.Response(
+            529,
+            json={
+                "type": "error",
+                "error": {
+                    "type": "overloaded_error",
+                    "message": f"API unavailable after repeated failures; not retrying for {wait:.0f}s",
+                },
+            },
+            request=request,
+        )
+
+
+class RetryTransport(httpx.BaseTransport):
+    def __init__(self, transport: Any, policy: RetryPolicy) -> None:
+        self.transport = transport
+        self.policy = policy
+
+    def handle_request(self, request: Any) -> Any:
+        policy = self.policy
+        for attempt in range(policy.max_retries + 1):
+            wait = policy.open_for()
+            if wait:
+                return policy.breaker_response(request, wait)
+            last = attempt == policy.max_retries
+            try:
+                response = self.transport.handle_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError):
+                policy.record_failure()
+                if last:
+                    raise
+                time.sleep(policy.delay(attempt))
+                continue
+            if not policy.should_retry(response):
+                policy.record_success()
+                return response
+            policy.record_response(response)
+            if last:
+                return response
+            response.read()
+            response.close()
+            time.sleep(policy.delay(attempt, response.headers))
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: Any, policy: RetryPolicy) -> None:
+        self.transport = transport
+        self.policy = policy
+
+    async def handle_async_request(self, request: Any) -> Any:
+        policy = self.policy
+        for attempt in range(policy.max_retries + 1):
+            wait = policy.open_for()
+            if wait:
+                return policy.breaker_response(request, wait)
+            last = attempt == policy.max_retries
+            try:
+                response = await self.transport.handle_async_request(request)
+            except (httpx.TimeoutException, httpx.NetworkError):
+                policy.record_failure()
+                if last:
+                    raise
+                await asyncio.sleep(policy.delay(attempt))
+                continue
+            if not policy.should_retry(response):
+                policy.record_success()
+                return response
+            policy.record_response(response)
+            if last:
+                return response
+            await response.aread()
+            await response.aclose()
+            await asyncio.sleep(policy.delay(attempt, response.headers))
+        raise AssertionError("unreachable")
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _limits() -> Any:
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=config.HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+def _timeout() -> Any:
+    return httpx.Timeout(config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+
+
+# Shared by every client in the process, so the breaker sees all traffic
+_policy: RetryPolicy | None = None
+_lock = threading.RLock()
+_client: anthropic.Anthropic | None = None
+# An async HTTP pool belongs to the event loop it was first used on
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, anthropic.AsyncAnthropic] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def default_policy() -> RetryPolicy:
+    global _policy
+    with _lock:
+        if _policy is None:
+            _policy = RetryPolicy()
+        return _policy
+
+
+def create_client(
+    *,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    policy: RetryPolicy | None = None,
+) -> anthropic.Anthropic:
+    """A new client with its own connection pool (most callers want get_client())."""
+    transport = RetryTransport(httpx.HTTPTransport(limits=_limits()), policy or default_policy())
+    return anthropic.Anthropic(
+        api_key=api_key if api_key is not None else config.ANTHROPIC_API_KEY,
+        base_url=base_url,
+        max_retries=0,  # RetryTransport retries
+        timeout=_timeout(),
+        http_client=anthropic.DefaultHttpxClient(transport=transport, timeout=_timeout()),
+    )
+
+
+def create_async_client(
+    *,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    policy: RetryPolicy | None = None,
+) -> anthropic.AsyncAnthropic:
+    transport = AsyncRetryTransport(httpx.AsyncHTTPTransport(limits=_limits()), policy or default_policy())
+    return anthropic.AsyncAnthropic(
+        api_key=api_key if api_key is not None else config.ANTHROPIC_API_KEY,
+        base_url=base_url,
+        max_retries=0,
+        timeout=_timeout(),
+        http_client=anthropic.DefaultAsyncHttpxClient(transport=transport, timeout=_timeout()),
+    )
+
+
+def get_client() -> anthropic.Anthropic:
+    """The process-wide client."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = create_client()
+        return _client
+
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """The async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = create_async_client()
+        return client
@@ -10,7 +10,43 @@ load_dotenv()
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
 MODEL = os.environ.get("JARVIS_MODEL", "claude-sonnet-4-5-20250929")
 DB_PATH = Path(os.environ.get("JARVIS_DB_PATH", "") or Path.home() / ".jarvis" / "conversations.db")
+DB_DURABILITY = os.environ.get("JARVIS_DB_DURABILITY", "") or "wal"
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("JARVIS_DB_BUSY_TIMEOUT_MS", "") or 5000)
+BLOB_THRESHOLD = int(os.environ.get("JARVIS_BLOB_THRESHOLD", "") or 4096)
+BLOB_CODEC = os.environ.get("JARVIS_BLOB_CODEC", "") or "zlib"
+ARCHIVE_DAYS = int(os.environ.get("JARVIS_ARCHIVE_DAYS", "") or 90)
+ARCHIVE_DIR = Path(os.environ.get("JARVIS_ARCHIVE_DIR", "") or DB_PATH.parent / "archive")
+MAINTENANCE_HOURS = float(os.environ.get("JARVIS_MAINTENANCE_HOURS", "") or 0)
+SOCKET_PATH = Path(os.environ.get("JARVIS_SOCKET", "") or Path.home() / ".jarvis" / "jarvis.sock")
+DAEMON = os.environ.get("JARVIS_DAEMON", "") or "auto"
 LOG_LEVEL = os.environ.get("JARVIS_LOG_LEVEL", "INFO")
+TOOL_OUTPUT_TOKENS = int(os.environ.get("JARVIS_TOOL_OUTPUT_TOKENS", "") or 8000)
+TOOL_WORKERS = int(os.environ.get("JARVIS_TOOL_WORKERS", "") or 4)
+SHELL_BACKEND = os.environ.get("JARVIS_SHELL_BACKEND", "") or "session"
+SHELL_LIVE_OUTPUT = os.environ.get("JARVIS_SHELL_LIVE_OUTPUT", "0").lower() in ("1", "true", "yes")
+RENDER_MARKDOWN = os.environ.get("JARVIS_RENDER_MARKDOWN", "1").lower() not in ("0", "false", "no")
+RENDER_FPS = float(os.environ.get("JARVIS_RENDER_FPS", "") or 12)
+PROMPT_CACHING = os.environ.get("JARVIS_PROMPT_CACHING", "1").lower() not in ("0", "false", "no")
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("JARVIS_CONTEXT_BUDGET", "") or 150_000)
+CONTEXT_KEEP_TURNS = int(os.environ.get("JARVIS_CONTEXT_KEEP_TURNS", "") or 4)
+CONTEXT_STUB_CHARS = int(os.environ.get("JARVIS_CONTEXT_STUB_CHARS", "") or 2000)
+CONTEXT_SUMMARIES = os.environ.get("JARVIS_CONTEXT_SUMMARIES", "0").lower() in ("1", "true", "yes")
+HTTP_MAX_CONNECTIONS = int(os.environ.get("JARVIS_HTTP_MAX_CONNECTIONS", "") or 20)
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("JARVIS_HTTP_KEEPALIVE_SECONDS", "") or 120)
+HTTP_TIMEOUT = float(os.environ.get("JARVIS_HTTP_TIMEOUT", "") or 600)
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("JARVIS_HTTP_CONNECT_TIMEOUT", "") or 5)
+API_MAX_RETRIES = int(os.environ.get("JARVIS_API_MAX_RETRIES", "") or 4)
+API_RETRY_MAX_WAIT = float(os.environ.get("JARVIS_API_RETRY_MAX_WAIT", "") or 60)
+API_BREAKER_THRESHOLD = int(os.environ.get("JARVIS_API_BREAKER_THRESHOLD", "") or 5)
+API_BREAKER_COOLDOWN = float(os.environ.get("JARVIS_API_BREAKER_COOLDOWN", "") or 30)
+TELEMETRY = os.environ.get("JARVIS_TELEMETRY", "1").lower() not in ("0", "false", "no")
+OTEL_EXPORT = os.environ.get("JARVIS_OTEL_EXPORT", "0").lower() in ("1", "true", "yes")
+
+SUMMARY_PROMPT = """\
+Summarize the conversation below so it can replace the original in your context. \
+Keep facts, decisions, file paths, commands and their important results, and any \
+open tasks. Be concise. Reply with the summary only.
+"""
 
 SYSTEM_PROMPT = """\
 You are Jarvis, a personal AI assistant. You are helpful, direct, and efficient.
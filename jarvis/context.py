@@ -0,0 +1,246 @@
+"""Context window management: fit the transcript into a token budget."""
+
+from __future__ import annotations
+
+import inspect
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Union
+
+from . import config
+from .database import Database
+from .tokens import estimate
+
+# A plain function for fit(), a coroutine function for afit()
+SummarizeFn = Callable[[str], Union[str, Awaitable[str]]]
+
+SUMMARY_PREFIX = "[Summary of the earlier conversation]\n"
+
+
+def estimate_tokens(msg: dict[str, Any]) -> int:
+    """Estimated token count for one API message (see tokens.estimate)."""
+    content = msg["content"]
+    if isinstance(content, str):
+        return 4 + estimate(content)
+    total = 4
+    for block in content:
+        if block["type"] == "text":
+            total += estimate(block["text"])
+        elif block["type"] == "tool_use":
+            total += estimate(block["name"]) + estimate(json.dumps(block["input"]))
+        elif block["type"] == "tool_result":
+            body = block["content"]
+            total += estimate(body if isinstance(body, str) else json.dumps(body))
+    return total
+
+
+def _is_turn_start(msg: dict[str, Any]) -> bool:
+    """A turn starts at a user message that is not a batch of tool results."""
+    if msg["role"] != "user":
+        return False
+    content = msg["content"]
+    return isinstance(content, str) or not any(b["type"] == "tool_result" for b in content)
+
+
+def _stub_tool_results(msg: dict[str, Any], max_chars: int) -> dict[str, Any]:
+    """Replace large tool_result contents with a short stub, keeping the pairing ids."""
+    content = msg["content"]
+    if isinstance(content, str):
+        return msg
+    blocks = []
+    changed = False
+    for block in content:
+        if block["type"] == "tool_result" and isinstance(block["content"], str) and len(block["content"]) > max_chars:
+            block = {
+                **block,
+                "content": f"[{len(block['content']):,} characters of tool output omitted from context]",
+            }
+            changed = True
+        blocks.append(block)
+    return {**msg, "content": blocks} if changed else msg
+
+
+def _tool_result(messages: list[dict[str, Any]], call_id: str) -> dict[str, Any] | None:
+    for msg in reversed(messages):
+        if isinstance(msg["content"], list):
+            for block in msg["content"]:
+                if block["type"] == "tool_result" and block["tool_use_id"] == call_id:
+                    return block
+    return None
+
+
+def result_sent(sent: list[dict[str, Any]], messages: list[dict[str, Any]], call_id: str) -> bool:
+    """Whether fit() kept the result of call_id intact when it turned messages into sent."""
+    block = _tool_result(sent, call_id)
+    # fit() only copies a tool_result block to stub it
+    return block is not None and block is _tool_result(messages, call_id)
+
+
+@dataclass(frozen=True)
+class _SummaryNeeded:
+    """What fit() needs summarised before it can return: the transcript, and where the kept turns start."""
+
+    transcript: str
+    keep_from: int
+
+
+def render_transcript(messages: list[dict[str, Any]], max_chars: int = 2000) -> str:
+    """Render API messages as plain text for summarisation."""
+    lines: list[str] = []
+    for msg in messages:
+        role = "User" if msg["role"] == "user" else "Assistant"
+        content = msg["content"]
+        if isinstance(content, str):
+            lines.append(f"{role}: {content}")
+            continue
+        for block in content:
+            if block["type"] == "text":
+                lines.append(f"{role}: {block['text']}")
+            elif block["type"] == "tool_use":
+                lines.append(f"Assistant called {block['name']}({json.dumps(block['input'])})")
+            elif block["type"] == "tool_result":
+                output = block["content"] if isinstance(block["content"], str) else json.dumps(block["content"])
+                if len(output) > max_chars:
+                    output = output[:max_chars] + " ..."
+                lines.append(f"Tool result: {output}")
+    return "\n".join(lines)
+
+
+class ContextManager:
+    """Shrinks the transcript sent to the API once it exceeds a token budget.
+
+    The most recent turns are always sent verbatim. Past that, large tool
+    results are replaced by stubs, then (if a summarize_fn is given) older
+    turns are replaced by a summary that is stored in the database and
+    reused until it no longer fits, and finally the oldest turns are
+    dropped. Cuts only happen at turn boundaries, so every tool_use keeps
+    its matching tool_result.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        conversation_id: str,
+        *,
+        budget: int | None = None,
+        keep_turns: int | None = None,
+        summarize_fn: SummarizeFn | None = None,
+    ) -> None:
+        self.db = db
+        self.conversation_id = conversation_id
+        self.budget = budget if budget is not None else config.CONTEXT_TOKEN_BUDGET
+        self.keep_turns = keep_turns if keep_turns is not None else config.CONTEXT_KEEP_TURNS
+        self.summarize_fn = summarize_fn
+        # Per-message token estimates and turn starts, extended as the transcript grows
+        self._tokens: list[int] = []
+        self._turn_starts: list[int] = []
+
+    def fit(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return the messages to send, compacted if they exceed the budget."""
+        fitted = self._fit(messages)
+        if isinstance(fitted, _SummaryNeeded):
+            summary = self.summarize_fn(fitted.transcript)
+            return self._summarized(messages, fitted.keep_from, summary)
+        return fitted
+
+    async def afit(
+        self,
+        messages: list[dict[str, Any]],
+        in_db: Callable[..., Awaitable[Any]],
+    ) -> list[dict[str, Any]]:
+        """fit() for an event loop: database work goes through in_db, the summary is awaited."""
+        fitted = await in_db(self._fit, messages)
+        if isinstance(fitted, _SummaryNeeded):
+            summary = self.summarize_fn(fitted.transcript)
+            if inspect.isawaitable(summary):
+                summary = await summary
+            return await in_db(self._summarized, messages, fitted.keep_from, summary)
+        return fitted
+
+    # -- internals --
+
+    def _fit(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]] | _SummaryNeeded:
+        self._sync(messages)
+        if sum(self._tokens) <= self.budget:
+            return messages
+
+        keep_from = self._keep_from()
+        if keep_from == 0:
+            return messages
+
+        head = [_stub_tool_results(m, config.CONTEXT_STUB_CHARS) for m in messages[:keep_from]]
+        tail = messages[keep_from:]
+        tail_tokens = sum(self._tokens[keep_from:])
+        if sum(estimate_tokens(m) for m in head) + tail_tokens <= self.budget:
+            return head + tail
+
+        if self.summarize_fn is not None:
+            return self._stored_summary(messages, head, keep_from)
+
+        # Drop whole turns from the front until the rest fits
+        head_tokens = [estimate_tokens(m) for m in head]
+        total = sum(head_tokens) + tail_tokens
+        start = 0
+        for turn_start in self._turn_starts:
+            if turn_start >= keep_from or total <= self.budget:
+                break
+            if turn_start > start:
+                total -= sum(head_tokens[start:turn_start])
+                start = turn_start
+        if total > self.budget:
+            start = keep_from
+        return head[start:] + tail
+
+    def _sync(self, messages: list[dict[str, Any]]) -> None:
+        if len(messages) < len(self._tokens):
+            self._tokens.clear()
+            self._turn_starts.clear()
+        for i in range(len(self._tokens), len(messages)):
+            self._tokens.append(estimate_tokens(messages[i]))
+            if _is_turn_start(messages[i]):
+                self._turn_starts.append(i)
+
+    def _keep_from(self) -> int:
+        """Index of the first message in the turns that are always kept verbatim."""
+        if len(self._turn_starts) <= self.keep_turns:
+            return 0
+        return self._turn_starts[-self.keep_turns] if self.keep_turns > 0 else len(self._tokens)
+
+    def _stored_summary(
+        self,
+        messages: list[dict[str, Any]],
+        head: list[dict[str, Any]],
+        keep_from: int,
+    ) -> list[dict[str, Any]] | _SummaryNeeded:
+        """Replace a prefix with the stored summary, or say what a new one must cover."""
+        stored = self.db.get_summary(self.conversation_id)
+        if stored is not None:
+            upto, summary = stored
+            if upto <= keep_from and upto in self._turn_starts:
+                compacted = self._with_summary(summary, head[upto:] + messages[keep_from:])
+                # Nothing new to summarise if the summary already reaches the kept turns
+                if upto == keep_from or sum(estimate_tokens(m) for m in compacted) <= self.budget:
+                    return compacted
+            previous = SUMMARY_PREFIX + summary + "\n" if upto <= keep_from else ""
+            start = upto if upto <= keep_from else 0
+        else:
+            previous, start = "", 0
+
+        return _SummaryNeeded(previous + render_transcript(head[start:]), keep_from)
+
+    def _summarized(self, messages: list[dict[str, Any]], keep_from: int, summary: str) -> list[dict[str, Any]]:
+        """Store a new summary of everything before keep_from and send it in its place."""
+        self.db.save_summary(self.conversation_id, keep_from, summary)
+        return self._with_summary(summary, messages[keep_from:])
+
+    @staticmethod
+    def _with_summary(summary: str, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Prepend the summary to the first (user, turn-start) message."""
+        first = messages[0]
+        blocks = (
+            [{"type": "text", "text": first["content"]}]
+            if isinstance(first["content"], str)
+            else list(first["content"])
+        )
+        blocks.insert(0, {"type": "text", "text": SUMMARY_PREFIX + summary})
+        return [{**first, "content": blocks}] + messages[1:]
@@ -2,13 +2,99 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import sqlite3
 import uuid
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Collection, Iterator, Sequence
 
-from .models import Message, ToolCall, ToolResult
+from . import config
+from .models import Message, StoredMessage, ToolCall, ToolResult, Turn, Usage
+
+# journal_mode, synchronous for each durability mode
+DURABILITY_MODES = {
+    "wal": ("WAL", "NORMAL"),       # survives crashes; may lose the last commits on power loss
+    "wal-full": ("WAL", "FULL"),    # fsync on every commit
+    "rollback": ("DELETE", "FULL"), # SQLite defaults
+}
+
+# Compression for tool outputs moved to the blobs table ("raw" when it would not help)
+BLOB_CODECS = ("zlib", "lzma")
+_BLOB_CACHE_ENTRIES = 64  # decoded outputs kept in memory, e.g. for rebuilding the transcript
+
+MESSAGE_COLUMNS = ("role", "content", "tool_calls", "tool_results", "created_at")
+_INSERT_MESSAGE = """INSERT INTO messages (conversation_id, role, content, tool_calls, tool_results, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?)"""
+_TOUCH_CONVERSATION = """UPDATE conversations SET
+                             updated_at = ?,
+                             message_count = message_count + ?,
+                             last_message_preview = COALESCE(?, last_message_preview)
+                         WHERE id = ?"""
+PREVIEW_CHARS = 120
+_INSERT_FTS = "INSERT INTO messages_fts (rowid, content, tool_text) VALUES (?, ?, ?)"
+
+# Tool inputs and outputs of a stored message, as one searchable text (used for the backfill)
+_FTS_TOOL_TEXT_SQL = """
+    (SELECT group_concat(text, char(10)) FROM (
+        SELECT json_extract(value, '$.tool_input') AS text FROM json_each(messages.tool_calls)
+        UNION ALL
+        SELECT json_extract(value, '$.output') FROM json_each(messages.tool_results)
+    ))"""
+
+
+def _preview(text: str) -> str:
+    return " ".join(text.split())[:PREVIEW_CHARS]
+
+
+def _fts_tool_text(msg: Message) -> str:
+    """Tool inputs and outputs of a message, as indexed for full-text search."""
+    parts = [json.dumps(tc.tool_input) for tc in msg.tool_calls]
+    parts.extend(tr.full_output or tr.output for tr in msg.tool_results)
+    return "\n".join(parts)
+
+
+def _segment(conversation_id: str, upto: int | None, prefix: str = "") -> tuple[str, tuple]:
+    """WHERE clause for a conversation's own messages, up to message id `upto` if given."""
+    if upto is None:
+        return f"{prefix}conversation_id = ?", (conversation_id,)
+    return f"{prefix}conversation_id = ? AND {prefix}id <= ?", (conversation_id, upto)
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, `word*` matches a prefix."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*") if prefix else word
+        terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _compress(codec: str, data: bytes) -> tuple[str, bytes]:
+    """(codec actually used, payload)."""
+    if codec == "lzma":
+        import lzma  # slower to import; only load it when configured
+
+        packed = lzma.compress(data, preset=6)
+    else:
+        packed = zlib.compress(data, 6)
+    return (codec, packed) if len(packed) < len(data) else ("raw", data)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        import lzma
+
+        return lzma.decompress(data)
+    return data
 
 
 def _ensure_dir(path: Path) -> None:
@@ -16,19 +102,66 @@ def _ensure_dir(path: Path) -> None:
 
 
 class Database:
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, durability: str | None = None) -> None:
         _ensure_dir(db_path)
-        self.conn = sqlite3.connect(str(db_path))
+        self.path = db_path
+        durability = durability or config.DB_DURABILITY
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown durability mode {durability!r}; expected one of {', '.join(DURABILITY_MODES)}"
+            )
+        if config.BLOB_CODEC not in BLOB_CODECS:
+            raise ValueError(
+                f"Unknown blob codec {config.BLOB_CODEC!r}; expected one of {', '.join(BLOB_CODECS)}"
+            )
+        self.blob_codec = config.BLOB_CODEC
+        self.blob_threshold = config.BLOB_THRESHOLD
+        self._blob_cache: OrderedDict[str, str] = OrderedDict()
+        # Async callers hand the connection to the executor thread below
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        journal_mode, synchronous = DURABILITY_MODES[durability]
+        # Lets maintenance hand free pages back a few at a time; only takes effect
+        # on a new file (Database.compact converts older ones)
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute(f"PRAGMA busy_timeout = {int(config.DB_BUSY_TIMEOUT_MS)}")
+        self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+        # Open unit of work: nesting depth, and per conversation the pending
+        # [messages added, latest preview] applied with the updated_at bump
+        self._tx_depth = 0
+        self._touched: dict[str, list] = {}
+        self._executor: ThreadPoolExecutor | None = None
         self._migrate()
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Single worker thread that async code uses to serialise database access.
+
+        Submit whole units of work (e.g. a transaction) so they cannot interleave.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jarvis-db")
+        return self._executor
+
     def _migrate(self) -> None:
+        had_blobs = self._table_exists("blobs")
         self.conn.executescript("""
             CREATE TABLE IF NOT EXISTS conversations (
                 id TEXT PRIMARY KEY,
                 title TEXT,
                 created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
+                updated_at TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                last_message_preview TEXT NOT NULL DEFAULT '',
+                -- A fork shares its parent's messages up to fork_point (a message id)
+                -- instead of copying them; message_count includes them
+                parent_id TEXT REFERENCES conversations(id),
+                fork_point INTEGER
             );
 
             CREATE TABLE IF NOT EXISTS messages (
@@ -43,7 +176,217 @@ class Database:
 
             CREATE INDEX IF NOT EXISTS idx_messages_conversation
                 ON messages(conversation_id, id);
+
+            CREATE TABLE IF NOT EXISTS summaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL REFERENCES conversations(id),
+                upto INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_summaries_conversation
+                ON summaries(conversation_id, id);
+
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL REFERENCES conversations(id),
+                started_at TEXT NOT NULL,
+                duration_ms REAL NOT NULL,
+                api_ms REAL NOT NULL,
+                first_token_ms REAL,
+                confirm_ms REAL NOT NULL,
+                tools_ms REAL NOT NULL,
+                db_ms REAL NOT NULL,
+                rounds INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cache_read_tokens INTEGER NOT NULL,
+                cache_write_tokens INTEGER NOT NULL,
+                error TEXT
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_turns_conversation
+                ON turns(conversation_id, id);
+
+            CREATE TABLE IF NOT EXISTS tool_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                turn_id INTEGER NOT NULL REFERENCES turns(id),
+                conversation_id TEXT NOT NULL REFERENCES conversations(id),
+                tool_name TEXT NOT NULL,
+                duration_ms REAL NOT NULL,
+                is_error INTEGER NOT NULL,
+                result_tokens INTEGER NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_tool_runs_conversation
+                ON tool_runs(conversation_id, id);
+
+            -- Large tool outputs, stored once per distinct text; messages refer to them
+            -- by hash from tool_results as {"output_ref": hash} instead of {"output": text}
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,  -- sha256 of the UTF-8 text
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,  -- uncompressed bytes
+                refs INTEGER NOT NULL,  -- tool results referring to it
+                data BLOB NOT NULL
+            );
+
+            -- Conversations moved to archive files by jarvis maintenance; /resume restores them
+            CREATE TABLE IF NOT EXISTS archived_conversations (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                archive TEXT NOT NULL,  -- file name in the archive directory
+                archived_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                duration_ms REAL NOT NULL,
+                archived INTEGER NOT NULL,
+                purged INTEGER NOT NULL,
+                freed_bytes INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL REFERENCES conversations(id),
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (batch_id, item_id)
+            );
         """)
+        if not self._table_exists("messages_fts"):
+            # rowid is messages.id; backfill rows written before the index existed
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE messages_fts USING fts5(content, tool_text, tokenize = 'unicode61')"
+            )
+            self.conn.execute(
+                f"INSERT INTO messages_fts (rowid, content, tool_text) "
+                f"SELECT id, content, {_FTS_TOOL_TEXT_SQL} FROM messages"
+            )
+        self._add_columns("conversations", {
+            "input_tokens": "INTEGER NOT NULL DEFAULT 0",
+            "output_tokens": "INTEGER NOT NULL DEFAULT 0",
+            "cache_read_tokens": "INTEGER NOT NULL DEFAULT 0",
+            "cache_write_tokens": "INTEGER NOT NULL DEFAULT 0",
+        })
+        added = self._add_columns("conversations", {
+            "message_count": "INTEGER NOT NULL DEFAULT 0",
+            "last_message_preview": "TEXT NOT NULL DEFAULT ''",
+        })
+        if "message_count" in added:
+            self.conn.execute(f"""
+                UPDATE conversations SET
+                    message_count = (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id),
+                    last_message_preview = COALESCE((
+                        SELECT substr(trim(replace(replace(content, char(13), ' '), char(10), ' ')), 1, {PREVIEW_CHARS})
+                        FROM messages
+                        WHERE conversation_id = conversations.id AND content != ''
+                        ORDER BY id DESC LIMIT 1
+                    ), '')
+            """)
+        self._add_columns("conversations", {
+            "parent_id": "TEXT REFERENCES conversations(id)",
+            "fork_point": "INTEGER",
+        })
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at, id)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_parent ON conversations(parent_id)")
+        if not had_blobs:
+            self._move_outputs_to_blobs()
+        self.conn.commit()
+
+    def _move_outputs_to_blobs(self) -> None:
+        """Move large tool outputs stored inline by older versions into the blob store.
+
+        The search index keeps the full text. Freed pages are reused by new
+        writes; VACUUM shrinks the file itself.
+        """
+        if not self.blob_threshold:
+            return
+        ids = [
+            r[0]
+            for r in self.conn.execute(
+                "SELECT id FROM messages WHERE length(tool_results) >= ?", (self.blob_threshold,)
+            )
+        ]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT id, tool_results FROM messages WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            updates = []
+            for mid, tool_results in rows:
+                entries = json.loads(tool_results)
+                if any("output" in e and self._is_large(e["output"]) for e in entries):
+                    stored = [
+                        self._tool_result_entry(ToolResult(e["call_id"], e["output"], e.get("is_error", False)))
+                        if "output" in e else e
+                        for e in entries
+                    ]
+                    updates.append((json.dumps(stored), mid))
+            self.conn.executemany("UPDATE messages SET tool_results = ? WHERE id = ?", updates)
+
+    def _table_exists(self, name: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _add_columns(self, table: str, columns: dict[str, str]) -> list[str]:
+        """Add any of the given columns missing from a table created by an older version.
+
+        Returns the names of the columns that were added.
+        """
+        existing = {r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+        added = [name for name in columns if name not in existing]
+        for name in added:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+        return added
+
+    # -- transactions --
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group writes into one commit (nestable).
+
+        Inside a transaction, writes are not committed individually and each
+        conversation's updated_at and stats are updated once, when the
+        outermost block exits.
+        """
+        self._tx_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self._touched.clear()
+                self.conn.rollback()
+            raise
+        self._tx_depth -= 1
+        self._commit()
+
+    def _commit(self) -> None:
+        """Commit pending writes unless a transaction is still open."""
+        if self._tx_depth:
+            return
+        if self._touched:
+            now = datetime.now(timezone.utc).isoformat()
+            self.conn.executemany(
+                _TOUCH_CONVERSATION,
+                [(now, added, preview, cid) for cid, (added, preview) in self._touched.items()],
+            )
+            self._touched.clear()
         self.conn.commit()
 
     # -- conversations --
@@ -55,67 +398,673 @@ class Database:
             "INSERT INTO conversations (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
             (cid, title, now, now),
         )
-        self.conn.commit()
+        self._commit()
         return cid
 
-    def list_conversations(self, limit: int = 20) -> list[dict]:
+    def list_conversations(
+        self, limit: int = 20, *, before: tuple[str, str] | None = None
+    ) -> list[dict]:
+        """Most recently updated conversations first, with their message stats.
+
+        Pass the (updated_at, id) of the last row of a page as `before` to get
+        the next page; each page is an index range scan regardless of table size.
+        """
+        where, params = "", ()
+        if before is not None:
+            where, params = "WHERE (updated_at, id) < (?, ?)", before
         rows = self.conn.execute(
-            "SELECT id, title, updated_at FROM conversations ORDER BY updated_at DESC LIMIT ?",
-            (limit,),
+            f"""SELECT id, title, created_at, updated_at, message_count, last_message_preview,
+                       input_tokens, output_tokens
+                FROM conversations {where}
+                ORDER BY updated_at DESC, id DESC LIMIT ?""",
+            (*params, limit),
         ).fetchall()
         return [dict(r) for r in rows]
 
     def get_conversation(self, conversation_id: str) -> dict | None:
         row = self.conn.execute(
-            "SELECT id, title, created_at, updated_at FROM conversations WHERE id = ?",
+            "SELECT id, title, created_at, updated_at, parent_id, fork_point FROM conversations WHERE id = ?",
             (conversation_id,),
         ).fetchone()
         return dict(row) if row else None
 
+    def fork_conversation(
+        self, conversation_id: str, message_id: int | None = None, *, title: str | None = None
+    ) -> str:
+        """Start a conversation that continues this one from a reply, and return its id.
+
+        The fork shares the messages up to and including `message_id` (by
+        default the latest) by reference, so forking costs the same however
+        long the conversation is, and the shared prefix stays identical for
+        the prompt cache. `message_id` must be a final reply of a turn.
+        """
+        chain = self._chain(conversation_id)
+        if not chain:
+            raise ValueError(f"no conversation {conversation_id}")
+        if message_id is None:
+            row = next(
+                (r for cid, upto in reversed(chain) if (r := self._last_message(cid, upto)) is not None),
+                None,
+            )
+            if row is None:
+                raise ValueError(f"conversation {conversation_id} has no messages to fork from")
+        else:
+            row = self.conn.execute(
+                "SELECT id, conversation_id, role, content, tool_calls FROM messages WHERE id = ?",
+                (message_id,),
+            ).fetchone()
+            bounds = dict(chain)
+            if row is None or row["conversation_id"] not in bounds or (
+                bounds[row["conversation_id"]] is not None and row["id"] > bounds[row["conversation_id"]]
+            ):
+                raise ValueError(f"message {message_id} is not in conversation {conversation_id}")
+        if row["role"] != "assistant" or row["tool_calls"] != "[]":
+            raise ValueError(f"message {row['id']} does not end a turn; fork from one of the replies")
+
+        # The fork's parent is the conversation that owns the message, which
+        # keeps chains short when forking from an inherited part
+        parent = row["conversation_id"]
+        shared = [*chain[:[cid for cid, _ in chain].index(parent)], (parent, row["id"])]
+        count = sum(
+            self.conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ? AND id <= ?", (cid, upto)
+            ).fetchone()[0]
+            for cid, upto in shared
+        )
+        if title is None:
+            title = self.get_conversation(conversation_id)["title"]
+        cid = uuid.uuid4().hex[:12]
+        now = datetime.now(timezone.utc).isoformat()
+        with self.transaction():
+            self.conn.execute(
+                """INSERT INTO conversations
+                       (id, title, created_at, updated_at, message_count, last_message_preview, parent_id, fork_point)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (cid, title, now, now, count, _preview(row["content"]), parent, row["id"]),
+            )
+            # A summary of the shared messages still applies (summaries count messages from the start)
+            self.conn.execute(
+                """INSERT INTO summaries (conversation_id, upto, content, created_at)
+                   SELECT ?, upto, content, created_at FROM summaries
+                   WHERE conversation_id = ? AND upto <= ? ORDER BY id DESC LIMIT 1""",
+                (cid, conversation_id, count),
+            )
+        return cid
+
+    def _chain(self, conversation_id: str) -> list[tuple[str, int | None]]:
+        """Where a conversation's messages are: (conversation id, last message id or None).
+
+        Oldest ancestor first, the conversation itself last; empty if there
+        is no such conversation.
+        """
+        rows = self.conn.execute(
+            """WITH RECURSIVE chain (id, parent_id, fork_point, upto, depth) AS (
+                   SELECT id, parent_id, fork_point, NULL, 0 FROM conversations WHERE id = ?
+                   UNION ALL
+                   SELECT c.id, c.parent_id, c.fork_point, chain.fork_point, chain.depth + 1
+                   FROM conversations c JOIN chain ON c.id = chain.parent_id
+               )
+               SELECT id, upto FROM chain ORDER BY depth DESC""",
+            (conversation_id,),
+        ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def _last_message(self, conversation_id: str, upto: int | None) -> sqlite3.Row | None:
+        where, params = _segment(conversation_id, upto)
+        return self.conn.execute(
+            f"""SELECT id, conversation_id, role, content, tool_calls FROM messages
+                WHERE {where} ORDER BY id DESC LIMIT 1""",
+            params,
+        ).fetchone()
+
     def message_count(self, conversation_id: str) -> int:
         row = self.conn.execute(
-            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?",
+            "SELECT message_count FROM conversations WHERE id = ?",
             (conversation_id,),
         ).fetchone()
-        return row[0]
+        return row[0] if row else 0
+
+    def add_usage(self, conversation_id: str, usage: Usage) -> None:
+        self.conn.execute(
+            """UPDATE conversations SET
+                   input_tokens = input_tokens + ?,
+                   output_tokens = output_tokens + ?,
+                   cache_read_tokens = cache_read_tokens + ?,
+                   cache_write_tokens = cache_write_tokens + ?
+               WHERE id = ?""",
+            (
+                usage.input_tokens,
+                usage.output_tokens,
+                usage.cache_read_tokens,
+                usage.cache_write_tokens,
+                conversation_id,
+            ),
+        )
+        self._commit()
+
+    def get_usage(self, conversation_id: str) -> Usage:
+        row = self.conn.execute(
+            """SELECT input_tokens, output_tokens, cache_read_tokens, cache_write_tokens
+               FROM conversations WHERE id = ?""",
+            (conversation_id,),
+        ).fetchone()
+        return Usage(**dict(row)) if row else Usage()
 
     # -- messages --
 
-    def add_message(self, conversation_id: str, msg: Message) -> None:
+    def add_message(self, conversation_id: str, msg: Message) -> int:
+        """Store a message and return its id."""
+        return self.add_messages(conversation_id, [msg])[0]
+
+    def add_messages(self, conversation_id: str, msgs: list[Message]) -> list[int]:
+        """Store several messages (and their search index entries) in one commit.
+
+        Raises ValueError if the conversation does not exist (e.g. it was
+        archived meanwhile), rather than store messages nothing refers to.
+        """
+        if self.conn.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone() is None:
+            raise ValueError(f"no conversation {conversation_id}")
+        ids = [
+            self.conn.execute(_INSERT_MESSAGE, self._message_row(conversation_id, m)).lastrowid
+            for m in msgs
+        ]
+        self.conn.executemany(
+            _INSERT_FTS,
+            [(mid, m.content, _fts_tool_text(m)) for mid, m in zip(ids, msgs)],
+        )
+        pending = self._touched.setdefault(conversation_id, [0, None])
+        pending[0] += len(msgs)
+        for m in msgs:
+            if m.content:
+                pending[1] = _preview(m.content)
+        self._commit()
+        return ids
+
+    def _message_row(self, conversation_id: str, msg: Message) -> tuple:
+        return (
+            conversation_id,
+            msg.role,
+            msg.content,
+            json.dumps([{"tool_name": tc.tool_name, "tool_input": tc.tool_input, "call_id": tc.call_id} for tc in msg.tool_calls]),
+            json.dumps([self._tool_result_entry(tr) for tr in msg.tool_results]),
+            msg.created_at.isoformat(),
+        )
+
+    def get_messages(
+        self,
+        conversation_id: str,
+        *,
+        columns: Sequence[str] = MESSAGE_COLUMNS,
+    ) -> list[StoredMessage]:
+        """Messages of a conversation in order, including those a fork shares, decoded lazily.
+
+        `columns` limits which columns are read, e.g. ("role", "content")
+        to scan a long conversation without loading tool payloads.
+        """
+        unknown = set(columns) - set(MESSAGE_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown message columns: {', '.join(sorted(unknown))}")
+        cursor = self.conn.cursor()
+        cursor.row_factory = None  # plain tuples; StoredMessage keeps the values itself
+        from_row, blobs = StoredMessage.from_row, self.load_blobs
+        selected = "".join(", " + c for c in columns)
+        messages = []
+        # A fork's own messages come after the ones it shares (ids only grow)
+        for cid, upto in self._chain(conversation_id) or [(conversation_id, None)]:
+            where, params = _segment(cid, upto)
+            cursor.execute(f"SELECT id{selected} FROM messages WHERE {where} ORDER BY id", params)
+            messages.extend(from_row(columns, row, blobs) for row in cursor)
+        return messages
+
+    # -- blobs --
+
+    def _is_large(self, output: str) -> bool:
+        """At least blob_threshold UTF-8 bytes (each character takes 1 to 4)."""
+        threshold = self.blob_threshold
+        if not threshold or len(output) * 4 < threshold:
+            return False
+        return len(output) >= threshold or len(output.encode()) >= threshold
+
+    def _tool_result_entry(self, tr: ToolResult) -> dict[str, Any]:
+        """A tool result as stored in messages.tool_results, large outputs by reference.
+
+        A shortened output also keeps the full one, always in the blob store.
+        """
+        if self._is_large(tr.output):
+            entry = {"call_id": tr.call_id, "output_ref": self._put_blob(tr.output), "is_error": tr.is_error}
+        else:
+            entry = {"call_id": tr.call_id, "output": tr.output, "is_error": tr.is_error}
+        if tr.full_output is not None:
+            entry["full_ref"] = self._put_blob(tr.full_output)
+        return entry
+
+    def tool_output(self, conversation_id: str, call_id: str) -> str | None:
+        """Full output of a tool call in the conversation, or None if there is no such call."""
+        for cid, upto in reversed(self._chain(conversation_id)):
+            where, params = _segment(cid, upto, "messages.")
+            row = self.conn.execute(
+                f"""SELECT json_extract(value, '$.full_ref'), json_extract(value, '$.output_ref'),
+                           json_extract(value, '$.output')
+                    FROM messages, json_each(messages.tool_results)
+                    WHERE {where} AND json_extract(value, '$.call_id') = ?
+                    ORDER BY messages.id DESC LIMIT 1""",
+                (*params, call_id),
+            ).fetchone()
+            if row is not None:
+                break
+        else:
+            return None
+        ref = row[0] or row[1]
+        if ref is None:
+            return row[2]
+        return self.load_blobs([ref]).get(ref)
+
+    def _put_blob(self, text: str) -> str:
+        """Store a text (or count another reference to it) and return its hash."""
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        cursor = self.conn.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (digest,))
+        if not cursor.rowcount:
+            codec, packed = _compress(self.blob_codec, data)
+            self.conn.execute(
+                "INSERT INTO blobs (hash, codec, size, refs, data) VALUES (?, ?, ?, 1, ?)",
+                (digest, codec, len(data), packed),
+            )
+        return digest
+
+    def load_blobs(self, hashes: Sequence[str]) -> dict[str, str]:
+        """Texts of stored tool outputs by hash; unknown hashes are left out."""
+        cache = self._blob_cache
+        found = {}
+        missing = []
+        for digest in dict.fromkeys(hashes):
+            if digest in cache:
+                cache.move_to_end(digest)
+                found[digest] = cache[digest]
+            else:
+                missing.append(digest)
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT hash, codec, data FROM blobs WHERE hash IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for digest, codec, data in rows:
+                found[digest] = cache[digest] = _decompress(codec, data).decode()
+        while len(cache) > _BLOB_CACHE_ENTRIES:
+            cache.popitem(last=False)
+        return found
+
+    def blob_stats(self) -> dict[str, int]:
+        """Space used by stored tool outputs, and saved by deduplication and compression.
+
+        `referenced_bytes` is what the outputs would take inline, once per
+        reference; `stored_bytes` is what they take in the blob store.
+        """
+        row = self.conn.execute(
+            """SELECT COUNT(*), COALESCE(SUM(refs), 0), COALESCE(SUM(size * refs), 0),
+                      COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0)
+               FROM blobs"""
+        ).fetchone()
+        blobs, refs, referenced, unique, stored = row
+        return {
+            "blobs": blobs,
+            "references": refs,
+            "referenced_bytes": referenced,
+            "unique_bytes": unique,
+            "stored_bytes": stored,
+            "saved_bytes": referenced - stored,
+        }
+
+    # -- search --
+
+    def search(
+        self,
+        query: str,
+        *,
+        limit: int = 10,
+        offset: int = 0,
+        highlight: tuple[str, str] = ("[", "]"),
+    ) -> list[dict]:
+        """Full-text search over message content and tool inputs/outputs, best match first.
+
+        Each result has the message id, conversation id and title, role,
+        created_at and a snippet with matches wrapped in `highlight`.
+        """
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return []
+        rows = self.conn.execute(
+            """WITH hits AS (
+                   SELECT rowid AS id, rank,
+                          snippet(messages_fts, -1, ?, ?, ' … ', 16) AS snippet
+                   FROM messages_fts WHERE messages_fts MATCH ?
+                   ORDER BY rank LIMIT ? OFFSET ?
+               )
+               SELECT hits.id, m.conversation_id, c.title, m.role, m.created_at, hits.snippet
+               FROM hits
+               JOIN messages m ON m.id = hits.id
+               JOIN conversations c ON c.id = m.conversation_id
+               ORDER BY hits.rank""",
+            (highlight[0], highlight[1], fts_query, limit, offset),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    # -- summaries --
+
+    def save_summary(self, conversation_id: str, upto: int, content: str) -> None:
+        """Store a summary of the first `upto` messages of a conversation."""
         self.conn.execute(
-            """INSERT INTO messages (conversation_id, role, content, tool_calls, tool_results, created_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
+            "INSERT INTO summaries (conversation_id, upto, content, created_at) VALUES (?, ?, ?, ?)",
+            (conversation_id, upto, content, datetime.now(timezone.utc).isoformat()),
+        )
+        self._commit()
+
+    def get_summary(self, conversation_id: str) -> tuple[int, str] | None:
+        """Return (upto, content) of the latest summary, if any."""
+        row = self.conn.execute(
+            "SELECT upto, content FROM summaries WHERE conversation_id = ? ORDER BY id DESC LIMIT 1",
+            (conversation_id,),
+        ).fetchone()
+        return (row["upto"], row["content"]) if row else None
+
+    # -- telemetry --
+
+    def add_turn(self, conversation_id: str, turn: Turn) -> int:
+        """Store the timings and usage of one turn and its tool runs; return the turn id."""
+        usage = turn.usage
+        turn_id = self.conn.execute(
+            """INSERT INTO turns (
+                   conversation_id, started_at, duration_ms, api_ms, first_token_ms, confirm_ms,
+                   tools_ms, db_ms, rounds, input_tokens, output_tokens, cache_read_tokens,
+                   cache_write_tokens, error)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (
                 conversation_id,
-                msg.role,
-                msg.content,
-                json.dumps([{"tool_name": tc.tool_name, "tool_input": tc.tool_input, "call_id": tc.call_id} for tc in msg.tool_calls]),
-                json.dumps([{"call_id": tr.call_id, "output": tr.output, "is_error": tr.is_error} for tr in msg.tool_results]),
-                msg.created_at.isoformat(),
+                turn.started_at.isoformat(),
+                turn.duration_ms,
+                turn.api_ms,
+                turn.first_token_ms,
+                turn.confirm_ms,
+                turn.tools_ms,
+                turn.db_ms,
+                turn.rounds,
+                usage.input_tokens,
+                usage.output_tokens,
+                usage.cache_read_tokens,
+                usage.cache_write_tokens,
+                turn.error,
             ),
+        ).lastrowid
+        self.conn.executemany(
+            """INSERT INTO tool_runs (turn_id, conversation_id, tool_name, duration_ms, is_error, result_tokens)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (turn_id, conversation_id, run.tool_name, run.duration_ms, run.is_error, run.result_tokens)
+                for run in turn.tool_runs
+            ],
         )
-        now = datetime.now(timezone.utc).isoformat()
+        self._commit()
+        return turn_id
+
+    def get_turns(self, conversation_id: str | None = None, *, limit: int = 1000) -> list[dict]:
+        """Most recent turns, newest first; all conversations unless one is given."""
+        where, params = ("WHERE conversation_id = ?", (conversation_id,)) if conversation_id else ("", ())
+        rows = self.conn.execute(
+            f"SELECT * FROM turns {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_tool_runs(self, conversation_id: str | None = None, *, limit: int = 5000) -> list[dict]:
+        """Most recent tool runs, newest first; all conversations unless one is given."""
+        where, params = ("WHERE conversation_id = ?", (conversation_id,)) if conversation_id else ("", ())
+        rows = self.conn.execute(
+            f"""SELECT tool_name, duration_ms, is_error, result_tokens FROM tool_runs {where}
+                ORDER BY id DESC LIMIT ?""",
+            (*params, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    # -- batches --
+
+    def get_batch_items(self, batch_id: str) -> dict[str, dict]:
+        """Items already started in a batch run, by item id."""
+        rows = self.conn.execute(
+            "SELECT item_id, conversation_id, status, result, error FROM batch_items WHERE batch_id = ?",
+            (batch_id,),
+        ).fetchall()
+        return {r["item_id"]: dict(r) for r in rows}
+
+    def save_batch_item(
+        self,
+        batch_id: str,
+        item_id: str,
+        conversation_id: str,
+        status: str,
+        *,
+        result: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        """Record an item's conversation and status (running, ok, error or timeout)."""
         self.conn.execute(
-            "UPDATE conversations SET updated_at = ? WHERE id = ?",
-            (now, conversation_id),
+            """INSERT INTO batch_items (batch_id, item_id, conversation_id, status, result, error, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (batch_id, item_id) DO UPDATE SET
+                   conversation_id = excluded.conversation_id,
+                   status = excluded.status,
+                   result = excluded.result,
+                   error = excluded.error,
+                   updated_at = excluded.updated_at""",
+            (batch_id, item_id, conversation_id, status, result, error, datetime.now(timezone.utc).isoformat()),
         )
-        self.conn.commit()
+        self._commit()
+
+    # -- maintenance --
+
+    def archive_candidates(self, idle_before: str, limit: int = 100, exclude: Collection[str] = ()) -> list[str]:
+        """Conversations with messages, last updated before `idle_before`, oldest first.
 
-    def get_messages(self, conversation_id: str) -> list[Message]:
+        A conversation is left out while it has forks here, since they share
+        its messages, and so are those in `exclude` (e.g. ones in use).
+        """
+        exclude = list(exclude)
         rows = self.conn.execute(
-            "SELECT role, content, tool_calls, tool_results, created_at FROM messages WHERE conversation_id = ? ORDER BY id",
-            (conversation_id,),
+            f"""SELECT id FROM conversations c
+                WHERE updated_at < ? AND message_count > 0
+                  AND NOT EXISTS (SELECT 1 FROM conversations f WHERE f.parent_id = c.id)
+                  AND id NOT IN ({", ".join("?" * len(exclude))})
+                ORDER BY updated_at, id LIMIT ?""",
+            (idle_before, *exclude, limit),
         ).fetchall()
-        messages: list[Message] = []
-        for r in rows:
-            messages.append(Message(
-                role=r["role"],
-                content=r["content"],
-                tool_calls=[ToolCall(**tc) for tc in json.loads(r["tool_calls"])],
-                tool_results=[ToolResult(**tr) for tr in json.loads(r["tool_results"])],
-                created_at=datetime.fromisoformat(r["created_at"]),
-            ))
-        return messages
+        return [r[0] for r in rows]
+
+    def export_conversation(self, conversation_id: str) -> dict[str, Any]:
+        """A conversation as one self-contained, JSON-ready record.
+
+        Has its stats, every message (for a fork, the shared ones too) with
+        tool outputs inlined, and its latest summary.
+        """
+        row = self.conn.execute(
+            """SELECT id, title, created_at, updated_at, input_tokens, output_tokens,
+                      cache_read_tokens, cache_write_tokens
+               FROM conversations WHERE id = ?""",
+            (conversation_id,),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"no conversation {conversation_id}")
+        rows = []
+        for cid, upto in self._chain(conversation_id):
+            where, params = _segment(cid, upto)
+            rows += self.conn.execute(
+                f"SELECT role, content, tool_calls, tool_results, created_at FROM messages WHERE {where} ORDER BY id",
+                params,
+            ).fetchall()
+        results = [json.loads(r["tool_results"]) for r in rows]
+        texts = self.load_blobs(
+            [e[key] for entries in results for e in entries for key in ("output_ref", "full_ref") if key in e]
+        )
+        messages = []
+        for r, entries in zip(rows, results):
+            tool_results = []
+            for e in entries:
+                output = texts.get(e["output_ref"], "") if "output_ref" in e else e["output"]
+                tr = {"call_id": e["call_id"], "output": output, "is_error": e.get("is_error", False)}
+                if "full_ref" in e:
+                    tr["full_output"] = texts.get(e["full_ref"], "")
+                tool_results.append(tr)
+            messages.append({
+                "role": r["role"],
+                "content": r["content"],
+                "tool_calls": json.loads(r["tool_calls"]),
+                "tool_results": tool_results,
+                "created_at": r["created_at"],
+            })
+        summary = self.get_summary(conversation_id)
+        return {**dict(row), "messages": messages, "summary": list(summary) if summary else None}
+
+    def import_conversation(self, record: dict[str, Any]) -> str:
+        """Store a record from export_conversation under its id, e.g. to restore it from an archive.
+
+        It counts as updated now, so a restored conversation is not archived
+        again by the next maintenance run.
+        """
+        cid = record["id"]
+        msgs = [
+            Message(
+                m["role"],
+                m["content"],
+                tool_calls=[ToolCall(**tc) for tc in m["tool_calls"]],
+                tool_results=[ToolResult(**tr) for tr in m["tool_results"]],
+                created_at=datetime.fromisoformat(m["created_at"]),
+            )
+            for m in record["messages"]
+        ]
+        with self.transaction():
+            self.conn.execute(
+                """INSERT INTO conversations (id, title, created_at, updated_at, input_tokens, output_tokens,
+                                              cache_read_tokens, cache_write_tokens)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    cid, record["title"], record["created_at"], datetime.now(timezone.utc).isoformat(),
+                    record["input_tokens"], record["output_tokens"], record["cache_read_tokens"],
+                    record["cache_write_tokens"],
+                ),
+            )
+            if msgs:
+                self.add_messages(cid, msgs)
+            if record.get("summary"):
+                self.save_summary(cid, *record["summary"])
+            self.conn.execute("DELETE FROM archived_conversations WHERE id = ?", (cid,))
+        return cid
+
+    def mark_archived(self, archives: dict[str, str]) -> None:
+        """Replace conversations saved to archive files (id -> file name) by an index entry.
+
+        Their messages, search entries and summaries are deleted, and their
+        references to stored tool outputs are released. Their turn timings
+        (turns, tool_runs) are kept on purpose: they are small, `/stats all`
+        still covers them, and they apply again if the conversation is
+        restored.
+        """
+        ids = list(archives)
+        marks = ", ".join("?" * len(ids))
+        now = datetime.now(timezone.utc).isoformat()
+        with self.transaction():
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO archived_conversations
+                       (id, title, created_at, updated_at, message_count, archive, archived_at)
+                   SELECT id, title, created_at, updated_at, message_count, ?, ? FROM conversations WHERE id = ?""",
+                [(archive, now, cid) for cid, archive in archives.items()],
+            )
+            refs = Counter(
+                ref
+                for row in self.conn.execute(
+                    f"""SELECT json_extract(value, '$.output_ref'), json_extract(value, '$.full_ref')
+                        FROM messages, json_each(messages.tool_results)
+                        WHERE messages.conversation_id IN ({marks}) AND messages.tool_results != '[]'""",
+                    ids,
+                )
+                for ref in row
+                if ref is not None
+            )
+            self.conn.executemany(
+                "UPDATE blobs SET refs = refs - ? WHERE hash = ?", [(n, digest) for digest, n in refs.items()]
+            )
+            self.conn.execute("DELETE FROM blobs WHERE refs <= 0")
+            self.conn.execute(
+                f"DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages WHERE conversation_id IN ({marks}))",
+                ids,
+            )
+            self.conn.execute(f"DELETE FROM messages WHERE conversation_id IN ({marks})", ids)
+            self.conn.execute(f"DELETE FROM summaries WHERE conversation_id IN ({marks})", ids)
+            self.conn.execute(f"DELETE FROM conversations WHERE id IN ({marks})", ids)
+
+    def get_archived(self, conversation_id: str) -> dict | None:
+        """Index entry of an archived conversation, with the file it is in."""
+        row = self.conn.execute(
+            "SELECT * FROM archived_conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def purge_empty(self, created_before: str) -> int:
+        """Delete conversations that never got a message; return how many.
+
+        Newer ones are kept, as a message may be on its way, and so are ones
+        a batch run refers to.
+        """
+        cursor = self.conn.execute(
+            """DELETE FROM conversations
+               WHERE message_count = 0 AND created_at < ?
+                 AND id NOT IN (SELECT conversation_id FROM batch_items)""",
+            (created_before,),
+        )
+        self._commit()
+        return cursor.rowcount
+
+    def compact(self, *, full: bool = False) -> int:
+        """Give free pages back to the file system and refresh query planner statistics.
+
+        full=True also merges the search index and, for a database created
+        before incremental auto_vacuum, runs the one full VACUUM that switches
+        it over. Both rewrite large parts of the file and hold the write lock
+        far longer than other connections wait for it (DB_BUSY_TIMEOUT_MS),
+        so they are for the `jarvis maintenance` command, not background runs.
+        Returns the bytes freed.
+        """
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        before = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        if full:
+            # Merge the search index's segments first; that frees pages too
+            self.conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if full:
+                # Created before incremental auto_vacuum: one full VACUUM switches it over
+                self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                self.conn.execute("VACUUM")
+        else:
+            # executescript steps the pragma to the end; execute() frees a single page
+            self.conn.executescript("PRAGMA incremental_vacuum;")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return max(0, before - self.conn.execute("PRAGMA page_count").fetchone()[0]) * page_size
+
+    def add_maintenance_run(
+        self, started_at: str, duration_ms: float, archived: int, purged: int, freed_bytes: int
+    ) -> None:
+        self.conn.execute(
+            """INSERT INTO maintenance_runs (started_at, duration_ms, archived, purged, freed_bytes)
+               VALUES (?, ?, ?, ?, ?)""",
+            (started_at, duration_ms, archived, purged, freed_bytes),
+        )
+        self._commit()
+
+    def last_maintenance(self) -> str | None:
+        """When the latest maintenance run started."""
+        row = self.conn.execute("SELECT MAX(started_at) FROM maintenance_runs").fetchone()
+        return row[0]
 
     def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
         self.conn.close()
@@ -0,0 +1,198 @@
+"""jarvis maintenance: keep the conversation database small and fast.
+
+    jarvis maintenance [--archive-days 90]
+
+Conversations idle for longer than the archive age are moved to
+compressed files, by month of last activity, in the archive directory
+(JARVIS_ARCHIVE_DIR); the database keeps an index entry, and /resume
+restores them. Conversations that never got a message are
+deleted. Then free pages are given back to the file system and the query
+planner's statistics are refreshed.
+
+Each batch of conversations goes to new files, YYYY-MM/<batch>.jsonl.gz,
+holding one JSON line per conversation (Database.export_conversation). A
+file is written under a temporary name, synced and then renamed, and only
+then are its conversations deleted, so an interrupted run at worst leaves
+an unused file behind; existing archives are never appended to.
+
+JARVIS_MAINTENANCE_HOURS runs this in the background of the CLI or
+`jarvis serve` whenever the last run is that old, without the steps that
+hold the database lock for long (see Database.compact).
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Collection
+
+from . import config
+from .database import Database
+
+ARCHIVE_BATCH = 50  # conversations per archive write and transaction
+EMPTY_GRACE = timedelta(hours=1)  # newer empty conversations may be about to get a message
+CHECK_SECONDS = 3600  # how often the background thread checks whether a run is due
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    db: Database,
+    *,
+    archive_days: int | None = None,
+    archive_dir: Path | None = None,
+    stop: threading.Event | None = None,
+    in_use: Callable[[], Collection[str]] | None = None,
+    full: bool = False,
+) -> dict[str, Any]:
+    """Archive idle conversations, purge empty ones and compact the database.
+
+    Conversations returned by `in_use` (e.g. those loaded in `jarvis serve`)
+    are not archived. Setting `stop` ends archiving after the current batch.
+    `full` is passed to Database.compact. Returns what was done: archived,
+    purged, freed_bytes, duration_ms.
+    """
+    archive_days = config.ARCHIVE_DAYS if archive_days is None else archive_days
+    archive_dir = archive_dir or config.ARCHIVE_DIR
+    start = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    archived = 0
+    if archive_days > 0:
+        idle_before = (now - timedelta(days=archive_days)).isoformat()
+        while not (stop and stop.is_set()) and (
+            ids := db.archive_candidates(idle_before, ARCHIVE_BATCH, exclude=in_use() if in_use else ())
+        ):
+            db.mark_archived(_write_archives(archive_dir, [db.export_conversation(cid) for cid in ids]))
+            archived += len(ids)
+    purged = db.purge_empty((now - EMPTY_GRACE).isoformat())
+    freed = db.compact(full=full)
+    duration_ms = (time.perf_counter() - start) * 1000
+    db.add_maintenance_run(now.isoformat(), duration_ms, archived, purged, freed)
+    return {"archived": archived, "purged": purged, "freed_bytes": freed, "duration_ms": duration_ms}
+
+
+def _write_archives(archive_dir: Path, records: list[dict[str, Any]]) -> dict[str, str]:
+    """Write records to a new file per month of last activity; return id -> file name."""
+    by_month: dict[str, list[dict[str, Any]]] = {}
+    for record in records:
+        by_month.setdefault(record["updated_at"][:7], []).append(record)
+    batch = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{secrets.token_hex(4)}.jsonl.gz"
+    written = {}
+    for month, group in by_month.items():
+        name = f"{month}/{batch}"
+        path = archive_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                for record in group:
+                    out.write(json.dumps(record).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(path.parent)
+        written.update((record["id"], name) for record in group)
+    return written
+
+
+def _fsync_dir(path: Path) -> None:
+    """Make a rename in `path` durable."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def restore(db: Database, conversation_id: str, archive_dir: Path | None = None) -> bool:
+    """Move an archived conversation back into the database; False if it is not archived."""
+    entry = db.get_archived(conversation_id)
+    if entry is None:
+        return False
+    path = (archive_dir or config.ARCHIVE_DIR) / entry["archive"]
+    # Records start with their id, so only the wanted one is parsed
+    prefix = json.dumps({"id": conversation_id})[:-1].encode()
+    found = None
+    with gzip.open(path, "rb") as archive:
+        for line in archive:
+            if line.startswith(prefix):
+                found = line
+                break
+    if found is None:
+        raise ValueError(f"{path} has no conversation {conversation_id}")
+    db.import_conversation(json.loads(found))
+    return True
+
+
+def due(db: Database, hours: float) -> bool:
+    """Whether the last run started more than `hours` ago (or there was none)."""
+    last = db.last_maintenance()
+    return last is None or last < (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+
+
+class BackgroundMaintenance(threading.Thread):
+    """Runs maintenance on its own connection whenever the last run is `hours` old.
+
+    `in_use` is called from this thread for the conversations to leave alone
+    (see run).
+    """
+
+    def __init__(
+        self,
+        hours: float,
+        db_path: Path | None = None,
+        in_use: Callable[[], Collection[str]] | None = None,
+    ) -> None:
+        super().__init__(name="jarvis-maintenance", daemon=True)
+        self.hours = hours
+        self.db_path = db_path or config.DB_PATH
+        self.in_use = in_use
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                db = Database(self.db_path)
+                try:
+                    if due(db, self.hours):
+                        run(db, stop=self._stopped, in_use=self.in_use)
+                finally:
+                    db.close()
+            except Exception as exc:  # keep trying on the next check
+                logger.warning("maintenance run failed: %s: %s", type(exc).__name__, exc)
+            self._stopped.wait(min(CHECK_SECONDS, self.hours * 3600))
+
+    def stop(self) -> None:
+        """Ask the thread to finish; a run in progress stops after its current archive batch."""
+        self._stopped.set()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="jarvis maintenance", description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--archive-days",
+        type=int,
+        default=config.ARCHIVE_DAYS,
+        help="archive conversations idle this many days; 0 archives nothing (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    db = Database(config.DB_PATH)
+    try:
+        result = run(db, archive_days=args.archive_days, full=True)
+    finally:
+        db.close()
+    print(
+        f"archived {result['archived']} conversations to {config.ARCHIVE_DIR}, purged {result['purged']} empty ones, "
+        f"freed {result['freed_bytes']:,} bytes ({config.DB_PATH.stat().st_size:,} bytes now) "
+        f"in {result['duration_ms'] / 1000:.1f} s"
+    )
+    return 0
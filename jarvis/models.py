@@ -2,12 +2,17 @@
 
 from __future__ import annotations
 
+import json
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Callable, Sequence
 
+# __slots__ on dataclasses needs Python 3.10; older versions get plain instances
+_SLOTS: dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_SLOTS)
 class Message:
     role: str  # "user" | "assistant"
     content: str
@@ -16,15 +21,143 @@ class Message:
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ToolCall:
     tool_name: str
     tool_input: dict[str, Any]
     call_id: str = ""
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ToolResult:
     call_id: str
     output: str
     is_error: bool = False
+    full_output: str | None = None  # before shaping, when `output` was shortened
+
+
+@dataclass(**_SLOTS)
+class Usage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fraction of prompt tokens served from the prompt cache."""
+        prompt = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return self.cache_read_tokens / prompt if prompt else 0.0
+
+
+class StoredMessage:
+    """Read-only message backed by a database row.
+
+    Has the same attributes as Message (plus its row id), but the JSON
+    columns and the timestamp are only decoded when first accessed, and tool
+    outputs kept in the blob store are only fetched then. Columns left out of
+    a projected query raise AttributeError.
+    """
+
+    __slots__ = ("id", "role", "content", "_tool_calls", "_tool_results", "_created_at", "_blobs")
+
+    # column name -> slot it is loaded into
+    COLUMN_SLOTS = {
+        "role": "role",
+        "content": "content",
+        "tool_calls": "_tool_calls",
+        "tool_results": "_tool_results",
+        "created_at": "_created_at",
+    }
+
+    @classmethod
+    def from_row(
+        cls,
+        columns: Sequence[str],
+        row: Sequence[Any],
+        blobs: Callable[[list[str]], dict[str, str]] | None = None,
+    ) -> StoredMessage:
+        """Build from a row of (id, *columns), in that order.
+
+        `blobs` loads tool outputs stored by reference: hashes -> texts.
+        """
+        msg = cls.__new__(cls)
+        msg.id = row[0]
+        msg._blobs = blobs
+        for column, value in zip(columns, row[1:]):
+            setattr(msg, cls.COLUMN_SLOTS[column], value)
+        return msg
+
+    @property
+    def tool_calls(self) -> list[ToolCall]:
+        value = self._tool_calls
+        if isinstance(value, str):
+            value = self._tool_calls = [ToolCall(**tc) for tc in json.loads(value)]
+        return value
+
+    @property
+    def tool_results(self) -> list[ToolResult]:
+        value = self._tool_results
+        if isinstance(value, str):
+            entries = json.loads(value)
+            refs = [e["output_ref"] for e in entries if "output_ref" in e]
+            outputs = self._blobs(refs) if refs and self._blobs is not None else {}
+            value = self._tool_results = [
+                ToolResult(
+                    call_id=e["call_id"],
+                    output=(
+                        outputs.get(e["output_ref"], f"[stored output {e['output_ref'][:12]} is missing]")
+                        if "output_ref" in e
+                        else e["output"]
+                    ),
+                    is_error=e.get("is_error", False),
+                )
+                for e in entries
+            ]
+        return value
+
+    @property
+    def created_at(self) -> datetime:
+        value = self._created_at
+        if isinstance(value, str):
+            value = self._created_at = datetime.fromisoformat(value)
+        return value
+
+    def to_message(self) -> Message:
+        """Fully decoded copy as a Message."""
+        return Message(
+            role=self.role,
+            content=self.content,
+            tool_calls=self.tool_calls,
+            tool_results=self.tool_results,
+            created_at=self.created_at,
+        )
+
+    def __repr__(self) -> str:
+        content = getattr(self, "content", None)
+        return f"StoredMessage(id={self.id!r}, role={getattr(self, 'role', None)!r}, content={content!r})"
+
+
+@dataclass(**_SLOTS)
+class ToolRun:
+    tool_name: str
+    duration_ms: float
+    is_error: bool = False
+    result_tokens: int = 0  # estimated size of the output sent back to the model
+
+
+@dataclass(**_SLOTS)
+class Turn:
+    """Timings and token usage of one chat() call, across all its API rounds."""
+
+    started_at: datetime
+    duration_ms: float
+    api_ms: float = 0.0
+    first_token_ms: float | None = None  # streaming only: first content of the first round
+    confirm_ms: float = 0.0
+    tools_ms: float = 0.0  # summed over tools, so concurrent tools can exceed wall time
+    db_ms: float = 0.0
+    rounds: int = 0
+    usage: Usage = field(default_factory=Usage)
+    tool_runs: list[ToolRun] = field(default_factory=list)
+    error: str | None = None
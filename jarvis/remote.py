@@ -0,0 +1,211 @@
+"""Client side of `jarvis serve` (see server.py), for the CLI and scripts.
+
+Blocking and standard-library only, so attaching to a running daemon
+costs a connect() instead of loading the API client and tools.
+
+    client = connect()
+    if client is not None:
+        cid = client.create_conversation("script")
+        print(client.chat(cid, "Hello"))
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Any, Callable
+
+from . import config
+from .models import ToolCall
+
+PROTOCOL_VERSION = 1  # of jarvis serve (server.py); a client only attaches to its own
+CONNECT_TIMEOUT = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(Exception):
+    """A request failed in the daemon; `kind` is the exception type it reported."""
+
+    def __init__(self, message: str, kind: str = "") -> None:
+        super().__init__(message)
+        self.kind = kind
+
+
+class DaemonClient:
+    """One connection to the daemon, running one request at a time."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def connect(cls, path: Path | None = None) -> DaemonClient:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(str(path or config.SOCKET_PATH))
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+        return cls(sock)
+
+    def close(self) -> None:
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self) -> DaemonClient:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    # -- requests --
+
+    def ping(self) -> dict[str, Any]:
+        return self.request("ping")
+
+    def create_conversation(self, title: str = "") -> str:
+        return self.request("create_conversation", title=title)["conversation_id"]
+
+    def fork_conversation(self, conversation_id: str, message_id: int | None = None) -> str:
+        return self.request(
+            "fork_conversation", conversation_id=conversation_id, message_id=message_id
+        )["conversation_id"]
+
+    def request(self, op: str, **params: Any) -> Any:
+        """Send a request and return its result."""
+        rid = self._send_request(op, params)
+        while True:
+            event = self._next(rid)
+            if event["event"] == "done":
+                return event.get("result")
+            if event["event"] == "error":
+                raise DaemonError(event.get("error", ""), event.get("type", ""))
+
+    def chat(
+        self,
+        conversation_id: str,
+        text: str,
+        *,
+        confirm_fn: Callable[[ToolCall], bool] | None = None,
+        confirm_batch_fn: Callable[[list[ToolCall]], list[bool]] | None = None,
+        stream_fn: Callable[[str], None] | None = None,
+    ) -> str:
+        """Agent.chat() run by the daemon. Ctrl-C cancels the turn there too."""
+        rid = self._send_request("chat", {
+            "conversation_id": conversation_id,
+            "text": text,
+            "stream": stream_fn is not None,
+            "cwd": os.getcwd(),
+        })
+        try:
+            while True:
+                event = self._next(rid)
+                kind = event["event"]
+                if kind == "delta" and stream_fn is not None:
+                    stream_fn(event["text"])
+                elif kind == "confirm":
+                    tool_calls = [ToolCall(**tc) for tc in event["tool_calls"]]
+                    approved = _confirm(tool_calls, confirm_fn, confirm_batch_fn)
+                    self._send({"op": "confirm", "request": rid, "confirm_id": event["confirm_id"], "approved": approved})
+                elif kind == "done":
+                    return event["result"]
+                elif kind == "error":
+                    raise DaemonError(event.get("error", ""), event.get("type", ""))
+        except KeyboardInterrupt:
+            self._send({"op": "cancel", "request": rid})
+            raise
+
+    # -- internals --
+
+    def _send(self, msg: dict[str, Any]) -> None:
+        self._sock.sendall(json.dumps(msg).encode() + b"\n")
+
+    def _send_request(self, op: str, params: dict[str, Any]) -> int:
+        rid = next(self._ids)
+        self._send({"id": rid, "op": op, **params})
+        return rid
+
+    def _next(self, rid: int) -> dict[str, Any]:
+        """The next event of request `rid`, skipping those of earlier, abandoned requests."""
+        while True:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("jarvis serve closed the connection")
+            event = json.loads(line)
+            if event.get("id") == rid:
+                return event
+
+
+def _confirm(
+    tool_calls: list[ToolCall],
+    confirm_fn: Callable[[ToolCall], bool] | None,
+    confirm_batch_fn: Callable[[list[ToolCall]], list[bool]] | None,
+) -> list[bool]:
+    """Same rules as the agent: the batch prompt for several calls (or with no confirm_fn), else one at a time."""
+    if confirm_batch_fn and (len(tool_calls) > 1 or not confirm_fn):
+        return list(confirm_batch_fn(tool_calls))
+    if confirm_fn:
+        return [confirm_fn(tc) for tc in tool_calls]
+    return [True] * len(tool_calls)
+
+
+def connect(path: Path | None = None) -> DaemonClient | None:
+    """A connection to the daemon, or None if none is listening.
+
+    Also None if the daemon speaks another protocol version or serves
+    another database than JARVIS_DB_PATH, so the caller runs locally.
+    """
+    try:
+        client = DaemonClient.connect(path)
+    except OSError:
+        return None
+    try:
+        client._sock.settimeout(CONNECT_TIMEOUT)
+        info = client.ping()
+        client._sock.settimeout(None)
+    except (OSError, ValueError, DaemonError):
+        client.close()
+        return None
+    db_path = str(config.DB_PATH.resolve())
+    if info.get("version") != PROTOCOL_VERSION or info.get("db_path") != db_path:
+        logger.warning(
+            "not attaching to jarvis serve (pid %s): it uses protocol %s and %s, this is protocol %s and %s",
+            info.get("pid"), info.get("version"), info.get("db_path"), PROTOCOL_VERSION, db_path,
+        )
+        client.close()
+        return None
+    return client
+
+
+class RemoteAgent:
+    """Stands in for Agent: the conversation's turns run in the daemon."""
+
+    def __init__(self, client: DaemonClient, conversation_id: str) -> None:
+        self.client = client
+        self.conversation_id = conversation_id
+
+    def chat(
+        self,
+        user_text: str,
+        *,
+        confirm_fn: Callable[[ToolCall], bool] | None = None,
+        confirm_batch_fn: Callable[[list[ToolCall]], list[bool]] | None = None,
+        stream_fn: Callable[[str], None] | None = None,
+        output_fn: Callable[[str], None] | None = None,
+    ) -> str:
+        # Live tool output (output_fn) is not forwarded by the daemon
+        return self.client.chat(
+            self.conversation_id,
+            user_text,
+            confirm_fn=confirm_fn,
+            confirm_batch_fn=confirm_batch_fn,
+            stream_fn=stream_fn,
+        )
@@ -0,0 +1,207 @@
+"""Streamed replies rendered as Markdown without re-rendering on every token.
+
+Text deltas are buffered and the screen is updated at most JARVIS_RENDER_FPS
+times per second. Finished blocks (paragraphs, lists, headings, fenced code)
+are rendered once and printed above a rich Live region, which shows only
+the unfinished trailing block.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from rich.console import Console, ConsoleOptions
+
+from . import config
+
+# An opening or closing code fence: up to 3 spaces, then ``` or ~~~
+_FENCE = re.compile(r" {0,3}(`{3,}|~{3,})")
+
+
+def _is_blank(line: list[Any]) -> bool:
+    """An empty rendered line (the padding lines of code blocks have a background)."""
+    return all(not s.text.strip() and not (s.style and s.style.bgcolor) for s in line)
+
+
+class _Tail:
+    """Live renderable for the unfinished block; rendered again only when it changed.
+
+    Live also redraws on every console.print(), so the lines are cached.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._key: tuple[str, int] | None = None
+        self._lines: list[Any] = []
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> Iterator[Any]:
+        key = (self.text, options.max_width)
+        if key != self._key:
+            from rich.markdown import Markdown
+
+            self._key = key
+            self._lines = console.render_lines(Markdown(self.text), options, pad=False, new_lines=True)
+        for line in self._lines:
+            yield from line
+
+
+class StreamRenderer:
+    """Renders a streamed reply as Markdown. Call write() per delta and finish() at the end.
+
+    finish() also pauses the live view, e.g. before asking for confirmation;
+    the next write() starts a new one. write_raw() prints text verbatim
+    (tool output) and is safe to call from other threads.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        *,
+        fps: float | None = None,
+        markdown: bool | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.console = console
+        fps = fps if fps is not None else config.RENDER_FPS
+        self.interval = 1 / fps if fps > 0 else 0.0
+        self.markdown = markdown if markdown is not None else config.RENDER_MARKDOWN
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._done = ""  # finished blocks waiting for the next refresh
+        self._pending = ""  # the unfinished block
+        self._scanned = 0  # offset in _pending up to which lines have been scanned
+        self._split = 0  # end of the last finished block in _pending
+        self._blank_at = 0  # end of a blank line that may end a block, once the next line says so
+        self._fence: str | None = None  # open code fence, if inside one
+        self._blocks = 0  # blocks printed in this reply
+        self._tail = _Tail()
+        self._live: Any = None
+        self._last_refresh = 0.0
+        self._timer: threading.Timer | None = None
+        self.refreshes = 0
+
+    def __enter__(self) -> StreamRenderer:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.finish()
+
+    # -- input --
+
+    def write(self, text: str) -> None:
+        """Add a streamed text delta."""
+        if not self.markdown:
+            self.console.out(text, end="", highlight=False)
+            return
+        with self._lock:
+            self._pending += text
+            self._scan()
+            if self._split:
+                self._done += self._pending[:self._split]
+                self._pending = self._pending[self._split:]
+                self._scanned -= self._split
+                self._blank_at = max(0, self._blank_at - self._split)
+                self._split = 0
+            self._refresh()
+
+    def write_raw(self, text: str) -> None:
+        """Print text as is, after anything streamed so far."""
+        with self._lock:
+            self.finish()
+            self.console.out(text, end="", highlight=False)
+
+    def finish(self) -> None:
+        """Print whatever is left and stop the live view."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            text = self._done + self._pending
+            self._done = self._pending = ""
+            self._scanned = self._split = self._blank_at = 0
+            self._fence = None
+            self._tail.text = ""
+            if self._live is not None:
+                self._live.stop()
+                self._live = None
+            if text.strip():
+                self._print_block(text)
+
+    # -- internals --
+
+    def _scan(self) -> None:
+        """Advance over complete lines, finding where finished blocks end."""
+        pending = self._pending
+        while True:
+            end = pending.find("\n", self._scanned)
+            if end < 0:
+                return
+            line = pending[self._scanned:end]
+            self._scanned = end + 1
+            if self._fence is not None:
+                stripped = line.strip()
+                if stripped.startswith(self._fence) and not stripped.strip(self._fence[0]):
+                    self._fence = None
+                    self._split = self._scanned
+                continue
+            if not line.strip():
+                self._blank_at = self._blank_at or self._scanned
+                continue
+            if self._blank_at and not line[:1].isspace():
+                # Unindented text after a blank line starts a new block
+                self._split = self._blank_at
+            self._blank_at = 0
+            match = _FENCE.match(line)
+            if match:
+                self._fence = match.group(1)
+
+    def _print_block(self, text: str) -> None:
+        from rich.markdown import Markdown
+        from rich.segment import Segments
+
+        lines = self.console.render_lines(Markdown(text), pad=False, new_lines=True)
+        # Drop the blank lines some elements start or end with; blocks are separated evenly below
+        content = [i for i, line in enumerate(lines) if not _is_blank(line)]
+        if not content:
+            return
+        lines = lines[content[0]:content[-1] + 1]
+        if self._blocks:
+            self.console.print()
+        self._blocks += 1
+        self.console.print(Segments([segment for line in lines for segment in line]))
+
+    def _refresh(self) -> None:
+        """Update the screen now, or schedule it if the last refresh was too recent."""
+        # Without a terminal there is nothing to animate; finished blocks are still printed
+        if self._live is None and self._pending.strip() and self.console.is_terminal:
+            from rich.live import Live
+
+            self._live = Live(self._tail, console=self.console, auto_refresh=False, transient=True)
+            self._live.start()
+        wait = self._last_refresh + self.interval - self.clock()
+        if wait <= 0:
+            self._show()
+        elif self._timer is None:
+            self._timer = threading.Timer(wait, self._scheduled)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _scheduled(self) -> None:
+        with self._lock:
+            self._timer = None
+            if self._done or self._live is not None:
+                self._show()
+
+    def _show(self) -> None:
+        """Print the finished blocks (one render for all of them) and redraw the tail."""
+        self._last_refresh = self.clock()
+        self.refreshes += 1
+        self._tail.text = self._pending
+        if self._done:
+            done, self._done = self._done, ""
+            self._print_block(done)  # the live view is redrawn along with it
+        elif self._live is not None:
+            self._live.refresh()
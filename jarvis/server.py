@@ -0,0 +1,385 @@
+"""jarvis serve: one process hosting many conversations over a Unix socket.
+
+    jarvis serve [--socket ~/.jarvis/jarvis.sock]
+
+Clients (the CLI, editor integrations, scripts) share the daemon's
+database connection, HTTP connection pool and tool registry instead of
+setting them up per process. The protocol is newline-delimited JSON.
+Every request carries a client-chosen "id" that is repeated on each
+event it produces, so one connection can have several requests running.
+
+Requests:
+    {"id": 1, "op": "chat", "conversation_id": "...", "text": "...", "stream": true, "cwd": "/src"}
+    {"op": "confirm", "request": 1, "confirm_id": 1, "approved": [true]}
+    {"op": "cancel", "request": 1}
+    {"id": 2, "op": "create_conversation", "title": "..."}
+    {"id": 3, "op": "fork_conversation", "conversation_id": "...", "message_id": 42}
+    {"id": 4, "op": "ping"}  -> {"version": 1, "pid": ..., "db_path": "...", ...}
+
+Events:
+    {"id": 1, "event": "delta", "text": "..."}
+    {"id": 1, "event": "confirm", "confirm_id": 1, "tool_calls": [{"tool_name": ..., "tool_input": ..., "call_id": ...}]}
+    {"id": 1, "event": "done", "result": ...}
+    {"id": 1, "event": "error", "type": "...", "error": "..."}
+
+Tool calls that need confirmation are sent to the client that started the
+chat. Chats in one conversation run one at a time; different conversations
+run concurrently. Events are written with backpressure, so a client that
+reads slowly holds up its own requests and nobody else's. A client that
+disconnects has its requests cancelled.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+
+from . import config
+from .async_agent import AsyncAgent
+from .database import Database
+from .models import ToolCall
+from .remote import PROTOCOL_VERSION
+
+if TYPE_CHECKING:
+    import anthropic
+
+MAX_AGENTS = 64  # loaded conversations kept in memory; idle ones are dropped beyond this
+LINE_LIMIT = 16 * 1024 * 1024  # longest request line
+
+Handler = Callable[[Any, dict[str, Any]], Awaitable[Any]]
+
+
+class RequestError(Exception):
+    """A request the daemon cannot carry out, reported to the client."""
+
+
+class Server:
+    """Hosts conversations for the clients of one socket."""
+
+    def __init__(
+        self,
+        db: Database,
+        *,
+        client: anthropic.AsyncAnthropic | None = None,
+        max_agents: int = MAX_AGENTS,
+    ) -> None:
+        self.db = db
+        self.client = client
+        self.max_agents = max_agents
+        self._agents: OrderedDict[str, AsyncAgent] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._holders: Counter[str] = Counter()  # chats running or waiting, by conversation
+        self._connections: dict[_Connection, asyncio.Task] = {}
+        self._listener: asyncio.AbstractServer | None = None
+
+    async def start(self, path: Path) -> None:
+        """Load the tools and the API client, then listen on `path`."""
+        from .tools import tool_definitions
+
+        tool_definitions()
+        if self.client is None:
+            from .client import get_async_client
+
+            self.client = get_async_client()
+        # Created owner-only: whoever can connect can approve its own shell commands
+        umask = os.umask(0o177)
+        try:
+            self._listener = await asyncio.start_unix_server(self._serve, path=str(path), limit=LINE_LIMIT)
+        finally:
+            os.umask(umask)
+
+    async def close(self) -> None:
+        """Stop listening and disconnect every client, cancelling their requests."""
+        if self._listener is not None:
+            self._listener.close()
+        for connection in self._connections:
+            # Drop unsent events (the client may not be reading); its reader sees EOF
+            connection.writer.transport.abort()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+
+    @property
+    def connections(self) -> int:
+        return len(self._connections)
+
+    @property
+    def conversations(self) -> int:
+        """Conversations currently loaded."""
+        return len(self._agents)
+
+    def loaded(self) -> frozenset[str]:
+        """Ids of the conversations currently loaded; safe to call from other threads."""
+        return frozenset(self._agents)
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str) -> AsyncIterator[AsyncAgent]:
+        """The conversation's agent, once no other chat runs in it."""
+        self._holders[conversation_id] += 1
+        try:
+            lock = self._locks.get(conversation_id)
+            if lock is None:
+                lock = self._locks[conversation_id] = asyncio.Lock()
+            async with lock:
+                yield self.agent(conversation_id)
+        finally:
+            self._holders[conversation_id] -= 1
+            if not self._holders[conversation_id]:
+                del self._holders[conversation_id]
+
+    def agent(self, conversation_id: str) -> AsyncAgent:
+        """The conversation's agent, kept loaded between requests."""
+        agent = self._agents.get(conversation_id)
+        if agent is None:
+            agent = self._agents[conversation_id] = AsyncAgent(self.db, conversation_id, client=self.client)
+        self._agents.move_to_end(conversation_id)
+        excess = len(self._agents) - self.max_agents
+        for cid in list(self._agents)[:max(0, excess)]:
+            if cid not in self._holders:
+                del self._agents[cid]
+                self._locks.pop(cid, None)
+        return agent
+
+    async def in_db(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db.executor, lambda: fn(*args, **kwargs))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = _Connection(self, reader, writer)
+        self._connections[connection] = asyncio.current_task()
+        try:
+            await connection.run()
+        finally:
+            del self._connections[connection]
+
+
+class _Connection:
+    """One client: reads its requests, runs each as a task and writes their events."""
+
+    def __init__(self, server: Server, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self._tasks: dict[Any, asyncio.Task] = {}
+        self._confirms: dict[tuple[Any, int], asyncio.Future] = {}
+        self._confirm_ids = itertools.count(1)
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+        self._handlers: dict[str, Handler] = {
+            "chat": self._chat,
+            "create_conversation": self._create_conversation,
+            "fork_conversation": self._fork_conversation,
+            "ping": self._ping,
+        }
+
+    async def send(self, event: dict[str, Any]) -> None:
+        """Write one event, waiting while the client is behind on reading."""
+        async with self._write_lock:
+            self.writer.write(json.dumps(event).encode() + b"\n")
+            await self.writer.drain()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                try:
+                    line = await self.reader.readline()
+                except ValueError:  # longer than LINE_LIMIT; the stream can't be resynchronised
+                    await self._error(None, RequestError("request too long"))
+                    return
+                if not line:
+                    return
+                await self._dispatch(line)
+        except ConnectionError:
+            pass
+        finally:
+            self._closed = True
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self.writer.close()
+            with suppress(ConnectionError):
+                await self.writer.wait_closed()
+
+    async def _dispatch(self, line: bytes) -> None:
+        try:
+            msg = json.loads(line)
+            op = msg["op"]
+        except (ValueError, TypeError, KeyError):
+            await self._error(None, RequestError("invalid request: expected a JSON object with an op"))
+            return
+        rid = msg.get("id")
+        if op == "confirm":
+            await self._answer(msg)
+        elif op == "cancel":
+            task = self._tasks.get(msg.get("request"))
+            if task is not None:
+                task.cancel()
+        elif op not in self._handlers:
+            await self._error(rid, RequestError(f"unknown op {op!r}"))
+        elif rid is None or rid in self._tasks:
+            await self._error(rid, RequestError("each request needs an id not used by a running one"))
+        else:
+            task = asyncio.create_task(self._request(rid, self._handlers[op], msg))
+            self._tasks[rid] = task
+            task.add_done_callback(lambda _, rid=rid: self._tasks.pop(rid, None))
+
+    async def _request(self, rid: Any, handler: Handler, msg: dict[str, Any]) -> None:
+        try:
+            result = await handler(rid, msg)
+        except asyncio.CancelledError:
+            if self._closed:
+                raise
+            await self._error(rid, asyncio.CancelledError("cancelled"))  # by a cancel request
+        except Exception as exc:
+            await self._error(rid, exc)
+        else:
+            with suppress(ConnectionError):
+                await self.send({"id": rid, "event": "done", "result": result})
+
+    async def _error(self, rid: Any, exc: BaseException) -> None:
+        with suppress(ConnectionError):
+            await self.send({"id": rid, "event": "error", "type": type(exc).__name__, "error": str(exc)})
+
+    # -- confirmation round-trips --
+
+    async def _confirm(self, rid: Any, tool_calls: list[ToolCall]) -> list[bool]:
+        """Ask the client to approve tool calls; one answer per call, missing ones denied."""
+        confirm_id = next(self._confirm_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._confirms[(rid, confirm_id)] = future
+        try:
+            await self.send({
+                "id": rid,
+                "event": "confirm",
+                "confirm_id": confirm_id,
+                "tool_calls": [
+                    {"tool_name": tc.tool_name, "tool_input": tc.tool_input, "call_id": tc.call_id}
+                    for tc in tool_calls
+                ],
+            })
+            approved = await future
+        finally:
+            self._confirms.pop((rid, confirm_id), None)
+        approved = [a is True for a in approved[:len(tool_calls)]]
+        return approved + [False] * (len(tool_calls) - len(approved))
+
+    async def _answer(self, msg: dict[str, Any]) -> None:
+        rid = msg.get("request")
+        future = self._confirms.get((rid, msg.get("confirm_id")))
+        if future is None or future.done():
+            await self._error(rid, RequestError(f"no confirmation {msg.get('confirm_id')!r} pending"))
+        elif not isinstance(msg.get("approved"), list):
+            await self._error(rid, RequestError("approved must be a list of booleans"))
+        else:
+            future.set_result(msg["approved"])
+
+    # -- requests --
+
+    async def _chat(self, rid: Any, msg: dict[str, Any]) -> str:
+        cid, text = msg.get("conversation_id"), msg.get("text")
+        if not isinstance(cid, str) or not isinstance(text, str):
+            raise RequestError("chat needs conversation_id and text")
+        if await self.server.in_db(self.server.db.get_conversation, cid) is None:
+            raise RequestError(f"no conversation {cid}")
+
+        async def stream(delta: str) -> None:
+            await self.send({"id": rid, "event": "delta", "text": delta})
+
+        async def confirm(tc: ToolCall) -> bool:
+            return (await self._confirm(rid, [tc]))[0]
+
+        async def confirm_batch(tool_calls: list[ToolCall]) -> list[bool]:
+            return await self._confirm(rid, tool_calls)
+
+        async with self.server.hold(cid) as agent:
+            agent.cwd = msg.get("cwd")
+            return await agent.chat(
+                text,
+                confirm_fn=confirm,
+                confirm_batch_fn=confirm_batch,
+                stream_fn=stream if msg.get("stream", True) else None,
+            )
+
+    async def _create_conversation(self, rid: Any, msg: dict[str, Any]) -> dict[str, Any]:
+        cid = await self.server.in_db(self.server.db.create_conversation, title=str(msg.get("title") or ""))
+        return {"conversation_id": cid}
+
+    async def _fork_conversation(self, rid: Any, msg: dict[str, Any]) -> dict[str, Any]:
+        cid, message_id = msg.get("conversation_id"), msg.get("message_id")
+        if not isinstance(cid, str) or not isinstance(message_id, (int, type(None))):
+            raise RequestError("fork_conversation needs conversation_id and an optional message_id")
+        fork = await self.server.in_db(self.server.db.fork_conversation, cid, message_id)
+        return {"conversation_id": fork}
+
+    async def _ping(self, rid: Any, msg: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "version": PROTOCOL_VERSION,
+            "pid": os.getpid(),
+            "db_path": str(self.server.db.path.resolve()),
+            "connections": self.server.connections,
+            "conversations": self.server.conversations,
+        }
+
+
+def _claim(path: Path) -> None:
+    """Remove a socket left behind by a daemon that is gone; refuse if one is listening."""
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            path.unlink(missing_ok=True)
+            return
+    raise SystemExit(f"jarvis serve is already running on {path}")
+
+
+async def serve(path: Path) -> None:
+    """Run the daemon until SIGINT or SIGTERM."""
+    db = Database(config.DB_PATH)
+    server = Server(db)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    maintenance = None
+    if config.MAINTENANCE_HOURS > 0:
+        from .maintenance import BackgroundMaintenance
+
+        maintenance = BackgroundMaintenance(config.MAINTENANCE_HOURS, in_use=server.loaded)
+        maintenance.start()
+    try:
+        await server.start(path)
+        print(f"jarvis serve: listening on {path}", file=sys.stderr)
+        await stop.wait()
+    finally:
+        if maintenance is not None:
+            maintenance.stop()
+        await server.close()
+        if maintenance is not None:
+            await asyncio.to_thread(maintenance.join)
+        path.unlink(missing_ok=True)
+        db.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="jarvis serve", description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", type=Path, default=config.SOCKET_PATH, help="Unix socket to listen on")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(name)s: %(levelname)s: %(message)s")
+    config.validate()
+    path = args.socket.expanduser()
+    _claim(path)
+    asyncio.run(serve(path))
+    return 0
@@ -0,0 +1,164 @@
+"""Fit a tool output into a token budget before it enters the transcript.
+
+Everything in the transcript is resent on every later API call, so long
+outputs are cut down to their head and tail, plus the lines in between
+that usually matter: stack traces, compiler errors, failed tests. Each cut
+is marked with the line numbers it covers, and the full output is kept
+(see Database.tool_output) so the read_output tool can show any part of it.
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+from . import tokens
+
+HEAD_SHARE = 0.3
+TAIL_SHARE = 0.4  # failures are usually reported at the end
+CONTEXT_BEFORE = 1  # lines kept around a significant line
+CONTEXT_AFTER = 3
+MIN_LINE_CHARS = 1000  # kept lines are shortened in the middle beyond max(this, budget / lines)
+MARKER_CHARS = 60  # room reserved per omission marker
+
+# Lines worth keeping from the middle of a long output
+_SIGNIFICANT = re.compile(
+    r"Traceback \(most recent call last\)"  # Python
+    r"|^\s*File \".+\", line \d+"
+    r"|^\S+:\d+(?::\d+)?:\s*(?:fatal )?(?:error|warning)\b"  # gcc, clang, go, mypy, eslint --format unix
+    r"|^error(?:\[\w+\])?:|^\s+--> \S+:\d+"  # rustc
+    r"|^\s+at .+[(:]\S+:\d+"  # JavaScript, Java stack frames
+    r"|\b[A-Z]\w*(?:Error|Exception)\b"
+    r"|\b(?:ERROR|FATAL|FAIL(?:ED|URE)?|PANIC|panic:|fatal:|npm ERR!|Segmentation fault)"
+    r"|\berror\b[:\[]|^E\s{2,}",  # pytest failure details
+)
+_TRACEBACK = "Traceback (most recent call last)"
+# Every significant line contains one of these; finding them with str.find is much
+# faster than running the pattern on each line, which is only done for candidates
+_KEYWORDS = (
+    "rror", "RROR", "xception", "FAIL", "Traceback", 'File "', "arning", "atal", "FATAL",
+    "anic", "PANIC", "-->", "npm ERR", "Segmentation", " at ", "\tat ", "\nE ",
+)
+
+
+def _candidates(text: str, line_starts: list[int], start: int, end: int) -> list[int]:
+    """Indices of lines in [start, end) that contain a keyword."""
+    lo, hi = line_starts[start], line_starts[end]
+    found = set()
+    for keyword in _KEYWORDS:
+        skip = 1 if keyword.startswith("\n") else 0  # the match starts on the line before
+        pos = text.find(keyword, lo - skip, hi)
+        while pos >= 0:
+            line = bisect_right(line_starts, pos + skip) - 1
+            found.add(line)
+            pos = text.find(keyword, line_starts[line + 1] - skip, hi)
+    return sorted(i for i in found if start <= i < end)
+
+
+def _significant_spans(text: str, lines: list[str], start: int, end: int) -> list[tuple[int, int]]:
+    """[first, last) line ranges in lines[start:end] to keep, merged, in order."""
+    line_starts = [0, *accumulate(len(line) for line in lines)]
+    spans: list[tuple[int, int]] = []
+    for i in _candidates(text, line_starts, start, end):
+        line = lines[i]
+        if (spans and i < spans[-1][1]) or not _SIGNIFICANT.search(line):
+            continue
+        first = max(start, i - CONTEXT_BEFORE)
+        last = i + 1 + CONTEXT_AFTER
+        if _TRACEBACK in line:
+            # The whole traceback: indented frames up to the unindented exception line
+            last = i + 1
+            while last < len(lines) and lines[last][:1].isspace():
+                last += 1
+            last += 1
+        last = min(last, end)
+        if spans and first <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], last))
+        else:
+            spans.append((first, last))
+    return spans
+
+
+def _shorten(line: str, limit: int) -> str:
+    if len(line) <= limit:
+        return line
+    head = int(limit * 0.4)
+    tail = limit - head
+    newline = "\n" if line.endswith("\n") else ""
+    body = line[:-1] if newline else line
+    return f"{body[:head]} [... {len(body) - head - tail:,} characters ...] {body[-tail:]}{newline}"
+
+
+def shape(text: str, budget: int, *, ref: str = "") -> str:
+    """`text` if it fits in `budget` tokens, else its significant parts and a note.
+
+    `ref` is what read_output takes to show the full text (the tool call id).
+    """
+    total = tokens.estimate(text)
+    if budget <= 0 or total <= budget:
+        return text
+    budget_chars = tokens.chars_for(text, budget)
+    lines = text.splitlines(keepends=True)
+    n = len(lines)
+    limit = max(MIN_LINE_CHARS, budget_chars // min(n, 20))
+    costs = [min(len(line), limit + MARKER_CHARS) for line in lines]
+    keep = [False] * n
+    used = 0
+
+    # Head, then tail, within their shares
+    head_end = 0
+    while head_end < n and used + costs[head_end] <= budget_chars * HEAD_SHARE:
+        used += costs[head_end]
+        head_end += 1
+    tail_start, tail_used = n, 0
+    while tail_start > head_end and tail_used + costs[tail_start - 1] <= budget_chars * TAIL_SHARE:
+        tail_start -= 1
+        tail_used += costs[tail_start]
+    used += tail_used
+    for i in (*range(head_end), *range(tail_start, n)):
+        keep[i] = True
+
+    # Significant lines in between, earliest first, while they fit
+    for first, last in _significant_spans(text, lines, head_end, tail_start):
+        cost = sum(costs[first:last]) + MARKER_CHARS
+        if used + cost > budget_chars:
+            continue
+        used += cost
+        for i in range(first, last):
+            keep[i] = True
+
+    # Whatever is left goes to more tail, then more head
+    while tail_start > head_end and (keep[tail_start - 1] or used + costs[tail_start - 1] <= budget_chars):
+        tail_start -= 1
+        used += 0 if keep[tail_start] else costs[tail_start]
+        keep[tail_start] = True
+    while head_end < tail_start and (keep[head_end] or used + costs[head_end] <= budget_chars):
+        used += 0 if keep[head_end] else costs[head_end]
+        keep[head_end] = True
+        head_end += 1
+    if not any(keep):
+        keep[n - 1] = True  # a single line over budget: show it shortened
+
+    parts = []
+    i = 0
+    while i < n:
+        if keep[i]:
+            parts.append(_shorten(lines[i], limit))
+            i += 1
+            continue
+        j = i
+        while j < n and not keep[j]:
+            j += 1
+        chars = sum(len(line) for line in lines[i:j])
+        where = f"line {i + 1}" if j - i == 1 else f"lines {i + 1}-{j}"
+        if parts and not parts[-1].endswith("\n"):
+            parts.append("\n")
+        parts.append(f"[... {where} omitted ({chars:,} characters) ...]\n")
+        i = j
+    shaped = "".join(parts).rstrip("\n")
+    how = f"read_output(ref={ref!r}) with start_line/end_line or a pattern" if ref else "read_output"
+    return (
+        f"{shaped}\n[Output shortened to about {tokens.estimate(shaped):,} of {total:,} tokens "
+        f"({n:,} lines); {how} shows the omitted parts.]"
+    )
@@ -0,0 +1,315 @@
+"""Long-lived shells for run_shell: one per conversation instead of a process per command.
+
+Commands are written to the shell's stdin and framed by a random sentinel
+that the shell prints after each one (on stdout with the exit status and
+working directory, and on stderr), so cd and exported variables carry
+over between calls. A timeout interrupts the command with SIGINT, which
+the shell traps to abandon just that command. If the command ignores it,
+the session is killed, and the next command starts a new shell in the
+last known working directory.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import secrets
+import selectors
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+INTERRUPT_GRACE_SECONDS = 2.0  # after SIGINT, before the session is killed
+MAX_SESSIONS = 8  # the least recently used idle shell is closed beyond this
+MAX_EVICTED = 1024  # closed sessions remembered, to tell their next command
+READ_CHUNK_BYTES = 64 * 1024
+
+# Runs in the shell before the first command. SIGINT interrupts the running
+# command (the function returns), not the shell itself.
+_PRELUDE = """\
+trap ':' INT
+__jarvis_run() { trap 'return 130' INT; eval "$1"; }
+"""
+
+
+@dataclass
+class ShellResult:
+    returncode: int | None  # None when the command was killed along with its shell
+    timed_out: bool = False
+    note: str | None = None  # what happened to the session, for the model
+
+
+class _Framed:
+    """Passes a stream's bytes to `sink` up to the sentinel, then keeps the rest of its line."""
+
+    def __init__(self, marker: bytes, sink: Callable[[bytes], None]) -> None:
+        self.marker = marker
+        self.sink = sink
+        self.trailer: str | None = None  # text after the sentinel, once its line is complete
+        self._buf = bytearray()
+        self._found = False
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+        if not self._found:
+            i = self._buf.find(self.marker)
+            if i < 0:
+                # Hold back what could be the start of a sentinel split across reads
+                cut = len(self._buf) - (len(self.marker) - 1)
+                if cut > 0:
+                    self.sink(bytes(self._buf[:cut]))
+                    del self._buf[:cut]
+                return
+            if i:
+                self.sink(bytes(self._buf[:i]))
+            del self._buf[:i + len(self.marker)]
+            self._found = True
+        end = self._buf.find(b"\n")
+        if end >= 0:
+            self.trailer = self._buf[:end].decode("utf-8", errors="replace")
+
+    def flush(self) -> None:
+        """Pass on held-back bytes (the shell died before the sentinel)."""
+        if not self._found and self._buf:
+            self.sink(bytes(self._buf))
+        self._buf.clear()
+
+
+def default_shell() -> str:
+    return shutil.which("bash") or "sh"
+
+
+class ShellSession:
+    """One shell process, running one command at a time."""
+
+    def __init__(self, shell: str | None = None) -> None:
+        self.shell = shell or default_shell()
+        self.cwd: str | None = None  # as of the last finished command
+        self.note: str | None = None  # told with the next result
+        self.starts = 0
+        self._users = 0  # callers of use_session holding it (guarded by _sessions_lock)
+        self._proc: subprocess.Popen | None = None
+        self._sentinel = b""
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self) -> None:
+        argv = [self.shell]
+        if os.path.basename(self.shell) == "bash":
+            argv += ["--noprofile", "--norc"]
+        self._proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd if self.cwd and os.path.isdir(self.cwd) else None,
+            start_new_session=True,  # its own process group, for SIGINT and kill
+        )
+        self._sentinel = f"__jarvis_{secrets.token_hex(8)}__".encode()
+        self._proc.stdin.write(_PRELUDE.encode())
+        self._proc.stdin.flush()
+        self.starts += 1
+
+    def _signal(self, signum: int) -> None:
+        try:
+            os.killpg(self._proc.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def close(self) -> None:
+        """Kill the shell and anything still running in it."""
+        with self._lock:
+            self._kill()
+
+    def _kill(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        proc.wait()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def run(
+        self,
+        command: str,
+        *,
+        stdout: Callable[[bytes], None],
+        stderr: Callable[[bytes], None],
+        timeout: float,
+        cwd: str | None = None,
+    ) -> ShellResult:
+        """Run a command, passing its output to the stdout/stderr sinks as it arrives.
+
+        With cwd, the command runs in that directory and the shell returns to
+        its own afterwards.
+        """
+        with self._lock:
+            note, self.note = self.note, None
+            if not self.alive:
+                if self._proc is not None:
+                    note = "The previous shell had exited; this ran in a new one (environment reset)."
+                    self._kill()
+                self._start()
+            sentinel = self._sentinel.decode()
+            run = f"__jarvis_run {shlex.quote(command)} </dev/null; __jarvis_status=$?"
+            if cwd:
+                run = f"__jarvis_dir=$PWD; cd -- {shlex.quote(cwd)} && {run}; cd -- \"$__jarvis_dir\""
+            script = (
+                f"{run}; trap ':' INT\n"
+                f"printf '\\n%s %s %s\\n' {sentinel} \"$__jarvis_status\" \"$PWD\"; "
+                f"printf '\\n%s\\n' {sentinel} >&2\n"
+            )
+            try:
+                self._proc.stdin.write(script.encode())
+                self._proc.stdin.flush()
+            except BrokenPipeError:
+                self._kill()
+                return ShellResult(None, note="The shell exited before the command could run.")
+            try:
+                result = self._wait(stdout, stderr, timeout)
+            except BaseException:
+                self._kill()  # interrupted: don't leave the command running
+                raise
+            if note and not result.note:
+                result.note = note
+            return result
+
+    def _wait(
+        self,
+        stdout: Callable[[bytes], None],
+        stderr: Callable[[bytes], None],
+        timeout: float,
+    ) -> ShellResult:
+        marker = b"\n" + self._sentinel
+        out, err = _Framed(marker, stdout), _Framed(marker, stderr)
+        streams = {self._proc.stdout.fileno(): out, self._proc.stderr.fileno(): err}
+        deadline = time.monotonic() + timeout
+        interrupted = False
+        with selectors.DefaultSelector() as selector:
+            for fd in streams:
+                selector.register(fd, selectors.EVENT_READ)
+            pending = set(streams)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if not interrupted:
+                        interrupted = True
+                        self._signal(signal.SIGINT)
+                        deadline = time.monotonic() + INTERRUPT_GRACE_SECONDS
+                        continue
+                    for framed in streams.values():
+                        framed.flush()
+                    self._kill()
+                    return ShellResult(
+                        None,
+                        timed_out=True,
+                        note="The command ignored the interrupt, so its shell was killed; "
+                        "the next command starts a new one (environment reset).",
+                    )
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, READ_CHUNK_BYTES)
+                    framed = streams[key.fd]
+                    if not data:  # the shell exited (e.g. the command ran `exit`)
+                        for framed in streams.values():
+                            framed.flush()
+                        returncode = self._proc.wait()
+                        self._kill()
+                        return ShellResult(
+                            returncode,
+                            timed_out=interrupted,
+                            note="The shell exited; the next command starts a new one (environment reset).",
+                        )
+                    framed.feed(data)
+                    if framed.trailer is not None:
+                        selector.unregister(key.fd)
+                        pending.discard(key.fd)
+        status, _, cwd = out.trailer.strip().partition(" ")
+        self.cwd = cwd or self.cwd
+        return ShellResult(int(status), timed_out=interrupted)
+
+
+# -- sessions by conversation --
+
+_sessions: OrderedDict[str | None, ShellSession] = OrderedDict()
+# Working directory of sessions closed to make room, by key
+_evicted: OrderedDict[str | None, str | None] = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+@contextmanager
+def use_session(key: str | None) -> Iterator[ShellSession]:
+    """The shell of a conversation (None: outside any conversation), for one command.
+
+    Beyond MAX_SESSIONS, the least recently used idle shells are closed; a
+    shell in use is left alone, so there may briefly be more.
+    """
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = ShellSession()
+            if key in _evicted:
+                session.cwd = _evicted.pop(key)
+                session.note = (
+                    "This conversation's shell was closed to make room for others; "
+                    "this ran in a new one (environment reset)."
+                )
+        _sessions.move_to_end(key)
+        evicted = []
+        for old_key, old in list(_sessions.items()):
+            if len(_sessions) <= MAX_SESSIONS:
+                break
+            if old is session or old._users or not old._lock.acquire(blocking=False):
+                continue  # in use
+            del _sessions[old_key]
+            _evicted[old_key] = old.cwd
+            evicted.append(old)
+        while len(_evicted) > MAX_EVICTED:
+            _evicted.popitem(last=False)
+        session._users += 1
+    try:
+        for old in evicted:
+            try:
+                old._kill()
+            finally:
+                old._lock.release()
+        yield session
+    finally:
+        with _sessions_lock:
+            session._users -= 1
+
+
+def close_session(key: str | None) -> None:
+    with _sessions_lock:
+        session = _sessions.pop(key, None)
+        _evicted.pop(key, None)
+    if session is not None:
+        session.close()
+
+
+def close_all() -> None:
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+        _evicted.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_all)
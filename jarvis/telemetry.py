@@ -0,0 +1,260 @@
+"""Per-turn tracing: spans for API calls, tools, confirmations and DB writes.
+
+An agent opens a TurnTrace for each chat() call. Its spans are summarised
+into a models.Turn that the agent stores in the database (see /stats), and
+handed to any registered exporters, e.g. OTelExporter.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Iterator, Protocol, Sequence
+
+from .models import ToolRun, Turn, Usage
+
+if TYPE_CHECKING:
+    from .database import Database
+
+# Span names used by the agents
+TURN = "turn"
+API = "api"
+FIRST_TOKEN = "first_token"
+CONFIRM = "confirm"
+TOOL = "tool"
+DB = "db"
+CONTEXT = "context"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: int
+    parent_id: int | None
+    start: float  # seconds since the epoch
+    duration: float  # seconds
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+
+class Exporter(Protocol):
+    def export(self, spans: Sequence[Span]) -> None: ...
+
+
+_exporters: list[Exporter] = []
+
+
+def add_exporter(exporter: Exporter) -> None:
+    """Send the spans of every finished turn to `exporter`."""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter: Exporter) -> None:
+    _exporters.remove(exporter)
+
+
+class InMemoryExporter:
+    """Keeps exported spans in a list (for tests and debugging)."""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        with self._lock:
+            self.spans.extend(spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class OTelExporter:
+    """Re-emits spans through the OpenTelemetry API, with their original timestamps.
+
+    Needs the optional `opentelemetry-api` package; configure the SDK and its
+    exporters (OTLP, console, ...) as usual before the first turn.
+    """
+
+    def __init__(self, tracer: Any = None) -> None:
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("jarvis")
+
+    def export(self, spans: Sequence[Span]) -> None:
+        started: dict[int, Any] = {}
+        # Parents start before their children, so they are created first
+        for span in sorted(spans, key=lambda s: (s.start, s.span_id)):
+            parent = started.get(span.parent_id) if span.parent_id is not None else None
+            otel_span = self._tracer.start_span(
+                span.name,
+                context=self._trace.set_span_in_context(parent) if parent is not None else None,
+                start_time=int(span.start * 1e9),
+                attributes={"jarvis.trace_id": span.trace_id, **span.attributes},
+            )
+            started[span.span_id] = otel_span
+        for span in spans:
+            started[span.span_id].end(end_time=int(span.end * 1e9))
+
+
+class TurnTrace:
+    """Collects the spans of one turn. Safe to use from tool worker threads."""
+
+    def __init__(self) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc)
+        self.spans: list[Span] = []
+        self.usage = Usage()
+        self.rounds = 0
+        self._start = time.time()
+        self._t0 = time.perf_counter()
+        self._api_start = self._start
+        self._ids = itertools.count(2)  # 1 is the turn itself
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        """Epoch time on the monotonic clock started with the trace."""
+        return self._start + (time.perf_counter() - self._t0)
+
+    def record(self, name: str, start: float, duration: float, **attributes: Any) -> None:
+        with self._lock:
+            self.spans.append(Span(name, self.trace_id, next(self._ids), 1, start, duration, attributes))
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """Time the block; the yielded dict can be used to add attributes."""
+        start = self._now()
+        if name == API:
+            self._api_start = start
+        try:
+            yield attributes
+        finally:
+            self.record(name, start, self._now() - start, **attributes)
+
+    def first_token(self) -> None:
+        """Mark the first streamed content of the API call in progress."""
+        self.record(FIRST_TOKEN, self._api_start, self._now() - self._api_start, round=self.rounds)
+
+    def add_round(self, usage: Usage) -> None:
+        """Count a finished API round and its usage."""
+        with self._lock:
+            self.rounds += 1
+        self.add_usage(usage)
+
+    def add_usage(self, usage: Usage) -> None:
+        with self._lock:
+            self.usage = Usage(
+                input_tokens=self.usage.input_tokens + usage.input_tokens,
+                output_tokens=self.usage.output_tokens + usage.output_tokens,
+                cache_read_tokens=self.usage.cache_read_tokens + usage.cache_read_tokens,
+                cache_write_tokens=self.usage.cache_write_tokens + usage.cache_write_tokens,
+            )
+
+    def finish(self, error: str | None = None) -> Turn:
+        """Close the turn span, export all spans and summarise them."""
+        duration = self._now() - self._start
+        with self._lock:
+            spans = [
+                Span(TURN, self.trace_id, 1, None, self._start, duration,
+                     {"rounds": self.rounds, **({"error": error} if error else {})}),
+                *self.spans,
+            ]
+        for exporter in _exporters:
+            exporter.export(spans)
+
+        def total(name: str) -> float:
+            return sum(s.duration for s in spans if s.name == name) * 1000
+
+        first_tokens = [s.duration * 1000 for s in spans if s.name == FIRST_TOKEN]
+        return Turn(
+            started_at=self.started_at,
+            duration_ms=duration * 1000,
+            api_ms=total(API),
+            first_token_ms=first_tokens[0] if first_tokens else None,
+            confirm_ms=total(CONFIRM),
+            tools_ms=total(TOOL),
+            db_ms=total(DB),
+            rounds=self.rounds,
+            usage=self.usage,
+            tool_runs=[
+                ToolRun(
+                    tool_name=s.attributes.get("tool", ""),
+                    duration_ms=s.duration * 1000,
+                    is_error=bool(s.attributes.get("error")),
+                    result_tokens=s.attributes.get("result_tokens", 0),
+                )
+                for s in spans
+                if s.name == TOOL
+            ],
+            error=error,
+        )
+
+
+# -- reporting --
+
+
+def percentile(values: Sequence[float], q: float) -> float | None:
+    """Nearest-rank percentile (q in 0..100), or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+# Turn columns reported by stats(), with their labels
+TIMINGS = {
+    "duration_ms": "turn",
+    "api_ms": "API calls",
+    "first_token_ms": "first token",
+    "tools_ms": "tools",
+    "confirm_ms": "confirmation",
+    "db_ms": "DB writes",
+}
+
+
+def stats(db: Database, conversation_id: str | None = None, *, limit: int = 1000) -> dict[str, Any]:
+    """p50/p95 timings, token spend and per-tool figures over the most recent turns."""
+    turns = db.get_turns(conversation_id, limit=limit)
+    timings = {}
+    for column in TIMINGS:
+        values = [t[column] for t in turns if t[column] is not None]
+        timings[column] = (percentile(values, 50), percentile(values, 95))
+    tokens = Usage(
+        input_tokens=sum(t["input_tokens"] for t in turns),
+        output_tokens=sum(t["output_tokens"] for t in turns),
+        cache_read_tokens=sum(t["cache_read_tokens"] for t in turns),
+        cache_write_tokens=sum(t["cache_write_tokens"] for t in turns),
+    )
+
+    by_tool: dict[str, list[dict]] = {}
+    for run in db.get_tool_runs(conversation_id, limit=limit * 5):
+        by_tool.setdefault(run["tool_name"], []).append(run)
+    tools = {}
+    for name, runs in sorted(by_tool.items()):
+        durations = [r["duration_ms"] for r in runs]
+        tools[name] = {
+            "calls": len(runs),
+            "errors": sum(1 for r in runs if r["is_error"]),
+            "p50_ms": percentile(durations, 50),
+            "p95_ms": percentile(durations, 95),
+            "result_tokens": sum(r["result_tokens"] for r in runs),
+        }
+    return {
+        "turns": len(turns),
+        "errors": sum(1 for t in turns if t["error"]),
+        "rounds": sum(t["rounds"] for t in turns),
+        "timings": timings,
+        "tokens": tokens,
+        "tools": tools,
+    }
@@ -1,47 +1,171 @@
-"""Tool registry — auto-discovers tool modules in this package."""
+"""Tool registry — auto-discovers tool modules in this package.
+
+Tool names and definitions come from a manifest cached next to the
+bytecode (__pycache__/tool_manifest.json) and rebuilt only for modules
+whose source changed, so a tool's module is imported the first time
+that tool is actually called.
+"""
 
 from __future__ import annotations
 
 import importlib
+import json
+import os
 import pkgutil
+import threading
 from pathlib import Path
 from typing import Any
 
 from .base import Tool
 
-_registry: dict[str, Tool] = {}
+_PACKAGE_DIR = Path(__file__).parent
+_MANIFEST_PATH = _PACKAGE_DIR / "__pycache__" / "tool_manifest.json"
+_MANIFEST_VERSION = 1
+
+_lock = threading.RLock()
+_tools: dict[str, Tool] = {}  # instantiated tools
+_modules: dict[str, str] = {}  # tool name -> module that defines it
+_definitions: dict[str, dict[str, Any]] = {}
+_frozen: tuple[dict[str, Any], ...] | None = None
+_discovered = False
+
+
+def _signature(path: Path) -> list[int] | None:
+    """(mtime_ns, size) of a source file, or None if there is no source to compare."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _source(info: pkgutil.ModuleInfo) -> Path:
+    return _PACKAGE_DIR / info.name / "__init__.py" if info.ispkg else _PACKAGE_DIR / f"{info.name}.py"
+
+
+def _import_tools(module_name: str) -> list[Tool]:
+    """Import a tool module and register the Tool subclasses it defines."""
+    module = importlib.import_module(f".{module_name}", package=__package__)
+    found = []
+    for attr in vars(module).values():
+        if (
+            isinstance(attr, type)
+            and issubclass(attr, Tool)
+            and attr.__module__ == module.__name__  # not tools imported from elsewhere
+            and not getattr(attr, "__abstractmethods__", None)
+        ):
+            tool = attr()
+            _tools[tool.name] = tool
+            found.append(tool)
+    return found
+
+
+def _read_manifest() -> dict[str, Any]:
+    try:
+        manifest = json.loads(_MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == _MANIFEST_VERSION else {}
+
+
+def _write_manifest(manifest: dict[str, Any]) -> None:
+    """Best effort: an unwritable package directory just means no cache."""
+    tmp = _MANIFEST_PATH.with_name(f"{_MANIFEST_PATH.name}.{os.getpid()}.tmp")
+    try:
+        _MANIFEST_PATH.parent.mkdir(exist_ok=True)
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, _MANIFEST_PATH)
+    except OSError:
+        tmp.unlink(missing_ok=True)
 
 
 def _discover() -> None:
-    """Import every module in jarvis/tools/ and register Tool subclasses."""
-    package_dir = Path(__file__).parent
-    for info in pkgutil.iter_modules([str(package_dir)]):
+    """Load tool names and definitions, importing only modules the manifest can't vouch for."""
+    global _discovered, _frozen
+    cached = _read_manifest()
+    base = _signature(_PACKAGE_DIR / "base.py")
+    cached_modules = cached.get("modules", {}) if cached.get("base") == base else {}
+
+    modules: dict[str, Any] = {}
+    for info in pkgutil.iter_modules([str(_PACKAGE_DIR)]):
         if info.name == "base":
             continue
-        module = importlib.import_module(f".{info.name}", package=__package__)
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            if (
-                isinstance(attr, type)
-                and issubclass(attr, Tool)
-                and attr is not Tool
-            ):
-                instance = attr()
-                _registry[instance.name] = instance
+        signature = _signature(_source(info))
+        entry = cached_modules.get(info.name)
+        if entry is None or signature is None or entry["signature"] != signature:
+            tools = _import_tools(info.name)
+            entry = {"signature": signature, "tools": {t.name: t.definition() for t in tools}}
+        modules[info.name] = entry
+
+    for module_name, entry in modules.items():
+        for name, definition in entry["tools"].items():
+            _modules.setdefault(name, module_name)
+            _definitions.setdefault(name, definition)
+    _frozen = None
+    _discovered = True
+
+    manifest = {"version": _MANIFEST_VERSION, "base": base, "modules": modules}
+    if manifest != cached:
+        _write_manifest(manifest)
+
+
+def _ensure_discovered() -> None:
+    if not _discovered:
+        with _lock:
+            if not _discovered:
+                _discover()
+
+
+def register(tool: Tool) -> None:
+    """Add (or replace) a tool at runtime."""
+    global _frozen
+    _ensure_discovered()
+    with _lock:
+        _tools[tool.name] = tool
+        _definitions[tool.name] = tool.definition()
+        _frozen = None
+
+
+def unregister(name: str) -> None:
+    global _frozen
+    _ensure_discovered()
+    with _lock:
+        _tools.pop(name, None)
+        _modules.pop(name, None)
+        _definitions.pop(name, None)
+        _frozen = None
 
 
 def get_all_tools() -> dict[str, Tool]:
-    if not _registry:
-        _discover()
-    return dict(_registry)
+    """Every tool, instantiated (imports all tool modules)."""
+    _ensure_discovered()
+    for name in list(_definitions):
+        get_tool(name)
+    with _lock:
+        return {name: _tools[name] for name in sorted(_definitions) if name in _tools}
 
 
 def get_tool(name: str) -> Tool | None:
-    if not _registry:
-        _discover()
-    return _registry.get(name)
+    _ensure_discovered()
+    tool = _tools.get(name)
+    if tool is None and name in _modules:
+        with _lock:
+            if name not in _tools:
+                _import_tools(_modules[name])
+            tool = _tools.get(name)
+    return tool
+
 
+def tool_definitions() -> tuple[dict[str, Any], ...]:
+    """Anthropic-formatted definitions of all tools, sorted by name.
 
-def tool_definitions() -> list[dict[str, Any]]:
-    """Return Anthropic-formatted tool definitions for all registered tools."""
-    return [tool.definition() for tool in get_all_tools().values()]
+    Built once and shared between calls (treat it as read-only); the stable
+    order keeps the tools prefix of the prompt cacheable.
+    """
+    global _frozen
+    frozen = _frozen
+    if frozen is None:
+        _ensure_discovered()
+        with _lock:
+            frozen = _frozen = tuple(_definitions[name] for name in sorted(_definitions))
+    return frozen
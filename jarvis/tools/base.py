@@ -3,7 +3,52 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from .. import config
+
+
+@dataclass(frozen=True)
+class ToolContext:
+    """Which conversation and tool call a tool is running for."""
+
+    conversation_id: str
+    call_id: str
+    # Receives live output while the tool runs, if the caller wants it
+    output_fn: Callable[[str], None] | None = None
+    # Directory relative paths are resolved against (the client's, under
+    # `jarvis serve`); None means the process's working directory
+    cwd: str | None = None
+    # Full output of an earlier tool call in this conversation, by call id
+    # (results over their token budget are shortened in the transcript)
+    tool_output: Callable[[str], str | None] | None = None
+    # Runs a function once this call's result is stored; never, if the
+    # round is interrupted before that
+    on_saved: Callable[[Callable[[], None]], None] | None = None
+    # Whether an earlier call's result went to the model in full in the
+    # latest request (not stubbed, summarised or dropped by ContextManager)
+    in_context: Callable[[str], bool] | None = None
+
+
+_context: ContextVar[ToolContext | None] = ContextVar("jarvis_tool_context", default=None)
+
+
+def current_context() -> ToolContext | None:
+    """Context of the tool call in progress, or None outside the agent."""
+    return _context.get()
+
+
+@contextmanager
+def tool_context(ctx: ToolContext) -> Iterator[None]:
+    """Set the current tool context for the duration of one execution."""
+    token = _context.set(ctx)
+    try:
+        yield
+    finally:
+        _context.reset(token)
 
 
 class Tool(ABC):
@@ -29,10 +74,31 @@ class Tool(ABC):
         """If True, the agent will ask for user confirmation before executing."""
         return False
 
+    @property
+    def concurrency_safe(self) -> bool:
+        """If False, the agent never runs this tool alongside other tool calls."""
+        return True
+
+    @property
+    def output_budget(self) -> int:
+        """Tokens of output that go into the transcript as is; longer outputs are shortened (see shaping)."""
+        return config.TOOL_OUTPUT_TOKENS
+
     @abstractmethod
     def execute(self, **kwargs: Any) -> str:
         """Run the tool and return a string result (or raise)."""
 
+    async def aexecute(self, **kwargs: Any) -> str:
+        """Async variant of execute. Defaults to running execute in a worker thread."""
+        import asyncio
+        import contextvars
+        import functools
+
+        loop = asyncio.get_running_loop()
+        # Carry the tool context over to the worker thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(None, ctx.run, functools.partial(self.execute, **kwargs))
+
     def definition(self) -> dict[str, Any]:
         """Anthropic tool-use definition."""
         return {
@@ -2,12 +2,177 @@
 
 from __future__ import annotations
 
+import mmap
+import os
+import stat
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
-from .base import Tool
+from .. import config
+from ..tokens import estimate
+from .base import Tool, current_context
 
-MAX_SIZE_BYTES = 256 * 1024  # 256 KB safety limit
+MAX_SIZE_BYTES = 256 * 1024  # 256 KB safety limit on what one call returns
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # total size of cached file contents
+SEEN_MAX_ENTRIES = 4096  # (conversation, path) pairs remembered for "unchanged" replies
+LINE_INDEX_BLOCK_BYTES = 1024 * 1024  # granularity of the sparse line index
+LINE_INDEX_MAX_FILES = 64
+
+# (st_mtime_ns, st_size, st_ino): a file with the same signature has not changed
+Signature = tuple[int, int, int]
+
+
+def _signature(st: os.stat_result) -> Signature:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class _FileCache:
+    """Process-wide LRU of decoded file contents, bounded by total bytes.
+
+    Also remembers, per conversation, which call last returned each file,
+    so an unchanged file can be answered with a reference to that call.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Signature, str, int]] = OrderedDict()
+        self._bytes = 0
+        # (conversation, path) -> (signature, call id, whether the result was shortened)
+        self._seen: OrderedDict[tuple[str, str], tuple[Signature, str, bool]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+
+    def get(self, path: str, sig: Signature) -> str | None:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != sig:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path: str, sig: Signature, text: str, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[path] = (sig, text, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def previous_call(
+        self,
+        conversation_id: str,
+        path: str,
+        sig: Signature,
+        call_id: str,
+        in_context: Callable[[str], bool] | None = None,
+    ) -> tuple[str, bool] | None:
+        """Call id that already returned this exact file version in the conversation,
+        and whether its result was shortened to the output budget.
+
+        With in_context, only a call whose result the model still has in full.
+        """
+        with self._lock:
+            seen = self._seen.get((conversation_id, path))
+        if seen is None or seen[0] != sig or seen[1] == call_id:
+            return None
+        if in_context is not None and not in_context(seen[1]):
+            return None
+        with self._lock:
+            self.unchanged += 1
+        return seen[1], seen[2]
+
+    def remember(self, conversation_id: str, path: str, sig: Signature, call_id: str, shortened: bool) -> None:
+        with self._lock:
+            self._seen[(conversation_id, path)] = (sig, call_id, shortened)
+            self._seen.move_to_end((conversation_id, path))
+            while len(self._seen) > SEEN_MAX_ENTRIES:
+                self._seen.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "unchanged": self.unchanged,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self._bytes = 0
+
+
+_cache = _FileCache(CACHE_MAX_BYTES)
+
+
+class _LineIndex:
+    """Sparse line index: the number of newlines before each block of a file.
+
+    Built lazily, only as far as the deepest line asked for, and kept per
+    file version, so later lookups jump straight to the right block and
+    scan at most one block.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.block_lines = [0]  # newlines before byte i * LINE_INDEX_BLOCK_BYTES
+        self.built = 0  # bytes covered by block_lines
+        self.lock = threading.Lock()
+
+    def line_start(self, mm: mmap.mmap, line: int) -> int | None:
+        """Byte offset where 1-based `line` starts, or None if the file is shorter."""
+        if line <= 1:
+            return 0
+        target = line - 1  # newlines before the line
+        with self.lock:
+            while self.block_lines[-1] < target and self.built < self.size:
+                end = min(self.built + LINE_INDEX_BLOCK_BYTES, self.size)
+                self.block_lines.append(self.block_lines[-1] + mm[self.built:end].count(b"\n"))
+                self.built = end
+            if self.block_lines[-1] < target:
+                return None
+            block = bisect_left(self.block_lines, target) - 1
+        pos = block * LINE_INDEX_BLOCK_BYTES
+        for _ in range(target - self.block_lines[block]):
+            pos = mm.find(b"\n", pos) + 1
+        return pos if pos < self.size else None
+
+
+_line_indexes: OrderedDict[str, tuple[Signature, _LineIndex]] = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def _line_index(path: str, sig: Signature, size: int) -> _LineIndex:
+    with _line_indexes_lock:
+        entry = _line_indexes.get(path)
+        if entry is None or entry[0] != sig:
+            entry = (sig, _LineIndex(size))
+            _line_indexes[path] = entry
+        _line_indexes.move_to_end(path)
+        while len(_line_indexes) > LINE_INDEX_MAX_FILES:
+            _line_indexes.popitem(last=False)
+        return entry[1]
+
+
+def cache_stats() -> dict[str, int]:
+    """Hit/miss counters and current size of the read_file cache."""
+    return _cache.stats()
 
 
 class ReadFileTool(Tool):
@@ -17,7 +182,13 @@ class ReadFileTool(Tool):
 
     @property
     def description(self) -> str:
-        return "Read the contents of a local file. Returns the text content."
+        return (
+            "Read the contents of a local file. Returns the text content. "
+            "If the file has not changed since an earlier read in this conversation, "
+            "returns a short note pointing at that earlier result instead. "
+            f"At most {MAX_SIZE_BYTES // 1024} KB is returned per call; for large files, "
+            "read a line range (start_line/end_line) or a byte range (offset/length)."
+        )
 
     @property
     def parameters(self) -> dict[str, Any]:
@@ -28,6 +199,26 @@ class ReadFileTool(Tool):
                     "type": "string",
                     "description": "Absolute or relative path to the file to read.",
                 },
+                "force": {
+                    "type": "boolean",
+                    "description": "Return the full contents even if the file is unchanged since an earlier read.",
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "First line to return (1-based).",
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": "Last line to return (inclusive). Defaults to the end of the file.",
+                },
+                "offset": {
+                    "type": "integer",
+                    "description": "Byte offset to start reading at.",
+                },
+                "length": {
+                    "type": "integer",
+                    "description": "Number of bytes to read from offset.",
+                },
             },
             "required": ["path"],
         }
@@ -36,15 +227,134 @@ class ReadFileTool(Tool):
     def requires_confirmation(self) -> bool:
         return True
 
-    def execute(self, *, path: str) -> str:
-        p = Path(path).expanduser().resolve()
-        if not p.exists():
+    @property
+    def output_budget(self) -> int:
+        # Whole files are asked for deliberately; ranges are the way to page through bigger ones
+        return 2 * config.TOOL_OUTPUT_TOKENS
+
+    def execute(
+        self,
+        *,
+        path: str,
+        force: bool = False,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        offset: int | None = None,
+        length: int | None = None,
+    ) -> str:
+        ctx = current_context()
+        p = Path(path).expanduser()
+        if ctx is not None and ctx.cwd and not p.is_absolute():
+            p = Path(ctx.cwd) / p
+        # Symlinks and ".." spellings of one file share a cache entry
+        p = p.resolve()
+        try:
+            st = p.stat()
+        except OSError:
             return f"Error: file not found — {p}"
-        if not p.is_file():
+        if not stat.S_ISREG(st.st_mode):
             return f"Error: not a regular file — {p}"
-        if p.stat().st_size > MAX_SIZE_BYTES:
-            return f"Error: file too large ({p.stat().st_size:,} bytes, limit {MAX_SIZE_BYTES:,})"
-        try:
-            return p.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            return f"Error: file is not valid UTF-8 — {p}"
+
+        by_lines = start_line is not None or end_line is not None
+        by_bytes = offset is not None or length is not None
+        if by_lines and by_bytes:
+            return "Error: use either start_line/end_line or offset/length, not both"
+        if end_line is not None and end_line < max(1, start_line or 1):
+            return f"Error: end_line {end_line:,} is before start_line {max(1, start_line or 1):,}"
+        if by_lines or by_bytes or st.st_size > MAX_SIZE_BYTES:
+            return _read_range(p, st, start_line, end_line, offset, length, by_bytes=by_bytes)
+
+        key = str(p)
+        sig = _signature(st)
+        if ctx is not None and not force:
+            previous = _cache.previous_call(ctx.conversation_id, key, sig, ctx.call_id, ctx.in_context)
+            if previous is not None:
+                call, shortened = previous
+                if shortened:
+                    return (
+                        f"File unchanged since call {call} ({st.st_size:,} bytes), whose result was shortened; "
+                        f"read_output(ref={call!r}) with start_line/end_line or a pattern shows any part of it. "
+                        "Pass force=true to read it again."
+                    )
+                return (
+                    f"File unchanged since call {call} ({st.st_size:,} bytes); "
+                    "its contents are in that result. Pass force=true to read it again."
+                )
+
+        text = _cache.get(key, sig)
+        if text is None:
+            with open(p, "rb") as f:
+                # Signature of what was actually read, in case the file changed since stat()
+                sig = _signature(os.fstat(f.fileno()))
+                data = f.read()
+            try:
+                # Same newline handling as reading in text mode
+                text = data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+            except UnicodeDecodeError:
+                return f"Error: file is not valid UTF-8 — {p}"
+            _cache.put(key, sig, text, len(data))
+
+        if ctx is not None:
+            # Only a stored result can be referred to later
+            # The agent shapes the same text to output_budget (see shaping.shape)
+            shortened = 0 < self.output_budget < estimate(text)
+            remember = partial(_cache.remember, ctx.conversation_id, key, sig, ctx.call_id, shortened)
+            if ctx.on_saved is not None:
+                ctx.on_saved(remember)
+            else:
+                remember()
+        return text
+
+
+def _read_range(
+    p: Path,
+    st: os.stat_result,
+    start_line: int | None,
+    end_line: int | None,
+    offset: int | None,
+    length: int | None,
+    *,
+    by_bytes: bool,
+) -> str:
+    """Serve a line or byte range through mmap, returning at most MAX_SIZE_BYTES."""
+    if st.st_size == 0:
+        return ""
+    with open(p, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        if by_bytes:
+            start = max(0, offset or 0)
+            if start >= size:
+                return f"Error: offset {start:,} is past the end of the file ({size:,} bytes)"
+            end = size if length is None else min(size, start + max(0, length))
+        else:
+            index = _line_index(str(p), _signature(os.fstat(f.fileno())), size)
+            first = max(1, start_line or 1)
+            found = index.line_start(mm, first)
+            if found is None:
+                return f"Error: file has fewer than {first:,} lines"
+            start = found
+            stop = index.line_start(mm, end_line + 1) if end_line is not None else None
+            end = size if stop is None else stop
+
+        truncated = end - start > MAX_SIZE_BYTES
+        if truncated:
+            end = start + MAX_SIZE_BYTES
+            if not by_bytes:
+                # Stop at a line boundary so the next call can continue by line number
+                last_newline = mm.rfind(b"\n", start, end)
+                if last_newline >= start:
+                    end = last_newline + 1
+        data = mm[start:end]
+
+    text = data.decode("utf-8", errors="replace")
+    if truncated:
+        lines = 0 if by_bytes else data.count(b"\n")
+        if not lines:
+            text += f"\n[truncated at {len(data):,} bytes; continue with offset={end}]"
+        else:
+            next_line = first + lines
+            text += (
+                f"\n[file is {size:,} bytes; showing lines {first:,}-{next_line - 1:,}. "
+                f"Continue with start_line={next_line}]"
+            )
+    return text
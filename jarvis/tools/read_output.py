@@ -0,0 +1,108 @@
+"""Tool: show parts of a tool output that was shortened in the transcript."""
+
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from .base import Tool, current_context
+
+MAX_LINES = 400  # per call, for line ranges
+MAX_MATCHES = 100
+DEFAULT_CONTEXT = 2
+
+
+class ReadOutputTool(Tool):
+    @property
+    def name(self) -> str:
+        return "read_output"
+
+    @property
+    def description(self) -> str:
+        return (
+            "Show omitted parts of an earlier tool output that was shortened. Pass the ref "
+            "named in the shortened result and either a line range (start_line/end_line) or "
+            "a regular expression (pattern) to list matching lines with their line numbers."
+        )
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "ref": {
+                    "type": "string",
+                    "description": "The ref given in the shortened output (the tool call id).",
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "First line to return (1-based).",
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": f"Last line to return (inclusive); at most {MAX_LINES} lines per call.",
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": "Regular expression; returns matching lines instead of a range.",
+                },
+                "context": {
+                    "type": "integer",
+                    "description": f"Lines shown around each match (default {DEFAULT_CONTEXT}).",
+                },
+            },
+            "required": ["ref"],
+        }
+
+    def execute(
+        self,
+        *,
+        ref: str,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        pattern: str | None = None,
+        context: int | None = None,
+    ) -> str:
+        ctx = current_context()
+        text = ctx.tool_output(ref) if ctx is not None and ctx.tool_output is not None else None
+        if text is None:
+            return f"Error: no tool output with ref {ref!r} in this conversation"
+        lines = text.splitlines()
+        if pattern:
+            return _matches(lines, pattern, DEFAULT_CONTEXT if context is None else max(0, context))
+
+        first = max(1, start_line or 1)
+        if first > len(lines):
+            return f"Error: the output has only {len(lines):,} lines"
+        last = min(len(lines), end_line or len(lines), first + MAX_LINES - 1)
+        shown = "\n".join(lines[first - 1:last])
+        if last < len(lines):
+            shown += f"\n[showing lines {first:,}-{last:,} of {len(lines):,}. Continue with start_line={last + 1}]"
+        return shown
+
+
+def _matches(lines: list[str], pattern: str, context: int) -> str:
+    """grep -n style: matching lines and their context, groups separated by --."""
+    try:
+        regex = re.compile(pattern)
+    except re.error as exc:
+        return f"Error: invalid pattern — {exc}"
+    hits = [i for i, line in enumerate(lines) if regex.search(line)]
+    if not hits:
+        return f"No lines match {pattern!r}."
+    groups: list[list[int]] = []
+    for i in hits[:MAX_MATCHES]:
+        first, last = max(0, i - context), min(len(lines), i + context + 1)
+        if groups and first <= groups[-1][1]:
+            groups[-1][1] = last
+        else:
+            groups.append([first, last])
+    hit_set = set(hits)
+    out = []
+    for first, last in groups:
+        if out:
+            out.append("--")
+        out.extend(f"{i + 1}{':' if i in hit_set else '-'}{lines[i]}" for i in range(first, last))
+    if len(hits) > MAX_MATCHES:
+        out.append(f"[{len(hits) - MAX_MATCHES:,} more matches; narrow the pattern or use start_line/end_line]")
+    return "\n".join(out)
@@ -2,13 +2,82 @@
 
 from __future__ import annotations
 
+import asyncio
+import codecs
+import os
+import signal
 import subprocess
-from typing import Any
+import threading
+import time
+from typing import IO, Any, Callable
 
-from .base import Tool
+from .. import config
+from .base import Tool, current_context
 
 TIMEOUT_SECONDS = 30
-MAX_OUTPUT_BYTES = 64 * 1024  # 64 KB
+MAX_TIMEOUT_SECONDS = 600
+# Kept whole for read_output; the transcript gets it shaped to the token budget
+MAX_OUTPUT_BYTES = 256 * 1024  # 256 KB
+STREAM_BYTES = MAX_OUTPUT_BYTES - 1024  # per stream, leaving room for markers
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class _HeadTail:
+    """Keeps the first and last bytes of a stream, up to `limit` in total.
+
+    Memory stays bounded however much the command prints; bytes that fall
+    between head and tail are only counted.
+    """
+
+    def __init__(self, limit: int, output_fn: Callable[[str], None] | None = None) -> None:
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+        self.output_fn = output_fn
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        if self.output_fn is not None:
+            text = self._decoder.decode(data)
+            if text:
+                self.output_fn(text)
+        if len(self.head) < self.head_limit:
+            room = self.head_limit - len(self.head)
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail += data
+        excess = len(self.tail) - self.tail_limit
+        if excess > 0:
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n... ({self.dropped:,} bytes omitted) ...\n{tail}"
+
+
+def _drain(pipe: IO[bytes], buf: _HeadTail) -> None:
+    with pipe:
+        while True:
+            chunk = pipe.read1(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            buf.write(chunk)
+
+
+def _kill_group(proc: subprocess.Popen | asyncio.subprocess.Process) -> None:
+    """Kill the command and everything it started (it leads its own session)."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
 
 
 class RunShellTool(Tool):
@@ -22,7 +91,11 @@ class RunShellTool(Tool):
             "Run a shell command and return its stdout and stderr. "
             "Use for system tasks like listing files, checking disk usage, "
             "running scripts, git commands, etc. "
-            "Commands time out after 30 seconds."
+            "Commands of a conversation share one shell session by default, so cd and "
+            "exported variables carry over to later commands. Commands time out after "
+            "30 seconds unless timeout_seconds is given; a timed-out command is interrupted. "
+            "Long output is shortened to its beginning, end and error lines; "
+            "read_output shows the rest."
         )
 
     @property
@@ -36,7 +109,14 @@ class RunShellTool(Tool):
                 },
                 "working_directory": {
                     "type": "string",
-                    "description": "Optional working directory for the command. Defaults to the current directory.",
+                    "description": (
+                        "Optional directory to run this command in; later commands still start in "
+                        "the session's current directory. Defaults to the current directory."
+                    ),
+                },
+                "timeout_seconds": {
+                    "type": "integer",
+                    "description": f"Optional timeout (default {TIMEOUT_SECONDS}, at most {MAX_TIMEOUT_SECONDS}).",
                 },
             },
             "required": ["command"],
@@ -46,31 +126,177 @@ class RunShellTool(Tool):
     def requires_confirmation(self) -> bool:
         return True
 
-    def execute(self, *, command: str, working_directory: str | None = None) -> str:
+    @property
+    def concurrency_safe(self) -> bool:
+        # A conversation's shell session runs one command at a time
+        return config.SHELL_BACKEND != "session"
+
+    def execute(
+        self,
+        *,
+        command: str,
+        working_directory: str | None = None,
+        timeout_seconds: int | None = None,
+    ) -> str:
+        ctx = current_context()
+        output_fn = ctx.output_fn if ctx is not None else None
+        timeout = _timeout(timeout_seconds)
+        if config.SHELL_BACKEND == "session":
+            return _run_in_session(command, working_directory, timeout, output_fn)
+        stdout, stderr = _HeadTail(STREAM_BYTES, output_fn), _HeadTail(STREAM_BYTES, output_fn)
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 ["sh", "-c", command],
-                capture_output=True,
-                text=True,
-                timeout=TIMEOUT_SECONDS,
-                cwd=working_directory,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=_cwd(working_directory),
+                start_new_session=True,
             )
+        except OSError as exc:
+            return f"Error: {exc}"
+
+        readers = [
+            threading.Thread(target=_drain, args=(proc.stdout, stdout), daemon=True),
+            threading.Thread(target=_drain, args=(proc.stderr, stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        try:
+            proc.wait(timeout=timeout)
         except subprocess.TimeoutExpired:
-            return f"Error: command timed out after {TIMEOUT_SECONDS}s"
+            timed_out = True
+            _kill_group(proc)
+            proc.wait()
+        finally:
+            if proc.returncode is None:  # interrupted while waiting
+                _kill_group(proc)
+        # Background children can keep the pipes open after the shell exits
+        for reader in readers:
+            reader.join(max(0.0, deadline - time.monotonic()))
+        if any(reader.is_alive() for reader in readers):
+            _kill_group(proc)
+            for reader in readers:
+                reader.join()
+
+        output = _format_output(stdout.text(), stderr.text(), proc.returncode)
+        if timed_out:
+            return f"Error: command timed out after {timeout:g}s\n{output}"
+        return output
+
+    async def aexecute(
+        self,
+        *,
+        command: str,
+        working_directory: str | None = None,
+        timeout_seconds: int | None = None,
+    ) -> str:
+        if config.SHELL_BACKEND == "session":
+            # Blocking reads of the session's pipes, in a worker thread
+            return await super().aexecute(
+                command=command, working_directory=working_directory, timeout_seconds=timeout_seconds
+            )
+        timeout = _timeout(timeout_seconds)
+        ctx = current_context()
+        output_fn = ctx.output_fn if ctx is not None else None
+        stdout, stderr = _HeadTail(STREAM_BYTES, output_fn), _HeadTail(STREAM_BYTES, output_fn)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "sh", "-c", command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=_cwd(working_directory),
+                start_new_session=True,
+            )
         except OSError as exc:
             return f"Error: {exc}"
 
-        parts: list[str] = []
-        if result.stdout:
-            parts.append(result.stdout)
-        if result.stderr:
-            parts.append(f"[stderr]\n{result.stderr}")
-        if result.returncode != 0:
-            parts.append(f"[exit code: {result.returncode}]")
+        async def drain(stream: asyncio.StreamReader, buf: _HeadTail) -> None:
+            while chunk := await stream.read(READ_CHUNK_BYTES):
+                buf.write(chunk)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(drain(proc.stdout, stdout), drain(proc.stderr, stderr), proc.wait()),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            _kill_group(proc)
+            await proc.wait()
+            output = _format_output(stdout.text(), stderr.text(), proc.returncode)
+            return f"Error: command timed out after {timeout:g}s\n{output}"
+        finally:
+            if proc.returncode is None:  # cancelled
+                _kill_group(proc)
+        return _format_output(stdout.text(), stderr.text(), proc.returncode)
 
-        output = "\n".join(parts) if parts else "(no output)"
 
-        if len(output) > MAX_OUTPUT_BYTES:
-            output = output[:MAX_OUTPUT_BYTES] + f"\n... (truncated at {MAX_OUTPUT_BYTES:,} bytes)"
+def _cwd(working_directory: str | None) -> str | None:
+    """Where a spawned command runs: relative directories are taken from the caller's."""
+    ctx = current_context()
+    if ctx is None or ctx.cwd is None:
+        return working_directory
+    return os.path.join(ctx.cwd, os.path.expanduser(working_directory)) if working_directory else ctx.cwd
 
-        return output
+
+def _timeout(timeout_seconds: int | None) -> float:
+    if not timeout_seconds or timeout_seconds <= 0:
+        return TIMEOUT_SECONDS
+    return min(float(timeout_seconds), MAX_TIMEOUT_SECONDS)
+
+
+def _run_in_session(
+    command: str,
+    working_directory: str | None,
+    timeout: float,
+    output_fn: Callable[[str], None] | None,
+) -> str:
+    """Run in the conversation's shell session (see shell_session)."""
+    from ..shell_session import use_session
+
+    ctx = current_context()
+    stdout, stderr = _HeadTail(STREAM_BYTES, output_fn), _HeadTail(STREAM_BYTES, output_fn)
+    try:
+        with use_session(ctx.conversation_id if ctx is not None else None) as session:
+            if session.cwd is None and ctx is not None and ctx.cwd:
+                session.cwd = ctx.cwd  # a new shell starts in the caller's directory
+            result = session.run(
+                command, stdout=stdout.write, stderr=stderr.write, timeout=timeout, cwd=working_directory
+            )
+    except OSError as exc:
+        return f"Error: {exc}"
+    returncode = result.returncode if result.returncode is not None else -signal.SIGKILL
+    output = _format_output(stdout.text(), stderr.text(), returncode)
+    if result.note:
+        output += f"\n[{result.note}]"
+    if result.timed_out:
+        return f"Error: command timed out after {timeout:g}s\n{output}"
+    return output
+
+
+def _format_output(stdout: str, stderr: str, returncode: int) -> str:
+    parts: list[str] = []
+    if stdout:
+        parts.append(stdout)
+    if stderr:
+        parts.append(f"[stderr]\n{stderr}")
+    if returncode != 0:
+        parts.append(f"[exit code: {returncode}]")
+
+    output = "\n".join(parts) if parts else "(no output)"
+
+    # stdout and stderr are each bounded; cap their combination by bytes too
+    encoded = output.encode("utf-8")
+    if len(encoded) > MAX_OUTPUT_BYTES:
+        half = MAX_OUTPUT_BYTES // 2
+        output = (
+            encoded[:half].decode("utf-8", errors="ignore")
+            + f"\n... (truncated to {MAX_OUTPUT_BYTES:,} bytes) ...\n"
+            + encoded[-half:].decode("utf-8", errors="ignore")
+        )
+
+    return output